@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+卡片图片编码 - 截图直接编码为 PNG / JPEG / WebP，可按目标文件大小自动调整质量
+
+dpr=2 的 PNG 卡片每张 3~6 MB，发布时全部要上传。JPEG/WebP 在肉眼无差别的质量下只有几百 KB。
+截图只在内存中拿到一次 PNG 数据，用 Pillow 在进程内编码后写盘一次，不再写出 PNG 再读回转换。
+
+指定 target_kb 时，对质量做二分查找，取不超过目标大小的最高质量（最低降到 MIN_QUALITY）。
+
+没有安装 Pillow 时：JPEG 改由 Playwright 直接按质量截图（二分查找时会重复截图），WebP 不可用。
+
+用法:
+    encoder = CardEncoder('webp', quality=90, target_kb=500)
+    size = await encoder.capture(page, 'card_1' + encoder.extension, clip)
+"""
+
+import asyncio
+import io
+import sys
+from typing import Awaitable, Callable, Dict, Optional
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_FORMATS = ['png', 'jpeg', 'webp']
+FORMAT_EXTENSIONS = {'png': '.png', 'jpeg': '.jpg', 'webp': '.webp'}
+DEFAULT_QUALITY = 90
+MIN_QUALITY = 40
+
+
+class CardEncoder:
+    """截图的输出格式、质量和目标大小"""
+
+    def __init__(self, fmt: str = 'png', quality: int = DEFAULT_QUALITY,
+                 target_kb: Optional[float] = None):
+        """
+        Args:
+            fmt: 输出格式 png / jpeg / webp
+            quality: JPEG/WebP 质量上限（1-100）
+            target_kb: 每张图片的目标大小（KB），超出时降低质量；None 表示固定质量
+        """
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {fmt}（可选: {', '.join(IMAGE_FORMATS)}）")
+        if fmt == 'webp' and Image is None:
+            raise RuntimeError("WebP 输出需要 Pillow，请运行: pip install Pillow")
+        self.fmt = fmt
+        self.quality = max(1, min(100, quality))
+        self.target_kb = target_kb
+
+    @property
+    def extension(self) -> str:
+        """输出文件扩展名"""
+        return FORMAT_EXTENSIONS[self.fmt]
+
+    def cache_tag(self) -> str:
+        """参与渲染缓存键的编码参数，PNG 为空串（与旧缓存键一致）"""
+        if self.fmt == 'png':
+            return ''
+        return f"{self.fmt}:q{self.quality}:t{self.target_kb or 0}"
+
+    async def capture(self, page, output_path: str, clip: Dict[str, float]) -> int:
+        """
+        截取 clip 区域并按格式编码写入 output_path
+
+        Returns:
+            写入的字节数
+        """
+        if self.fmt == 'png':
+            data = await page.screenshot(clip=clip, type='png')
+        elif Image is not None:
+            png = await page.screenshot(clip=clip, type='png')
+            image = Image.open(io.BytesIO(png))
+            image = image.convert('RGB')
+            # 编码在线程中进行，不阻塞其他页面的渲染
+            data = await self._search(lambda q: asyncio.to_thread(self._encode, image, q))
+        else:
+            data = await self._search(lambda q: page.screenshot(clip=clip, type='jpeg', quality=q))
+
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return len(data)
+
+    def _encode(self, image, quality: int) -> bytes:
+        buffer = io.BytesIO()
+        if self.fmt == 'jpeg':
+            image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(buffer, 'WEBP', quality=quality, method=4)
+        return buffer.getvalue()
+
+    async def _search(self, encode: Callable[[int], Awaitable[bytes]]) -> bytes:
+        """取不超过目标大小的最高质量编码结果"""
+        data = await encode(self.quality)
+        if not self.target_kb:
+            return data
+        limit = self.target_kb * 1024
+        if len(data) <= limit:
+            return data
+
+        # 在 [MIN_QUALITY, quality - 1] 中二分查找放得下的最高质量；都放不下时取最小的结果
+        best = None
+        smallest = data
+        lo, hi = MIN_QUALITY, self.quality - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            candidate = await encode(mid)
+            if len(candidate) <= limit:
+                best = candidate
+                lo = mid + 1
+            else:
+                smallest = min(smallest, candidate, key=len)
+                hi = mid - 1
+        return best if best is not None else smallest
+
+
+def encoder_from_args(fmt: str, quality: int, target_kb: Optional[float]) -> CardEncoder:
+    """由 CLI 参数创建编码器，参数无效时打印错误并退出"""
+    try:
+        return CardEncoder(fmt, quality, target_kb)
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ 错误: {e}")
+        sys.exit(1)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+卡片高度预估 - 按样式校准的高度模型
+
+render_xhs_v2 原来的 estimate_content_height 用固定常数猜高度（每行 28 字、h1 130px ...），
+误差大到必须再用浏览器逐张测量。这里对每个样式在浏览器里校准一次：
+- 各元素（段落、标题、列表、引用、代码块、标签、分隔线）的单行高度、每多一行的行高、上下外边距
+- 文字区宽度，以及 canvas 按实际字体测出的中文/西文平均字宽
+
+校准结果按 样式 + 卡片模板哈希 缓存在 ~/.cache/auto-redbook/height_profiles.json，模板变化时自动重新校准。
+预估分页按页高扣除容差后的高度分页（拿不准时宁可提前换页，不会溢出）；
+图片、表格、HTML 片段无法预估，含这些内容或有单块超过一页的卡片仍由浏览器测量。
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from paginator import break_pages, split_blocks
+from render_session import show_html
+
+PROFILE_PATH = Path(os.path.expanduser("~/.cache/auto-redbook/height_profiles.json"))
+
+# 预估分页的容差：按页高的 (1 - 容差) 分页，吸收字宽、折行位置的预估误差
+ESTIMATE_TOLERANCE = 0.04
+
+# 在卡片外壳里测量各类元素；每项为 (单行样例, 两行样例, 两项样例, 字体元素, 文字区元素)
+_CALIBRATE_JS = '''async ([contentSel, measureSel]) => {
+    await document.fonts.ready;
+    const box = document.querySelector(contentSel);
+    const frame = document.querySelector(measureSel) || box;
+    const ctx = document.createElement('canvas').getContext('2d');
+    const CJK = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经';
+    const LATIN = 'The quick brown fox jumps over the lazy dog, 0123456789!';
+    const kinds = {
+        p: ['<p>中</p>', '<p>中<br>中</p>', null, 'p', 'p'],
+        h1: ['<h1>中</h1>', '<h1>中<br>中</h1>', null, 'h1', 'h1'],
+        h2: ['<h2>中</h2>', '<h2>中<br>中</h2>', null, 'h2', 'h2'],
+        h3: ['<h3>中</h3>', '<h3>中<br>中</h3>', null, 'h3', 'h3'],
+        li: ['<ul><li>中</li></ul>', '<ul><li>中<br>中</li></ul>', '<ul><li>中</li><li>中</li></ul>', 'li', 'li'],
+        blockquote: ['<blockquote><p>中</p></blockquote>', '<blockquote><p>中<br>中</p></blockquote>', null, 'p', 'p'],
+        pre: ['<pre><code>x</code></pre>', '<pre><code>x\\nx</code></pre>', null, 'code', 'pre'],
+        hr: ['<hr>', null, null, null, null],
+        tags: ['<div class="tags-container"><span class="tag">#中</span></div>',
+               '<div class="tags-container"><span class="tag">#中</span><br><span class="tag">#中</span></div>',
+               null, '.tag', '.tags-container']
+    };
+    const pick = (el, sel) => el.matches(sel) ? el : el.querySelector(sel);
+    const put = html => {
+        box.innerHTML = html;
+        return box.firstElementChild;
+    };
+    // 先让所有样例参与一次布局，触发网页字体加载，再开始测量
+    box.innerHTML = Object.values(kinds).map(k => k[1] || k[0]).join('');
+    box.getBoundingClientRect();
+    await document.fonts.ready;
+    const profile = {kinds: {}};
+    for (const [kind, [one, two, items, fontSel, widthSel]] of Object.entries(kinds)) {
+        const el = put(one);
+        const cs = getComputedStyle(el);
+        const base = el.getBoundingClientRect().height;
+        const k = {mt: parseFloat(cs.marginTop), mb: parseFloat(cs.marginBottom), base: base,
+                   line: 0, item: 0, width: 0, cjk: 0, latin: 0, pad: 0};
+        if (fontSel) {
+            const textEl = pick(el, fontSel);
+            ctx.font = getComputedStyle(textEl).font;
+            await document.fonts.load(ctx.font, CJK + LATIN);
+            k.cjk = ctx.measureText(CJK).width / CJK.length;
+            k.latin = ctx.measureText(LATIN).width / LATIN.length;
+            const wrap = pick(el, widthSel);
+            const ws = getComputedStyle(wrap);
+            k.width = wrap.clientWidth - parseFloat(ws.paddingLeft) - parseFloat(ws.paddingRight);
+            if (kind === 'tags') {
+                // 每个标签除文字外占用的宽度（内边距 + 外边距）
+                const ts = getComputedStyle(textEl);
+                k.pad = textEl.getBoundingClientRect().width - ctx.measureText(textEl.textContent).width
+                    + parseFloat(ts.marginLeft) + parseFloat(ts.marginRight);
+            }
+        }
+        if (two) k.line = put(two).getBoundingClientRect().height - base;
+        if (items) k.item = put(items).getBoundingClientRect().height - base;
+        profile.kinds[kind] = k;
+    }
+    box.innerHTML = '';
+    const boxTop = box.getBoundingClientRect().top;
+    const frameTop = frame.getBoundingClientRect().top + frame.clientTop;
+    profile.chrome = (boxTop - frameTop) + parseFloat(getComputedStyle(frame).paddingBottom);
+    return profile;
+}'''
+
+_LIST_ITEM = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+_HR = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+_TAGS = re.compile(r'^\s*(?:#[\w\u4e00-\u9fa5]+\s*)+$')
+_TAG = re.compile(r'#[\w\u4e00-\u9fa5]+')
+_HEADING_LINE = re.compile(r'^(#{1,6})\s+(.*)')
+_UNCERTAIN = re.compile(r'!\[|^\s*<|^\s*\|', re.MULTILINE)
+# 去掉行内 Markdown 标记，只保留显示的文字
+_INLINE = (
+    (re.compile(r'\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'(\*\*|__|~~|`|\*|_)'), ''),
+)
+
+
+def _profile_key(style_key: str, shell_html: str) -> str:
+    return f"{style_key}:{hashlib.sha256(shell_html.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _load_profiles() -> Dict[str, Any]:
+    try:
+        with open(PROFILE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _is_cjk(ch: str) -> bool:
+    return ord(ch) >= 0x2E80
+
+
+class HeightEstimator:
+    """按校准结果预估 Markdown 块的高度"""
+
+    def __init__(self, profile: Dict[str, Any]):
+        self.profile = profile
+        self.kinds = profile['kinds']
+        self.chrome = profile['chrome']
+
+    @classmethod
+    async def for_style(cls, style_key: str, shell_html: str, session,
+                        content_selector: str = '.card-content',
+                        measure_selector: str = '.card-inner') -> "HeightEstimator":
+        """
+        读取缓存的校准结果，没有时在浏览器里校准一次并写入缓存
+
+        Args:
+            style_key: 样式名
+            shell_html: 正文为空的卡片 HTML（模板变化会自动重新校准）
+            session: RenderSession，仅在需要校准时使用
+        """
+        key = _profile_key(style_key, shell_html)
+        profiles = _load_profiles()
+        if key not in profiles:
+            print(f"  📏 首次使用样式 {style_key}，校准高度模型...")
+            async with session.page(1080, 1440, 1) as page:
+                await show_html(page, shell_html)
+                profiles[key] = await page.evaluate(_CALIBRATE_JS, [content_selector, measure_selector])
+            PROFILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            tmp = PROFILE_PATH.with_name(f"{PROFILE_PATH.name}.{os.getpid()}.part")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(profiles, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, PROFILE_PATH)
+        return cls(profiles[key])
+
+    def _text_width(self, text: str, kind: Dict[str, float]) -> float:
+        for pattern, repl in _INLINE:
+            text = pattern.sub(repl, text)
+        return sum(kind['cjk'] if _is_cjk(ch) else kind['latin'] for ch in text)
+
+    def _lines(self, text: str, kind: Dict[str, float]) -> int:
+        """一行源文本折行后占几行"""
+        return max(1, math.ceil(self._text_width(text, kind) / kind['width']))
+
+    def block_box(self, block: str) -> Optional[Tuple[float, float, float]]:
+        """
+        预估一个块的 (上外边距, 高度, 下外边距)
+
+        Returns:
+            无法预估（图片、表格、HTML）时返回 None
+        """
+        if _UNCERTAIN.search(block):
+            return None
+        lines = block.split('\n')
+        first = lines[0].lstrip()
+
+        if first.startswith(('```', '~~~')):
+            k = self.kinds['pre']
+            code = lines[1:-1] if len(lines) > 1 and lines[-1].lstrip().startswith(('```', '~~~')) else lines[1:]
+            n = sum(self._lines(line or ' ', k) for line in code) or 1
+            return k['mt'], k['base'] + (n - 1) * k['line'], k['mb']
+
+        if len(lines) > 1 and any(_HEADING_LINE.match(line) for line in lines):
+            # 标题和正文之间没有空行：拆成几段分别预估再堆叠
+            segments, current = [], []
+            for line in lines:
+                if _HEADING_LINE.match(line):
+                    segments.extend(['\n'.join(current)] if current else [])
+                    segments.append(line)
+                    current = []
+                else:
+                    current.append(line)
+            segments.extend(['\n'.join(current)] if current else [])
+            extents = self.extents(segments)
+            if extents is None:
+                return None
+            first_box = self.block_box(segments[0])
+            last_box = self.block_box(segments[-1])
+            return first_box[0], extents[-1][1] - last_box[2] - first_box[0], last_box[2]
+
+        heading = _HEADING_LINE.match(first)
+        if heading:
+            k = self.kinds[f"h{min(3, len(heading.group(1)))}"]
+            n = self._lines(heading.group(2), k)
+            return k['mt'], k['base'] + (n - 1) * k['line'], k['mb']
+
+        if _HR.match(block):
+            k = self.kinds['hr']
+            return k['mt'], k['base'], k['mb']
+
+        if _TAGS.match(block):
+            k = self.kinds['tags']
+            rows, row_width = 1, 0.0
+            for tag in _TAG.findall(block):
+                w = self._text_width(tag, k) + k['pad']
+                if row_width and row_width + w > k['width']:
+                    rows += 1
+                    row_width = 0.0
+                row_width += w
+            return k['mt'], k['base'] + (rows - 1) * k['line'], k['mb']
+
+        if _LIST_ITEM.match(lines[0]):
+            k = self.kinds['li']
+            items = 0
+            extra = 0
+            for line in lines:
+                if _LIST_ITEM.match(line):
+                    items += 1
+                    extra += self._lines(_LIST_ITEM.sub('', line), k) - 1
+                else:
+                    extra += self._lines(line.strip(), k)
+            return k['mt'], k['base'] + (items - 1) * k['item'] + extra * k['line'], k['mb']
+
+        if first.startswith('>'):
+            k = self.kinds['blockquote']
+            n = sum(self._lines(re.sub(r'^\s*>\s?', '', line), k) for line in lines)
+            return k['mt'], k['base'] + (n - 1) * k['line'], k['mb']
+
+        k = self.kinds['p']
+        n = sum(self._lines(line.strip(), k) for line in lines)
+        return k['mt'], k['base'] + (n - 1) * k['line'], k['mb']
+
+    def extents(self, blocks: List[str]) -> Optional[List[List[float]]]:
+        """按外边距折叠规则堆叠各块，返回与 Paginator 测量结果同格式的 [上边界, 下边界]"""
+        extents = []
+        y = 0.0
+        prev_mb = None
+        for block in blocks:
+            box = self.block_box(block)
+            if box is None:
+                return None
+            mt, height, mb = box
+            top = mt if prev_mb is None else y + max(prev_mb, mt)
+            extents.append([top - mt, top + height + mb])
+            y = top + height
+            prev_mb = mb
+        return extents
+
+    def estimate(self, content: str) -> Optional[float]:
+        """预估一段 Markdown 的内容高度（不含卡片内边距），无法预估时返回 None"""
+        blocks = split_blocks(content)
+        if not blocks:
+            return 0.0
+        extents = self.extents(blocks)
+        if extents is None:
+            return None
+        return extents[-1][1] - extents[0][0]
+
+    def paginate(self, body: str, available_height: float,
+                 tolerance: float = ESTIMATE_TOLERANCE) -> Optional[List[str]]:
+        """
+        只用预估高度分页
+
+        Returns:
+            每页的 Markdown 文本；有块无法预估或单块超过一页（需要浏览器切分）时返回 None
+        """
+        blocks = split_blocks(body)
+        if not blocks:
+            return []
+        extents = self.extents(blocks)
+        if extents is None:
+            return None
+        limit = available_height * (1 - tolerance)
+        if any(self.chrome + bottom - top > limit for top, bottom in extents):
+            return None
+        return break_pages(blocks, self.chrome, extents, limit)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+模拟 xhs-api 服务 - 离线测试和压测发布脚本用，不会访问小红书
+
+实现 publish_xhs.py（--api-mode）和 publish_queue.py 用到的接口，
+可模拟网络延迟、随机失败和发布频率限制，用来验证重试、退避和按账号限速。只依赖标准库。
+
+使用方法:
+    python mock_xhs_api.py [--port 5005] [--latency 0.05] [--fail-rate 0.1] [--publish-interval 1]
+    curl http://localhost:5005/stats     # 查看各接口调用次数和已发布的笔记
+
+接口（POST 请求体和响应都是 JSON）:
+    GET  /health
+    GET  /stats
+    POST /init            {session_id, cookie}             -> {status, user_info}
+    POST /user/info       {session_id}                     -> {status, user_info}
+    POST /topic/suggest   {session_id, keyword}            -> {status, topics}
+    POST /upload/image    {session_id, file}               -> {status, file_id}
+    POST /publish/image   {session_id, title, desc, file_ids | files, topics, ...}
+                                                           -> {status, result: {note_id}}
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+
+
+class MockState:
+    """模拟服务的全部状态（各请求线程共享）"""
+
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, publish_interval: float = 0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.publish_interval = publish_interval
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.uploads: Dict[str, str] = {}
+        self.notes = []
+        self.calls: Counter = Counter()
+        self.failures: Counter = Counter()
+        self.last_publish: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def handle(self, path: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """处理一个请求，返回 (HTTP 状态码, 响应)"""
+        with self.lock:
+            self.calls[path] += 1
+        if self.latency:
+            # 延迟在 0.5~1.5 倍之间波动，更接近真实网络
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/stats':
+            with self.lock:
+                return 200, {
+                    'status': 'success',
+                    'calls': dict(self.calls),
+                    'failures': dict(self.failures),
+                    'sessions': len(self.sessions),
+                    'uploads': len(self.uploads),
+                    'notes': list(self.notes)
+                }
+        if path == '/init':
+            if not body.get('cookie'):
+                return 400, {'status': 'error', 'error': '缺少 cookie'}
+            session_id = body.get('session_id', 'default')
+            nickname = f"mock_{hashlib.md5(body['cookie'].encode('utf-8')).hexdigest()[:6]}"
+            with self.lock:
+                self.sessions[session_id] = {'nickname': nickname}
+            return 200, {'status': 'success', 'user_info': {'nickname': nickname}}
+
+        session_id = body.get('session_id')
+        if path not in ('/user/info', '/topic/suggest', '/upload/image', '/publish/image'):
+            return 404, {'status': 'error', 'error': f'未知接口: {path}'}
+        if session_id not in self.sessions:
+            return 401, {'status': 'error', 'error': 'session 未初始化'}
+
+        if self.fail_rate and random.random() < self.fail_rate:
+            with self.lock:
+                self.failures[path] += 1
+            return 500, {'status': 'error', 'error': 'mock: 随机失败'}
+
+        if path == '/user/info':
+            return 200, {'status': 'success', 'user_info': self.sessions[session_id]}
+        if path == '/topic/suggest':
+            keyword = body.get('keyword', '')
+            topic_id = hashlib.md5(keyword.encode('utf-8')).hexdigest()[:24]
+            return 200, {'status': 'success', 'topics': [{
+                'id': topic_id, 'name': keyword, 'type': 'topic',
+                'link': f'https://www.xiaohongshu.com/page/topics/{topic_id}'
+            }]}
+        if path == '/upload/image':
+            file_path = body.get('file', '')
+            if not os.path.isfile(file_path):
+                return 400, {'status': 'error', 'error': f'图片不存在: {file_path}'}
+            file_id = f"img_{os.urandom(8).hex()}"
+            with self.lock:
+                self.uploads[file_id] = file_path
+            return 200, {'status': 'success', 'file_id': file_id}
+        return self._publish(session_id, body)
+
+    def _publish(self, session_id: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        file_ids = body.get('file_ids') or []
+        files = body.get('files') or []
+        with self.lock:
+            unknown = [f for f in file_ids if f not in self.uploads]
+            if unknown:
+                return 400, {'status': 'error', 'error': f'未知图片: {unknown[0]}'}
+            if not file_ids and not files:
+                return 400, {'status': 'error', 'error': '缺少图片'}
+            now = time.monotonic()
+            last = self.last_publish.get(session_id)
+            if self.publish_interval and last is not None and now - last < self.publish_interval:
+                self.failures['/publish/image (429)'] += 1
+                return 429, {'status': 'error', 'error': 'mock: 发布过于频繁'}
+            self.last_publish[session_id] = now
+            note_id = os.urandom(12).hex()
+            self.notes.append({
+                'note_id': note_id,
+                'session_id': session_id,
+                'title': body.get('title'),
+                'images': len(file_ids) or len(files),
+                'topics': [t.get('name') for t in body.get('topics') or []]
+            })
+        return 200, {'status': 'success', 'result': {'note_id': note_id}}
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            if status == 429 and state.publish_interval:
+                self.send_header('Retry-After', f'{state.publish_interval:g}')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._reply(*state.handle(self.path, {}))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                self._reply(400, {'status': 'error', 'error': '请求体不是 JSON'})
+                return
+            self._reply(*state.handle(self.path, body))
+
+        def log_message(self, format, *args):
+            # 压测时请求很多，不逐条打印
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟 xhs-api 服务（离线测试发布脚本）')
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=5005,
+        help='监听端口（默认: 5005）'
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.05,
+        help='每个请求的模拟延迟秒数（默认: 0.05）'
+    )
+    parser.add_argument(
+        '--fail-rate',
+        type=float,
+        default=0.0,
+        help='请求随机失败（HTTP 500）的概率（默认: 0）'
+    )
+    parser.add_argument(
+        '--publish-interval',
+        type=float,
+        default=0.0,
+        help='同一 session 两次发布的最小间隔秒数，过快返回 429（默认: 0 不限制）'
+    )
+
+    args = parser.parse_args()
+
+    state = MockState(args.latency, args.fail_rate, args.publish_interval)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(state))
+    print(f"🧪 模拟 xhs-api 服务已启动: http://127.0.0.1:{args.port}"
+          f"（延迟 {args.latency}s，失败率 {args.fail_rate:.0%}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print(f"👋 已停止，共发布 {len(state.notes)} 篇笔记")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+卡片分页器 - 一次加载、一次测量的自动分页
+
+旧做法每加一个段落就把整张卡片重新写成 HTML、goto、等 networkidle、再睡 200ms，
+段落数为 n 时要渲染 n 次且每次都是整页，分页一篇长文要几十秒。
+
+Paginator 的做法：
+1. 卡片外壳（主题 CSS、容器结构）只加载一次
+2. 正文按块（段落、代码块、列表、表格）分别转成 HTML，整体注入到活动 DOM
+3. 一次 evaluate 取回每个块的上下边界（含外边距），按测量结果单遍计算分页点
+4. 只有单个块超过一页时，才对该块按行/句/字二分查找切分点
+
+用法:
+    paginator = Paginator(page, renderer.to_html, available_height=1220,
+                          content_selector='.card-content-scale', measure_selector='.card-content')
+    await paginator.load(renderer.card_html(''))
+    pages = await paginator.paginate(markdown_body)
+"""
+
+import re
+from typing import Callable, List, Optional, Tuple
+
+from playwright.async_api import Page
+
+from render_session import READY_TIMEOUT_MS, show_html
+
+# 注入所有块，等图片解码和字体就绪后测量：返回外框的内边距开销和每个块相对内容区顶部的 [上边界, 下边界]
+_MEASURE_JS = '''async ([contentSel, measureSel, htmls, timeout]) => {
+    const box = document.querySelector(contentSel);
+    const frame = document.querySelector(measureSel) || box;
+    box.innerHTML = htmls.map(h => '<div class="xhs-block">' + h + '</div>').join('');
+    // 先做一次布局，触发新内容需要的网页字体加载
+    box.getBoundingClientRect();
+    const images = Array.from(box.querySelectorAll('img'), img => img.decode().catch(() => null));
+    await Promise.race([
+        Promise.all(images).then(() => document.fonts.ready),
+        new Promise(r => setTimeout(r, timeout))
+    ]);
+    const boxTop = box.getBoundingClientRect().top;
+    const frameTop = frame.getBoundingClientRect().top + frame.clientTop;
+    const chrome = (boxTop - frameTop) + parseFloat(getComputedStyle(frame).paddingBottom);
+    const extents = Array.from(box.children).map(el => {
+        const rect = el.getBoundingClientRect();
+        const first = el.firstElementChild;
+        const last = el.lastElementChild;
+        const mt = first ? parseFloat(getComputedStyle(first).marginTop) : 0;
+        const mb = last ? parseFloat(getComputedStyle(last).marginBottom) : 0;
+        return [rect.top - mt - boxTop, rect.bottom + mb - boxTop];
+    });
+    return {chrome: chrome, extents: extents};
+}'''
+
+_FENCE = re.compile(r'^\s*(```|~~~)')
+_TABLE_RULE = re.compile(r'^\s*\|?\s*:?-{3,}')
+_HEADING = re.compile(r'^#{1,6}\s')
+# 句末标点之后切句（保留标点）
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;])|(?<=[.!?]\s)')
+
+
+def split_blocks(body: str) -> List[str]:
+    """按空行切分 Markdown 块，代码块内部的空行不切"""
+    blocks = []
+    current: List[str] = []
+    in_fence = False
+    for line in body.split('\n'):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        if not line.strip() and not in_fence:
+            if current:
+                blocks.append('\n'.join(current))
+                current = []
+            continue
+        current.append(line)
+    if current:
+        blocks.append('\n'.join(current))
+    return blocks
+
+
+def break_pages(blocks: List[str], chrome: float, extents: List[List[float]],
+                available_height: float) -> List[str]:
+    """
+    按块的上下边界单遍计算分页点；标题不留在页尾
+
+    Args:
+        blocks: Markdown 块
+        chrome: 外框内边距等固定开销
+        extents: 每个块的 [上边界, 下边界]（含外边距）
+        available_height: 每页允许的高度
+
+    Returns:
+        每页的 Markdown 文本
+    """
+    def fits(first: int, last: int) -> bool:
+        return chrome + extents[last][1] - extents[first][0] <= available_height
+
+    pages = []
+    start = 0
+    for i in range(1, len(blocks)):
+        if fits(start, i):
+            continue
+        end = i
+        if end - 1 > start and _HEADING.match(blocks[end - 1]) and fits(end - 1, i):
+            end -= 1
+        pages.append('\n\n'.join(blocks[start:end]))
+        start = end
+    pages.append('\n\n'.join(blocks[start:]))
+    return pages
+
+
+def _split_units(block: str) -> Tuple[List[str], str, str, str]:
+    """
+    把超长块拆成可切分的单元
+
+    Returns:
+        (单元列表, 单元连接符, 每片前缀, 每片后缀)；代码块每片都补上围栏，表格每片都带表头
+    """
+    lines = block.split('\n')
+    fence = _FENCE.match(lines[0])
+    if fence and len(lines) > 2:
+        closed = _FENCE.match(lines[-1]) is not None
+        inner = lines[1:-1] if closed else lines[1:]
+        return inner, '\n', lines[0] + '\n', '\n' + fence.group(1)
+    if len(lines) > 2 and '|' in lines[0] and _TABLE_RULE.match(lines[1]):
+        return lines[2:], '\n', lines[0] + '\n' + lines[1] + '\n', ''
+    if len(lines) > 1:
+        return lines, '\n', '', ''
+    sentences = [s for s in _SENTENCE_END.split(block) if s]
+    if len(sentences) > 1:
+        return sentences, '', '', ''
+    return list(block), '', '', ''
+
+
+class Paginator:
+    """在一个已加载卡片外壳的页面上测量并分页"""
+
+    def __init__(self, page: Page, to_html: Callable[[str], str], available_height: float,
+                 content_selector: str = '.card-content', measure_selector: Optional[str] = None):
+        """
+        Args:
+            page: 用于测量的页面（视口宽度需与卡片一致）
+            to_html: Markdown 块 -> HTML 的转换函数
+            available_height: measure_selector 元素允许的最大内容高度
+            content_selector: 正文注入的容器
+            measure_selector: 计算高度的外框（含内边距），默认与 content_selector 相同
+        """
+        self.page = page
+        self.to_html = to_html
+        self.available_height = available_height
+        self.content_selector = content_selector
+        self.measure_selector = measure_selector or content_selector
+        self.probes = 0
+
+    async def load(self, shell_html: str) -> None:
+        """加载卡片外壳（正文留空），之后的测量都在这个 DOM 上进行"""
+        await show_html(self.page, shell_html)
+
+    async def _measure(self, blocks: List[str]) -> Tuple[float, List[List[float]]]:
+        result = await self.page.evaluate(
+            _MEASURE_JS,
+            [self.content_selector, self.measure_selector, [self.to_html(b) for b in blocks],
+             READY_TIMEOUT_MS]
+        )
+        return result['chrome'], result['extents']
+
+    async def _fits(self, block: str) -> bool:
+        self.probes += 1
+        chrome, extents = await self._measure([block])
+        top, bottom = extents[0]
+        return chrome + bottom - top <= self.available_height
+
+    async def _split(self, block: str) -> List[str]:
+        """二分查找能放进一页的最长前缀，依次切出超长块的各片"""
+        units, joiner, head, tail = _split_units(block)
+        if len(units) <= 1:
+            return [block]
+
+        pieces = []
+        while units:
+            # fits(0) 恒成立，找最大的 k 使前 k 个单元放得下
+            lo, hi = 0, len(units)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if await self._fits(head + joiner.join(units[:mid]) + tail):
+                    lo = mid
+                else:
+                    hi = mid - 1
+            if lo == 0:
+                # 单个单元就超过一页：没有前后缀时继续细分，否则只能单独成页
+                if not head and not tail:
+                    pieces.extend(await self._split(units[0]))
+                else:
+                    pieces.append(head + units[0] + tail)
+                lo = 1
+            else:
+                pieces.append(head + joiner.join(units[:lo]) + tail)
+            units = units[lo:]
+        return pieces
+
+    async def paginate(self, body: str) -> List[str]:
+        """
+        将 Markdown 正文切分成若干页
+
+        Returns:
+            每页的 Markdown 文本
+        """
+        blocks = split_blocks(body)
+        if not blocks:
+            return []
+
+        chrome, extents = await self._measure(blocks)
+        oversized = [chrome + bottom - top > self.available_height for top, bottom in extents]
+        if any(oversized):
+            split = []
+            for block, too_tall in zip(blocks, oversized):
+                split.extend(await self._split(block) if too_tall else [block])
+            blocks = split
+            chrome, extents = await self._measure(blocks)
+
+        return break_pages(blocks, chrome, extents, self.available_height)
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+发布队列 - 多账号、多篇笔记批量发布
+
+publish_xhs.py 每个进程只用一个 Cookie 发布一篇笔记，话题关键词逐个串行查询。
+发布队列一次接收多个（账号, 笔记）任务：
+1. 每个账号只初始化一次客户端（本地模式一个 XhsClient，API 模式一个 session），各账号并行发布
+2. 话题关键词并发查询，结果按 TTL 缓存，同一关键词只查一次（同时发起的查询合并为一个请求）
+3. 图片流水线上传：当前笔记在等待限速或发布时，后面笔记的图片已经在上传
+4. 每个账号单独限速（两次发布的最小间隔），请求失败时指数退避重试
+   （发布不是幂等的，只在 429 或连接未建立时重试，其余发布失败直接报告，不会重复发笔记）
+
+使用方法:
+    python publish_queue.py jobs.jsonl [--accounts accounts.json] [--api-mode] [--interval 60]
+
+    # 离线压测：先启动模拟 xhs-api 服务
+    python mock_xhs_api.py --port 5005 --fail-rate 0.1 &
+    python publish_queue.py jobs.jsonl --accounts accounts.json --api-mode --interval 0
+
+任务文件（JSON 数组，或每行一个 JSON）:
+    {"account": "main", "title": "标题", "desc": "正文", "images": ["out/cover.png", "out/card_1.png"],
+     "topics": ["AI工具"], "private": false, "post_time": null}
+    account 省略时为 default；图片相对路径相对于任务文件所在目录
+
+账号文件（JSON）:
+    {"main": "a1=...; web_session=...", "alt": {"cookie": "a1=...; web_session=..."}}
+    不指定时只有 default 账号，Cookie 取自 XHS_COOKIE（同 publish_xhs.py）
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError
+
+from publish_xhs import ApiPublisher, LocalPublisher, RateLimitedError, load_cookie, validate_cookie
+
+DEFAULT_ACCOUNT = 'default'
+DEFAULT_INTERVAL = 60.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 2.0
+DEFAULT_UPLOAD_CONCURRENCY = 3
+DEFAULT_TOPIC_TTL = 3600.0
+
+
+class TopicCache:
+    """话题关键词 -> 话题的 TTL 缓存，所有账号共用；同一关键词的并发查询合并为一次请求"""
+
+    def __init__(self, ttl: float = DEFAULT_TOPIC_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def resolve(self, keyword: str,
+                      lookup: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """
+        查询关键词对应的话题
+
+        Args:
+            keyword: 话题关键词
+            lookup: 缓存未命中时的实际查询（没有匹配返回 None，失败抛出异常，失败结果不缓存）
+        """
+        entry = self._entries.get(keyword)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        task = self._pending.get(keyword)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._lookup(keyword, lookup))
+            self._pending[keyword] = task
+        else:
+            self.hits += 1
+        # shield：一个等待者被取消时不影响其他等待同一关键词的任务
+        return await asyncio.shield(task)
+
+    async def _lookup(self, keyword: str, lookup) -> Optional[Dict[str, Any]]:
+        try:
+            topic = await lookup(keyword)
+            self._entries[keyword] = (time.monotonic() + self.ttl, topic)
+            return topic
+        finally:
+            self._pending.pop(keyword, None)
+
+
+class RateLimiter:
+    """
+    保证上一次操作结束到下一次操作开始至少间隔 interval 秒
+
+    按结束时间计算：请求在路上的耗时有波动，按开始时间计算时服务端看到的间隔可能不足
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "RateLimiter":
+        await self._lock.acquire()
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._next = time.monotonic() + self.interval
+        self._lock.release()
+
+
+async def with_retry(call: Callable[[], Any], what: str, retries: int, backoff: float,
+                     limiter: Optional[RateLimiter] = None,
+                     retryable: Optional[Callable[[Exception], bool]] = None) -> Any:
+    """
+    在线程中执行同步调用，失败时按指数退避（带随机抖动）重试
+
+    Args:
+        call: 同步调用（xhs 库和 requests 都是阻塞的）
+        what: 出错提示中的操作名称
+        retries: 最多重试次数
+        backoff: 第一次重试前的等待秒数，之后每次翻倍
+        limiter: 每次尝试都要经过的限速器
+        retryable: 判断异常是否可以重试，返回 False 时直接抛出；None 表示所有异常都重试
+    """
+    for attempt in range(retries + 1):
+        try:
+            if limiter is None:
+                return await asyncio.to_thread(call)
+            async with limiter:
+                return await asyncio.to_thread(call)
+        except Exception as e:
+            if attempt == retries or (retryable is not None and not retryable(e)):
+                raise
+            delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after:
+                delay = max(delay, retry_after)
+            print(f"  ⚠️ {what}失败（第 {attempt + 1} 次）: {e}，{delay:.1f}s 后重试")
+            await asyncio.sleep(delay)
+
+
+def publish_not_sent(error: Exception) -> bool:
+    """
+    发布请求是否确定没有生效（只有这时重试发布才不会重复发笔记）
+
+    429 表示服务端拒绝处理；连接没建立（拒绝连接、DNS 失败、连接超时）时请求还没发出。
+    读超时、连接中断、5xx 等都可能发生在服务端已经创建笔记之后，不能重试。
+    """
+    if isinstance(error, RateLimitedError):
+        return True
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        # requests 把 urllib3 的 MaxRetryError 包一层，reason 为 NewConnectionError 等时连接未建立
+        reason = getattr(error.args[0], 'reason', None)
+        return isinstance(reason, ConnectTimeoutError)
+    return False
+
+
+class AccountWorker:
+    """一个账号的发布流水线：客户端只初始化一次，图片提前上传，发布按账号限速"""
+
+    def __init__(self, name: str, cookie: str, args: argparse.Namespace, topics: TopicCache):
+        self.name = name
+        self.args = args
+        self.topics = topics
+        if args.api_mode:
+            self.publisher = ApiPublisher(cookie, args.api_url, session_id=f'queue_{name}')
+        else:
+            self.publisher = LocalPublisher(cookie)
+        self.limiter = RateLimiter(args.interval)
+        self.upload_slots = asyncio.Semaphore(max(1, args.upload_concurrency))
+
+    async def _retry(self, call: Callable[[], Any], what: str, limiter: Optional[RateLimiter] = None,
+                     retryable: Optional[Callable[[Exception], bool]] = None) -> Any:
+        return await with_retry(call, f"[{self.name}] {what}", self.args.retries, self.args.backoff,
+                                limiter, retryable)
+
+    async def connect(self) -> None:
+        """初始化客户端（本地模式缺少 xhs 库时直接退出）"""
+        if isinstance(self.publisher, ApiPublisher):
+            result = await self._retry(self.publisher.connect, '连接 API 服务')
+            nickname = (result.get('user_info') or {}).get('nickname', '未知')
+            print(f"👤 [{self.name}] 已连接: {nickname}")
+        else:
+            await asyncio.to_thread(self.publisher.init_client)
+            print(f"👤 [{self.name}] 客户端已初始化")
+
+    async def _find_topic(self, keyword: str) -> Optional[Dict[str, Any]]:
+        return await self._retry(lambda: self.publisher.suggest_topic(keyword), f'搜索话题 {keyword} ')
+
+    async def _resolve_topic(self, keyword: str) -> Optional[Dict[str, Any]]:
+        try:
+            topic = await self.topics.resolve(keyword, self._find_topic)
+        except Exception as e:
+            print(f"  ⚠️ [{self.name}] 搜索话题失败 [{keyword}]: {e}")
+            return None
+        if topic is None:
+            print(f"  ⚠️ [{self.name}] 未找到话题: {keyword}")
+        return topic
+
+    async def _upload(self, path: str) -> Optional[Dict[str, Any]]:
+        if not self.publisher.supports_upload():
+            return None
+        async with self.upload_slots:
+            return await self._retry(lambda: self.publisher.upload_image(path),
+                                     f'上传 {os.path.basename(path)} ')
+
+    async def prepare(self, job: Dict[str, Any]) -> Tuple[List[Optional[Dict[str, Any]]], List[Dict[str, Any]]]:
+        """并发上传图片、查询话题，返回 (已上传图片, 话题)"""
+        uploads = asyncio.gather(*(self._upload(path) for path in job['images']))
+        found = asyncio.gather(*(self._resolve_topic(keyword) for keyword in job['topics']))
+        uploaded, topics = await asyncio.gather(uploads, found)
+        return list(uploaded), [t for t in topics if t]
+
+    async def publish(self, job: Dict[str, Any], uploaded: List[Optional[Dict[str, Any]]],
+                      topics: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        按账号限速发布一篇笔记
+
+        发布不是幂等的：只在确定请求没有生效时重试（见 publish_not_sent），其他失败直接报告，
+        避免超时或 5xx 后重试把同一篇笔记发两次
+        """
+        desc = job['desc']
+        if topics:
+            # 把标签名加到文案末尾，让标签在文案中显示（同 publish_xhs.py）
+            topic_text = " ".join(f"#{t.get('name')}" for t in topics)
+            desc = f"{desc}\n\n{topic_text}" if desc else topic_text
+
+        if all(u is not None for u in uploaded):
+            def call():
+                return self.publisher.publish_uploaded(job['title'], desc, uploaded, job['private'],
+                                                       job['post_time'], topics or None)
+        else:
+            # xhs 库不支持单独上传时，由 create_image_note 在发布时上传
+            def call():
+                return self.publisher.publish(job['title'], desc, job['images'], job['private'],
+                                              job['post_time'], topics or None)
+        return await self._retry(call, f"发布《{job['title']}》", limiter=self.limiter,
+                                 retryable=publish_not_sent)
+
+    async def run(self, jobs: List[Dict[str, Any]], started: float) -> List[Dict[str, Any]]:
+        """
+        依次发布该账号的任务；发布第 i 篇时，第 i+1 ~ i+prefetch 篇的图片和话题已在准备
+
+        Returns:
+            每个任务的结果
+        """
+        try:
+            await self.connect()
+        except Exception as e:
+            print(f"❌ [{self.name}] 账号初始化失败: {e}")
+            return [dict(_job_entry(job), success=False, error=f'账号初始化失败: {e}') for job in jobs]
+
+        prepared: Dict[int, asyncio.Task] = {}
+        results = []
+        for i, job in enumerate(jobs):
+            for j in range(i, min(len(jobs), i + self.args.prefetch + 1)):
+                if j not in prepared:
+                    prepared[j] = asyncio.ensure_future(self.prepare(jobs[j]))
+            entry = _job_entry(job)
+            try:
+                uploaded, topics = await prepared.pop(i)
+                result = await self.publish(job, uploaded, topics)
+                note_id = (result.get('note_id') or result.get('id')) if isinstance(result, dict) else None
+                entry.update(success=True, note_id=note_id, topics=[t.get('name') for t in topics])
+                print(f"  ✅ [{self.name}] 已发布《{job['title']}》" + (f" 笔记ID: {note_id}" if note_id else ''))
+            except Exception as e:
+                entry.update(success=False, error=str(e))
+                print(f"  ❌ [{self.name}] 发布失败《{job['title']}》: {e}")
+            entry['finished'] = round(time.perf_counter() - started, 3)
+            results.append(entry)
+        return results
+
+
+def _job_entry(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {'index': job['index'], 'account': job['account'], 'title': job['title']}
+
+
+def load_accounts(path: Optional[str]) -> Dict[str, str]:
+    """读取账号文件，返回 {账号名: Cookie}；未指定时使用 XHS_COOKIE 作为 default 账号"""
+    if not path:
+        return {DEFAULT_ACCOUNT: load_cookie()}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {name: value if isinstance(value, str) else value['cookie'] for name, value in data.items()}
+
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """读取任务文件（JSON 数组或 JSON Lines），补全默认字段并检查图片"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        raw = json.loads(text)
+    else:
+        raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for index, item in enumerate(raw):
+        title = item.get('title', '')
+        if len(title) > 20:
+            print(f"⚠️ 警告: 第 {index + 1} 个任务标题超过20字，将被截断")
+            title = title[:20]
+        images = []
+        for image in item.get('images') or []:
+            image = os.path.join(base_dir, image)
+            if os.path.exists(image):
+                images.append(os.path.abspath(image))
+            else:
+                print(f"⚠️ 警告: 图片不存在 - {image}")
+        jobs.append({
+            'index': index,
+            'account': item.get('account') or DEFAULT_ACCOUNT,
+            'title': title,
+            'desc': item.get('desc', ''),
+            'images': images,
+            'topics': item.get('topics') or [],
+            'private': bool(item.get('private', False)),
+            'post_time': item.get('post_time')
+        })
+    return jobs
+
+
+async def run_queue(jobs: List[Dict[str, Any]], accounts: Dict[str, str],
+                    args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    各账号并行执行自己的发布流水线
+
+    Returns:
+        报告字典 {'created', 'mode', 'elapsed', 'jobs', 'summary'}
+    """
+    by_account: Dict[str, List[Dict[str, Any]]] = {}
+    failed = []
+    for job in jobs:
+        if job['account'] not in accounts:
+            failed.append(dict(_job_entry(job), success=False, error=f"未配置账号: {job['account']}"))
+        elif not job['images']:
+            failed.append(dict(_job_entry(job), success=False, error='没有有效的图片文件'))
+        else:
+            by_account.setdefault(job['account'], []).append(job)
+
+    # xhs 库和 requests 都是阻塞调用，在线程中执行；线程数够所有账号同时上传
+    workers_needed = len(by_account) * (max(1, args.upload_concurrency) + 2)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=max(4, workers_needed)))
+
+    topics = TopicCache(args.topic_ttl)
+    workers = [AccountWorker(name, accounts[name], args, topics) for name in by_account]
+    started = time.perf_counter()
+    batches = await asyncio.gather(*(worker.run(by_account[worker.name], started) for worker in workers))
+    elapsed = time.perf_counter() - started
+
+    results = sorted(failed + [entry for batch in batches for entry in batch], key=lambda e: e['index'])
+    published = sum(1 for entry in results if entry['success'])
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'mode': 'api' if args.api_mode else 'local',
+        'elapsed': round(elapsed, 3),
+        'jobs': results,
+        'summary': {
+            'jobs': len(results),
+            'published': published,
+            'failed': len(results) - published,
+            'accounts': len(workers),
+            'notes_per_minute': round(published / elapsed * 60, 1) if elapsed > 0 else 0.0,
+            'topic_cache': {'hits': topics.hits, 'misses': topics.misses}
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='多账号批量发布小红书笔记（每个账号一个客户端，图片流水线上传，按账号限速）'
+    )
+    parser.add_argument(
+        'jobs',
+        help='任务文件（JSON 数组或每行一个 JSON）'
+    )
+    parser.add_argument(
+        '--accounts', '-a',
+        default=None,
+        help='账号文件（JSON，{账号名: Cookie}），默认只使用 XHS_COOKIE'
+    )
+    parser.add_argument(
+        '--api-mode',
+        action='store_true',
+        help='使用 API 模式发布（需要 xhs-api 服务或 mock_xhs_api.py 运行）'
+    )
+    parser.add_argument(
+        '--api-url',
+        default=None,
+        help='API 服务地址（默认: http://localhost:5005）'
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help=f'同一账号两次发布的最小间隔秒数（默认: {DEFAULT_INTERVAL:.0f}）'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=f'每个请求失败后的最多重试次数，发布只在 429 或连接未建立时重试（默认: {DEFAULT_RETRIES}）'
+    )
+    parser.add_argument(
+        '--backoff',
+        type=float,
+        default=DEFAULT_BACKOFF,
+        help=f'第一次重试前的等待秒数，之后每次翻倍（默认: {DEFAULT_BACKOFF}）'
+    )
+    parser.add_argument(
+        '--upload-concurrency',
+        type=int,
+        default=DEFAULT_UPLOAD_CONCURRENCY,
+        help=f'每个账号同时上传的图片数（默认: {DEFAULT_UPLOAD_CONCURRENCY}）'
+    )
+    parser.add_argument(
+        '--prefetch',
+        type=int,
+        default=1,
+        help='发布当前笔记时，提前上传图片的后续笔记数（默认: 1）'
+    )
+    parser.add_argument(
+        '--topic-ttl',
+        type=float,
+        default=DEFAULT_TOPIC_TTL,
+        help=f'话题查询结果的缓存秒数（默认: {DEFAULT_TOPIC_TTL:.0f}）'
+    )
+    parser.add_argument(
+        '--report',
+        default=None,
+        help='把发布结果保存为 JSON 文件'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='仅验证任务和账号，不实际发布'
+    )
+
+    args = parser.parse_args()
+    args.prefetch = max(0, args.prefetch)
+
+    if not os.path.exists(args.jobs):
+        print(f"❌ 错误: 文件不存在 - {args.jobs}")
+        sys.exit(1)
+
+    accounts = load_accounts(args.accounts)
+    for name, cookie in accounts.items():
+        if not validate_cookie(cookie):
+            print(f"  ↳ 账号: {name}")
+    jobs = load_jobs(args.jobs)
+    if not jobs:
+        print("❌ 错误: 任务文件中没有任务")
+        sys.exit(1)
+
+    if args.dry_run:
+        print("\n🔍 验证模式 - 不会实际发布")
+        for job in jobs:
+            status = '✅' if job['account'] in accounts and job['images'] else '❌'
+            print(f"  {status} [{job['account']}] 《{job['title']}》 图片 {len(job['images'])} 张，"
+                  f"话题 {len(job['topics'])} 个")
+        print(f"  📡 模式: {'API' if args.api_mode else '本地'}，账号 {len(accounts)} 个，任务 {len(jobs)} 个")
+        return
+
+    print(f"🚀 发布队列: {len(jobs)} 篇笔记，{len(accounts)} 个账号"
+          f"（{'API' if args.api_mode else '本地'}模式，每账号间隔 {args.interval:g}s）")
+    report = asyncio.run(run_queue(jobs, accounts, args))
+
+    summary = report['summary']
+    print(f"\n✨ 发布完成！成功 {summary['published']}/{summary['jobs']} 篇，耗时 {report['elapsed']}s"
+          f"（{summary['notes_per_minute']} 篇/分钟，话题缓存命中 {summary['topic_cache']['hits']} 次）")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📋 发布报告已保存: {args.report}")
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -24,6 +24,7 @@
 """
 
 import argparse
+import mimetypes
 import os
 import sys
 import json
@@ -117,6 +118,25 @@ def validate_images(image_paths: List[str]) -> List[str]:
     return valid_images
 
 
+class RateLimitedError(Exception):
+    """服务端返回 429：请求没有被处理，可以在 retry_after 秒后重试"""
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def check_rate_limit(resp) -> None:
+    """响应为 429 时抛出 RateLimitedError（带 Retry-After 秒数）"""
+    if resp.status_code != 429:
+        return
+    try:
+        retry_after = float(resp.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        retry_after = None
+    raise RateLimitedError('发布过于频繁（HTTP 429）', retry_after)
+
+
 class LocalPublisher:
     """本地发布模式：直接使用 xhs 库"""
     
@@ -159,16 +179,22 @@ class LocalPublisher:
             print(f"⚠️ 无法获取用户信息: {e}")
             return None
     
+    def suggest_topic(self, keyword: str) -> Optional[Dict[str, Any]]:
+        """查询一个关键词对应的话题，没有匹配时返回 None，请求失败时抛出异常"""
+        result = self.client.get_suggest_topic(keyword)
+        if result and len(result) > 0:
+            # 取第一个匹配的话题，直接使用原始返回格式
+            # xhs 库需要的格式: {"id": "xxx", "name": "xxx", "type": "topic", "link": "xxx"}
+            return result[0]
+        return None
+    
     def search_topics(self, keywords: List[str]) -> List[Dict[str, Any]]:
         """搜索话题，获取话题ID"""
         topics = []
         for keyword in keywords:
             try:
-                result = self.client.get_suggest_topic(keyword)
-                if result and len(result) > 0:
-                    # 取第一个匹配的话题，直接使用原始返回格式
-                    topic = result[0]
-                    # xhs 库需要的格式: {"id": "xxx", "name": "xxx", "type": "topic", "link": "xxx"}
+                topic = self.suggest_topic(keyword)
+                if topic:
                     topics.append(topic)
                     print(f"  ✅ 找到话题: #{topic.get('name')}")
                 else:
@@ -177,6 +203,35 @@ class LocalPublisher:
                 print(f"  ⚠️ 搜索话题失败 [{keyword}]: {e}")
         return topics
     
+    def supports_upload(self) -> bool:
+        """xhs 库是否提供单独上传图片的接口（用于先传图、再发布）"""
+        return all(hasattr(self.client, name)
+                   for name in ('get_upload_files_permit', 'upload_file', 'create_note'))
+    
+    def upload_image(self, path: str) -> Dict[str, Any]:
+        """上传一张图片，返回发布时引用的图片信息"""
+        mime = mimetypes.guess_type(path)[0] or 'image/jpeg'
+        file_id, token = self.client.get_upload_files_permit('image')
+        self.client.upload_file(file_id, token, path, content_type=mime)
+        return {
+            'file_id': file_id,
+            'metadata': {'source': -1},
+            'stickers': {'version': 2, 'floating': []},
+            'extra_info_json': json.dumps({'mimeType': mime})
+        }
+    
+    def publish_uploaded(self, title: str, desc: str, uploaded: List[Dict[str, Any]],
+                         is_private: bool = False, post_time: str = None,
+                         topics: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """用已上传的图片发布图文笔记（不打印），失败时抛出异常"""
+        return self.client.create_note(
+            title, desc, 'normal',
+            topics=topics,
+            image_info={'images': uploaded},
+            post_time=post_time,
+            is_private=is_private
+        )
+    
     def publish(self, title: str, desc: str, images: List[str], 
                 is_private: bool = False, post_time: str = None,
                 topics: List[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -229,51 +284,122 @@ class LocalPublisher:
 class ApiPublisher:
     """API 发布模式：通过 xhs-api 服务发布"""
     
-    def __init__(self, cookie: str, api_url: str = None):
+    def __init__(self, cookie: str, api_url: str = None, session_id: str = 'md2redbook_session'):
         self.cookie = cookie
         self.api_url = api_url or get_api_url()
-        self.session_id = 'md2redbook_session'
+        # 多账号同时使用一个 API 服务时，每个账号一个 session_id
+        self.session_id = session_id
+        # 服务是否提供 /upload/image（先传图、再发布），None 表示尚未探测
+        self._upload_supported: Optional[bool] = None
+    
+    def connect(self) -> Dict[str, Any]:
+        """健康检查并初始化 session，失败时抛出异常；返回 /init 的响应"""
+        resp = requests.get(f"{self.api_url}/health", timeout=5)
+        if resp.status_code != 200:
+            raise Exception("API 服务不可用")
+        
+        resp = requests.post(
+            f"{self.api_url}/init",
+            json={
+                "session_id": self.session_id,
+                "cookie": self.cookie
+            },
+            timeout=30
+        )
+        result = resp.json()
+        if resp.status_code == 200 and result.get('status') in ('success', 'warning'):
+            return result
+        raise Exception(result.get('error', '初始化失败'))
         
     def init_client(self):
         """初始化 API 客户端"""
         print(f"📡 连接 API 服务: {self.api_url}")
         
-        # 健康检查
         try:
-            resp = requests.get(f"{self.api_url}/health", timeout=5)
-            if resp.status_code != 200:
-                raise Exception("API 服务不可用")
+            result = self.connect()
         except requests.exceptions.RequestException as e:
             print(f"❌ 无法连接到 API 服务: {e}")
             print(f"\n💡 请确保 xhs-api 服务已启动：")
             print(f"   cd xhs-api && python app_full.py")
             sys.exit(1)
-        
-        # 初始化 session
-        try:
-            resp = requests.post(
-                f"{self.api_url}/init",
-                json={
-                    "session_id": self.session_id,
-                    "cookie": self.cookie
-                },
-                timeout=30
-            )
-            result = resp.json()
-            
-            if resp.status_code == 200 and result.get('status') == 'success':
-                print(f"✅ API 初始化成功")
-                user_info = result.get('user_info', {})
-                if user_info:
-                    print(f"👤 当前用户: {user_info.get('nickname', '未知')}")
-            elif result.get('status') == 'warning':
-                print(f"⚠️ {result.get('message')}")
-            else:
-                raise Exception(result.get('error', '初始化失败'))
-                
         except Exception as e:
             print(f"❌ API 初始化失败: {e}")
             sys.exit(1)
+        
+        if result.get('status') == 'warning':
+            print(f"⚠️ {result.get('message')}")
+        else:
+            print(f"✅ API 初始化成功")
+            user_info = result.get('user_info', {})
+            if user_info:
+                print(f"👤 当前用户: {user_info.get('nickname', '未知')}")
+    
+    def suggest_topic(self, keyword: str) -> Optional[Dict[str, Any]]:
+        """查询一个关键词对应的话题；服务不支持话题搜索或没有匹配时返回 None"""
+        resp = requests.post(
+            f"{self.api_url}/topic/suggest",
+            json={"session_id": self.session_id, "keyword": keyword},
+            timeout=10
+        )
+        if resp.status_code == 404:
+            return None
+        result = resp.json()
+        if resp.status_code != 200 or result.get('status') != 'success':
+            raise Exception(result.get('error', '话题搜索失败'))
+        topics = result.get('topics') or []
+        return topics[0] if topics else None
+    
+    def supports_upload(self) -> bool:
+        """服务是否支持单独上传图片（未探测时先按支持处理）"""
+        return self._upload_supported is not False
+    
+    def upload_image(self, path: str) -> Dict[str, Any]:
+        """
+        通过 /upload/image 上传一张图片，返回 {'file_id'}
+        
+        服务不支持单独上传时返回 {'path'}，由发布请求携带图片路径
+        """
+        if self._upload_supported is False:
+            return {'path': path}
+        resp = requests.post(
+            f"{self.api_url}/upload/image",
+            json={"session_id": self.session_id, "file": path},
+            timeout=60
+        )
+        if resp.status_code == 404:
+            self._upload_supported = False
+            return {'path': path}
+        result = resp.json()
+        if resp.status_code != 200 or result.get('status') != 'success':
+            raise Exception(result.get('error', '图片上传失败'))
+        self._upload_supported = True
+        return {'file_id': result['file_id']}
+    
+    def publish_uploaded(self, title: str, desc: str, uploaded: List[Dict[str, Any]],
+                         is_private: bool = False, post_time: str = None,
+                         topics: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """用已上传的图片发布图文笔记（不打印），失败时抛出异常"""
+        payload = {
+            "session_id": self.session_id,
+            "title": title,
+            "desc": desc,
+            "is_private": is_private
+        }
+        if all('file_id' in u for u in uploaded):
+            payload["file_ids"] = [u['file_id'] for u in uploaded]
+        else:
+            payload["files"] = [u.get('path') for u in uploaded]
+        if post_time:
+            payload["post_time"] = post_time
+        if topics:
+            payload["topics"] = topics
+        
+        resp = requests.post(f"{self.api_url}/publish/image", json=payload, timeout=120)
+        check_rate_limit(resp)
+        result = resp.json()
+        if resp.status_code == 200 and result.get('status') == 'success':
+            return result.get('result', {})
+        raise Exception(result.get('error', f'发布失败（HTTP {resp.status_code}）'))
     
     def get_user_info(self) -> Optional[Dict[str, Any]]:
         """获取当前登录用户信息"""
@@ -323,6 +449,7 @@ class ApiPublisher:
                 json=payload,
                 timeout=120
             )
+            check_rate_limit(resp)
             result = resp.json()
             
             if resp.status_code == 200 and result.get('status') == 'success':
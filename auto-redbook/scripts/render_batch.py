@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+批量渲染 - 一次渲染整个目录（或通配符匹配）的 Markdown 笔记
+
+逐个文件调用 render_xhs.py 时，每篇笔记都要冷启动一次浏览器，而且同一时间只渲染一篇。
+批量渲染只启动一个浏览器（RenderSession 页面池），所有笔记的封面和正文卡片一起排队，
+哪个页面空闲就渲染哪张，不同笔记的卡片并发进行；页面池大小（--pages）决定并发数。
+
+每篇笔记输出到 <输出目录>/<文件名>/，全部完成后写出清单 manifest.json，
+记录每篇笔记的结果和每张卡片的耗时、是否命中渲染缓存。
+
+使用方法:
+    python render_batch.py notes/ -o out/ [--renderer v1|v2] [--theme default] [--pages 4]
+    python render_batch.py "calendar/2026-*.md" -o out/ --renderer v2 --style xiaohongshu
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import render_xhs
+import render_xhs_v2
+from card_encoder import DEFAULT_QUALITY, IMAGE_FORMATS, CardEncoder, encoder_from_args
+from render_cache import RenderCache
+from render_session import DEFAULT_PAGES, RenderSession
+
+
+def collect_markdown_files(inputs: List[str]) -> List[str]:
+    """
+    展开输入的目录、通配符和文件，返回去重后的 Markdown 文件列表
+
+    目录只取其中的 *.md（不递归），通配符按字母顺序展开
+    """
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(sorted(glob.glob(os.path.join(item, '*.md'))))
+        elif glob.has_magic(item):
+            files.extend(sorted(p for p in glob.glob(item, recursive=True) if os.path.isfile(p)))
+        elif os.path.isfile(item):
+            files.append(item)
+        else:
+            print(f"⚠️ 跳过不存在的路径: {item}")
+
+    seen = set()
+    result = []
+    for path in files:
+        key = os.path.realpath(path)
+        if key not in seen:
+            seen.add(key)
+            result.append(path)
+    return result
+
+
+def assign_output_dirs(files: List[str], output_root: str) -> List[str]:
+    """每篇笔记一个输出子目录（以文件名命名），重名时追加序号"""
+    used: Dict[str, int] = {}
+    dirs = []
+    for path in files:
+        stem = Path(path).stem
+        count = used.get(stem, 0)
+        used[stem] = count + 1
+        name = stem if count == 0 else f"{stem}-{count + 1}"
+        dirs.append(os.path.join(output_root, name))
+    return dirs
+
+
+async def render_note(md_file: str, output_dir: str, args: argparse.Namespace,
+                      session: RenderSession, encoder: CardEncoder) -> Dict[str, Any]:
+    """渲染一篇笔记，返回清单中的条目"""
+    cards: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    entry: Dict[str, Any] = {'markdown': md_file, 'output_dir': output_dir}
+    try:
+        if args.renderer == 'v2':
+            images = await render_xhs_v2.render_markdown_to_cards(
+                md_file, output_dir, args.style, session=session,
+                use_cache=not args.no_cache, on_card=cards.append, encoder=encoder
+            )
+        else:
+            images = await render_xhs.render_markdown_to_cards(
+                md_file, output_dir,
+                theme=args.theme,
+                mode=args.mode,
+                width=args.width,
+                height=args.height,
+                max_height=args.max_height,
+                dpr=args.dpr,
+                session=session,
+                use_cache=not args.no_cache,
+                on_card=cards.append,
+                encoder=encoder
+            )
+        entry['success'] = True
+        entry['images'] = images
+    except Exception as e:
+        print(f"❌ 渲染失败: {md_file} - {e}")
+        entry['success'] = False
+        entry['error'] = str(e)
+    entry['elapsed'] = round(time.perf_counter() - start, 3)
+    entry['cards'] = sorted(cards, key=lambda c: c['path'])
+    return entry
+
+
+async def render_batch(files: List[str], args: argparse.Namespace,
+                       encoder: CardEncoder) -> Dict[str, Any]:
+    """
+    共用一个页面池并发渲染所有笔记
+
+    Returns:
+        清单字典 {'created', 'renderer', 'pages', 'elapsed', 'notes', 'summary'}
+    """
+    output_dirs = assign_output_dirs(files, args.output_dir)
+    start = time.perf_counter()
+    # 同时展开的笔记数有上限（解析和分页也占内存），卡片的实际并发由页面池决定
+    note_slots = asyncio.Semaphore(max(2, args.pages * 2))
+
+    async def run(md_file: str, output_dir: str) -> Dict[str, Any]:
+        async with note_slots:
+            return await render_note(md_file, output_dir, args, session, encoder)
+
+    async with RenderSession(pages=args.pages) as session:
+        notes = await asyncio.gather(*(run(f, d) for f, d in zip(files, output_dirs)))
+
+    elapsed = time.perf_counter() - start
+    card_count = sum(len(n['cards']) for n in notes)
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'renderer': args.renderer,
+        'format': encoder.fmt,
+        'pages': args.pages,
+        'elapsed': round(elapsed, 3),
+        'notes': list(notes),
+        'summary': {
+            'notes': len(notes),
+            'failed': sum(1 for n in notes if not n['success']),
+            'cards': card_count,
+            'cached': sum(1 for n in notes for c in n['cards'] if c['cached']),
+            'cards_per_second': round(card_count / elapsed, 2) if elapsed > 0 else 0.0
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='批量渲染多篇 Markdown 笔记为小红书卡片（共用一个浏览器页面池并发渲染）'
+    )
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help='Markdown 文件、目录（取其中的 *.md）或通配符（如 "notes/*.md"）'
+    )
+    parser.add_argument(
+        '--output-dir', '-o',
+        default=os.getcwd(),
+        help='输出根目录，每篇笔记一个子目录（默认为当前工作目录）'
+    )
+    parser.add_argument(
+        '--renderer', '-r',
+        choices=['v1', 'v2'],
+        default='v1',
+        help='渲染器：v1 为 render_xhs.py（主题 + 分页模式），v2 为 render_xhs_v2.py（样式）（默认: v1）'
+    )
+    parser.add_argument(
+        '--theme', '-t',
+        choices=render_xhs.AVAILABLE_THEMES,
+        default='default',
+        help='v1 排版主题（默认: default）'
+    )
+    parser.add_argument(
+        '--mode', '-m',
+        choices=render_xhs.PAGING_MODES,
+        default='separator',
+        help='v1 分页模式（默认: separator）'
+    )
+    parser.add_argument(
+        '--style', '-s',
+        choices=list(render_xhs_v2.STYLES.keys()),
+        default='purple',
+        help='v2 样式（默认: purple）'
+    )
+    parser.add_argument(
+        '--width', '-w',
+        type=int,
+        default=render_xhs.DEFAULT_WIDTH,
+        help=f'v1 图片宽度（默认: {render_xhs.DEFAULT_WIDTH}）'
+    )
+    parser.add_argument(
+        '--height',
+        type=int,
+        default=render_xhs.DEFAULT_HEIGHT,
+        help=f'v1 图片高度（默认: {render_xhs.DEFAULT_HEIGHT}）'
+    )
+    parser.add_argument(
+        '--max-height',
+        type=int,
+        default=render_xhs.MAX_HEIGHT,
+        help=f'v1 dynamic 模式下的最大高度（默认: {render_xhs.MAX_HEIGHT}）'
+    )
+    parser.add_argument(
+        '--dpr',
+        type=int,
+        default=2,
+        help='v1 设备像素比（默认: 2）'
+    )
+    parser.add_argument(
+        '--pages',
+        type=int,
+        default=DEFAULT_PAGES,
+        help=f'并发渲染的页面数，建议不超过 CPU 核数（默认: {DEFAULT_PAGES}）'
+    )
+    parser.add_argument(
+        '--format', '-f',
+        choices=IMAGE_FORMATS,
+        default='png',
+        help='图片格式，jpeg/webp 体积远小于 png（默认: png）'
+    )
+    parser.add_argument(
+        '--quality', '-q',
+        type=int,
+        default=DEFAULT_QUALITY,
+        help=f'jpeg/webp 质量，指定 --target-kb 时为质量上限（默认: {DEFAULT_QUALITY}）'
+    )
+    parser.add_argument(
+        '--target-kb',
+        type=float,
+        help='jpeg/webp 每张图片的目标大小（KB），超出时自动降低质量'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='不使用渲染缓存，所有卡片重新截图'
+    )
+    parser.add_argument(
+        '--manifest',
+        help='清单文件路径（默认: <输出目录>/manifest.json）'
+    )
+
+    args = parser.parse_args()
+
+    encoder = encoder_from_args(args.format, args.quality, args.target_kb)
+    files = collect_markdown_files(args.inputs)
+    if not files:
+        print("❌ 错误: 没有找到 Markdown 文件")
+        sys.exit(1)
+
+    print(f"📚 批量渲染 {len(files)} 篇笔记（渲染器: {args.renderer}，页面池: {args.pages}）")
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = asyncio.run(render_batch(files, args, encoder))
+
+    manifest_path = args.manifest or os.path.join(args.output_dir, 'manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    summary = manifest['summary']
+    print(f"\n✨ 批量渲染完成！{summary['notes']} 篇笔记，{summary['cards']} 张图片"
+          f"（缓存命中 {summary['cached']} 张），耗时 {manifest['elapsed']}s，"
+          f"{summary['cards_per_second']} 张/秒")
+    cache = None if args.no_cache else RenderCache.default()
+    if cache:
+        stats = cache.stats()
+        print(f"💾 渲染缓存占用 {stats['size_mb']}MB / {stats['max_size_mb']}MB")
+    print(f"📋 清单已保存: {manifest_path}")
+    if summary['failed']:
+        print(f"❌ {summary['failed']} 篇笔记渲染失败，详见清单")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+卡片渲染缓存 - 按最终卡片 HTML 寻址，未变化的卡片不再截图
+
+修改笔记中的一段后重新渲染，只有这一段所在的卡片（以及页码变化的卡片）HTML 会变，
+其余卡片直接从缓存硬链接（跨文件系统时复制）到输出目录。
+
+缓存键 = sha256(卡片 HTML + 宽 + 高 + 模式 + 最大高度 + dpr + 编码参数)，HTML 中已内联主题 CSS。
+缓存文件沿用输出图片的扩展名（.png / .jpg / .webp）。
+按总大小做 LRU 淘汰（命中时刷新 mtime，超限时删最久未用的）。
+
+环境变量:
+    XHS_RENDER_CACHE_DIR    缓存目录（默认 ~/.cache/auto-redbook/cards）
+    XHS_RENDER_CACHE_MB     缓存大小上限 MB（默认 500）
+    XHS_RENDER_NO_CACHE=1   关闭缓存（也可用渲染脚本的 --no-cache）
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_DIR = "~/.cache/auto-redbook/cards"
+DEFAULT_MAX_SIZE_MB = 500
+CACHE_SUFFIXES = ('.png', '.jpg', '.webp')
+
+
+class RenderCache:
+    """按卡片内容寻址的磁盘 LRU 缓存"""
+
+    _default: Optional["RenderCache"] = None
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存总大小上限（MB），超出按最久未使用淘汰
+        """
+        self.cache_dir = Path(os.path.expanduser(cache_dir or DEFAULT_CACHE_DIR))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._total_bytes = sum(p.stat().st_size for p in self._entries())
+
+    @classmethod
+    def default(cls) -> Optional["RenderCache"]:
+        """
+        进程内共享的默认缓存，按环境变量创建
+
+        Returns:
+            缓存实例；设置了 XHS_RENDER_NO_CACHE 时返回 None
+        """
+        if os.getenv('XHS_RENDER_NO_CACHE'):
+            return None
+        if cls._default is None:
+            cls._default = cls(os.getenv('XHS_RENDER_CACHE_DIR'),
+                               float(os.getenv('XHS_RENDER_CACHE_MB', DEFAULT_MAX_SIZE_MB)))
+        return cls._default
+
+    @staticmethod
+    def make_key(html: str, width: int, height: int, mode: str = '',
+                 max_height: int = 0, dpr: int = 1, encoding: str = '') -> str:
+        """由卡片 HTML 和截图参数计算缓存键（encoding 见 CardEncoder.cache_tag）"""
+        h = hashlib.sha256()
+        header = f"{width}x{height}|{mode}|{max_height}|{dpr}"
+        if encoding:
+            header += f"|{encoding}"
+        h.update(f"{header}\0".encode('utf-8'))
+        h.update(html.encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, key: str, output_path: str) -> Path:
+        return self.cache_dir / f"{key}{Path(output_path).suffix or '.png'}"
+
+    def _entries(self) -> List[Path]:
+        return [p for p in self.cache_dir.iterdir() if p.suffix in CACHE_SUFFIXES]
+
+    @staticmethod
+    def _place(src: Path, dst: Path) -> None:
+        """硬链接 src 到 dst（先写临时名再原子替换），跨文件系统时复制"""
+        if dst.exists() and os.path.samefile(src, dst):
+            # 已经是同一个文件（rename 到自身的硬链接不会生效，会留下临时文件）
+            return
+        tmp = dst.with_name(f".{dst.name}.{threading.get_ident()}.part")
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    def get(self, key: str, output_path: str) -> bool:
+        """
+        命中时把缓存的图片放到 output_path 并刷新访问时间
+
+        Returns:
+            是否命中
+        """
+        path = self._path(key, output_path)
+        try:
+            os.utime(path)
+            self._place(path, Path(output_path))
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, output_path: str) -> None:
+        """把刚渲染好的图片存入缓存，超出上限时淘汰最久未使用的条目"""
+        path = self._path(key, output_path)
+        old_size = path.stat().st_size if path.exists() else 0
+        self._place(Path(output_path), path)
+        with self._lock:
+            self._total_bytes += path.stat().st_size - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """按 mtime 从旧到新删除，直到总大小回到上限的 90%"""
+        entries = sorted(self._entries(), key=lambda p: p.stat().st_mtime)
+        target = int(self.max_bytes * 0.9)
+        for path in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中/淘汰次数和当前占用"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "size_mb": round(self._total_bytes / 1024 / 1024, 2),
+            "max_size_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "dir": str(self.cache_dir)
+        }
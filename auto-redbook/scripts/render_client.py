@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+渲染服务客户端 - render_xhs.py / render_xhs_v2.py 的瘦客户端模式
+
+渲染服务（render_server.py）在运行时，CLI 把任务发给它，复用常驻的浏览器；
+服务没有运行则返回 None，由 CLI 在本进程内照常渲染。只依赖标准库。
+
+协议：TCP 127.0.0.1，一行 JSON 请求，一行 JSON 响应。
+端口默认 47815，可用环境变量 XHS_RENDER_PORT 修改。
+
+服务能读写当前用户的任意文件，所以每个请求都要带上令牌：服务启动时生成随机令牌，
+写入只有当前用户可读（0600）的令牌文件（默认 ~/.cache/auto-redbook/render_server_<端口>.token，
+目录可用 XHS_RENDER_TOKEN_DIR 修改），客户端读取后随请求发送；读不到令牌或令牌不对时按服务未运行处理。
+"""
+
+import json
+import os
+import secrets
+import socket
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = int(os.getenv('XHS_RENDER_PORT', '47815'))
+DEFAULT_TOKEN_DIR = "~/.cache/auto-redbook"
+# 连接超时：服务未运行时要尽快退回本地渲染
+CONNECT_TIMEOUT = 0.3
+
+
+def token_path(port: int = DEFAULT_PORT) -> Path:
+    """渲染服务令牌文件路径（每个端口一个）"""
+    token_dir = os.getenv('XHS_RENDER_TOKEN_DIR') or DEFAULT_TOKEN_DIR
+    return Path(os.path.expanduser(token_dir)) / f"render_server_{port}.token"
+
+
+def create_token(port: int = DEFAULT_PORT) -> str:
+    """生成随机令牌并写入令牌文件（0600，目录新建时为 0700），返回令牌"""
+    path = token_path(port)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    token = secrets.token_hex(32)
+    # 先删除再以 O_EXCL 新建，保证文件权限是新设的 0600
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    return token
+
+
+def read_token(port: int = DEFAULT_PORT) -> Optional[str]:
+    """读取令牌，没有令牌文件（服务未运行或属于其他用户）时返回 None"""
+    try:
+        return token_path(port).read_text().strip() or None
+    except OSError:
+        return None
+
+
+def send_request(request: Dict[str, Any], port: int = DEFAULT_PORT,
+                 timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    向渲染服务发送一个请求
+
+    Returns:
+        响应字典；服务未运行（或没有令牌、令牌被拒绝）时返回 None
+    """
+    token = read_token(port)
+    if token is None:
+        return None
+    try:
+        sock = socket.create_connection((DEFAULT_HOST, port), timeout=CONNECT_TIMEOUT)
+    except OSError:
+        return None
+    with sock:
+        sock.settimeout(timeout)
+        request = dict(request, token=token)
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        return {'success': False, 'error': '渲染服务断开连接'}
+    response = json.loads(line)
+    if response.get('unauthorized'):
+        return None
+    return response
+
+
+def render_via_server(job: Dict[str, Any], port: int = DEFAULT_PORT) -> Optional[Dict[str, Any]]:
+    """
+    把渲染任务交给渲染服务并打印结果
+
+    Args:
+        job: 渲染参数（renderer、markdown_file、output_dir、theme、mode、width、height ...），
+             路径会转换为绝对路径后发送
+
+    Returns:
+        服务响应 {'success', 'images', 'elapsed'} 或 {'success': False, 'error'}；服务未运行时返回 None
+    """
+    job = dict(job, action='render')
+    for key in ('markdown_file', 'output_dir'):
+        if job.get(key):
+            job[key] = os.path.abspath(job[key])
+
+    result = send_request(job, port)
+    if result is None:
+        return None
+
+    if result.get('success'):
+        for path in result['images']:
+            print(f"  ✅ 已生成: {path}")
+        print(f"\n✨ 渲染完成（渲染服务，耗时 {result['elapsed']}s）！"
+              f"共 {len(result['images'])} 张图片，保存到: {job['output_dir']}")
+    else:
+        print(f"❌ 渲染服务出错: {result.get('error')}")
+    return result
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+常驻渲染服务 - 保持浏览器和渲染模块常驻，接收本地渲染请求
+
+每次执行 render_xhs.py / render_xhs_v2.py 都要导入 markdown、playwright 并冷启动一次 Chromium，
+频繁调用时大部分时间花在启动上。渲染服务启动一次浏览器（RenderSession 页面池），
+之后的渲染请求直接复用；多个请求可并发，共用同一个页面池。
+
+服务运行时，render_xhs.py / render_xhs_v2.py 会自动把任务交给它（加 --no-server 可强制本地渲染）。
+服务只接受带正确令牌的请求，令牌在启动时生成，写入只有当前用户可读的令牌文件（见 render_client.py）。
+
+使用方法:
+    python render_server.py [start] [--port 47815] [--pages 4]   # 前台运行服务
+    python render_server.py status                             # 查看服务状态
+    python render_server.py stop                               # 停止服务
+
+请求（一行 JSON，token 由 render_client 自动填入）:
+    {"action": "render", "token": "...", "renderer": "v1", "markdown_file": "/abs/note.md",
+     "output_dir": "/abs/out", "theme": "default", "mode": "separator",
+     "width": 1080, "height": 1440, "max_height": 4320, "dpr": 2, "no_cache": false,
+     "format": "png", "quality": 90, "target_kb": null}
+    也可以用 "markdown": "<Markdown 文本>" 代替 markdown_file；renderer 为 v2 时 theme 即样式名
+响应:
+    {"success": true, "images": [...], "elapsed": 1.23} 或 {"success": false, "error": "..."}
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+import render_xhs
+import render_xhs_v2
+from card_encoder import DEFAULT_QUALITY, CardEncoder
+from render_cache import RenderCache
+from render_client import DEFAULT_HOST, DEFAULT_PORT, create_token, send_request, token_path
+from render_session import DEFAULT_PAGES, RenderSession
+
+
+class RenderServer:
+    """本地渲染服务：一个 RenderSession 服务所有请求"""
+
+    def __init__(self, port: int = DEFAULT_PORT, pages: int = DEFAULT_PAGES):
+        self.port = port
+        self.session = RenderSession(pages=pages)
+        self.started_at = time.time()
+        self.jobs = 0
+        self.failures = 0
+        self._token = None
+        self._stop = asyncio.Event()
+
+    async def serve(self) -> None:
+        """启动浏览器并监听端口，直到收到 shutdown 请求"""
+        await self.session.start()
+        try:
+            server = await asyncio.start_server(self._handle, DEFAULT_HOST, self.port)
+            # 端口绑定成功后才写令牌，避免覆盖已在运行的服务的令牌
+            self._token = create_token(self.port)
+            print(f"🚀 渲染服务已启动: {DEFAULT_HOST}:{self.port}（页面池: {self.session.pages}）")
+            try:
+                async with server:
+                    await self._stop.wait()
+            finally:
+                token_path(self.port).unlink(missing_ok=True)
+        finally:
+            await self.session.close()
+        print("👋 渲染服务已停止")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = json.loads(await reader.readline())
+            if self._authorized(request):
+                response = await self.dispatch(request)
+            else:
+                response = {'success': False, 'error': '令牌无效', 'unauthorized': True}
+        except Exception as e:
+            response = {'success': False, 'error': str(e)}
+        writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def _authorized(self, request: Dict[str, Any]) -> bool:
+        token = request.get('token')
+        if not isinstance(token, str) or self._token is None:
+            return False
+        return hmac.compare_digest(token.encode('utf-8'), self._token.encode('utf-8'))
+
+    async def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        action = request.get('action', 'render')
+        if action == 'render':
+            return await self.render(request)
+        if action == 'status':
+            cache = RenderCache.default()
+            return {
+                'success': True,
+                'pid': os.getpid(),
+                'uptime': round(time.time() - self.started_at, 1),
+                'jobs': self.jobs,
+                'failures': self.failures,
+                'pages': self.session.pages,
+                'cache': cache.stats() if cache else None
+            }
+        if action == 'shutdown':
+            self._stop.set()
+            return {'success': True}
+        return {'success': False, 'error': f'未知操作: {action}'}
+
+    async def render(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """执行一个渲染任务，返回生成的图片路径"""
+        start = time.perf_counter()
+        md_file = job.get('markdown_file')
+        temp_path = None
+        if not md_file:
+            if 'markdown' not in job:
+                return {'success': False, 'error': '缺少 markdown_file 或 markdown'}
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False, encoding='utf-8') as f:
+                f.write(job['markdown'])
+                md_file = temp_path = f.name
+        output_dir = job.get('output_dir') or os.getcwd()
+
+        try:
+            encoder = CardEncoder(job.get('format') or 'png', job.get('quality') or DEFAULT_QUALITY,
+                                  job.get('target_kb'))
+            renderer = job.get('renderer', 'v1')
+            if renderer == 'v2':
+                images = await render_xhs_v2.render_markdown_to_cards(
+                    md_file, output_dir, job.get('theme') or 'purple', session=self.session,
+                    use_cache=not job.get('no_cache'), encoder=encoder
+                )
+            elif renderer == 'v1':
+                images = await render_xhs.render_markdown_to_cards(
+                    md_file, output_dir,
+                    theme=job.get('theme') or 'default',
+                    mode=job.get('mode') or 'separator',
+                    width=job.get('width', render_xhs.DEFAULT_WIDTH),
+                    height=job.get('height', render_xhs.DEFAULT_HEIGHT),
+                    max_height=job.get('max_height', render_xhs.MAX_HEIGHT),
+                    dpr=job.get('dpr', 2),
+                    session=self.session,
+                    use_cache=not job.get('no_cache'),
+                    encoder=encoder
+                )
+            else:
+                return {'success': False, 'error': f'未知渲染器: {renderer}'}
+        except Exception as e:
+            self.failures += 1
+            return {'success': False, 'error': str(e)}
+        finally:
+            if temp_path:
+                os.unlink(temp_path)
+
+        self.jobs += 1
+        return {'success': True, 'images': images, 'elapsed': round(time.perf_counter() - start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='小红书卡片常驻渲染服务')
+    parser.add_argument(
+        'action',
+        nargs='?',
+        choices=['start', 'status', 'stop'],
+        default='start',
+        help='start 前台运行服务（默认），status 查看状态，stop 停止服务'
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=DEFAULT_PORT,
+        help=f'监听端口（默认: {DEFAULT_PORT}，也可用 XHS_RENDER_PORT 设置）'
+    )
+    parser.add_argument(
+        '--pages',
+        type=int,
+        default=DEFAULT_PAGES,
+        help=f'并发渲染的页面数（默认: {DEFAULT_PAGES}）'
+    )
+
+    args = parser.parse_args()
+
+    if args.action == 'start':
+        if send_request({'action': 'status'}, args.port) is not None:
+            print(f"⚠️ 端口 {args.port} 上已有渲染服务在运行")
+            sys.exit(1)
+        try:
+            asyncio.run(RenderServer(args.port, args.pages).serve())
+        except KeyboardInterrupt:
+            pass
+        return
+
+    result = send_request({'action': args.action if args.action == 'status' else 'shutdown'}, args.port)
+    if result is None:
+        print("❌ 渲染服务未运行")
+        sys.exit(1)
+    if args.action == 'status':
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print("✅ 已通知渲染服务停止")
+
+
+if __name__ == '__main__':
+    main()
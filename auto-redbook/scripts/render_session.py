@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+浏览器渲染会话 - 一个 Chromium 实例 + 按尺寸复用的页面池
+
+每张卡片单独启动 Chromium 要付一次冷启动（约 0.5~1 秒），一篇 12 张卡片的笔记就是 13 次。
+RenderSession 在进程内只启动一次浏览器，按 (宽, 视口高, dpr) 维护预设好尺寸的页面池，
+卡片在多个页面上并发渲染；同一个会话可以连续渲染多篇 Markdown。
+浏览器在第一次借用页面时才启动，全部命中渲染缓存时不会启动 Chromium。
+
+页面内容用 show_html() 加载：每个页面只在第一次（或字体变化时）加载一次外壳，字体样式表在外壳里
+用 <link> 引入；之后每张卡片只替换样式和 body，不再重新导航、重新请求字体。
+加载完成以确定的就绪信号为准，不再等 networkidle + 固定延时：
+document.fonts.ready、所有图片 decode() 完成、模板自定义的 window.xhsReady（如有），再等两帧。
+
+用法:
+    async with RenderSession(pages=4) as session:
+        await render_markdown_to_cards('a.md', 'out_a', session=session)
+        await render_markdown_to_cards('b.md', 'out_b', session=session)
+"""
+
+import asyncio
+import os
+import re
+import tempfile
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from playwright.async_api import async_playwright, Browser, Page
+
+# 每种尺寸最多同时打开的页面数
+DEFAULT_PAGES = max(1, min(4, os.cpu_count() or 1))
+
+# 就绪等待上限（毫秒）：远程图片或字体一直加载不完时不无限等待
+READY_TIMEOUT_MS = 10000
+
+_FONT_IMPORT = re.compile(r"@import\s+url\(\s*['\"]?([^'\")]+)['\"]?\s*\)\s*;?")
+
+# 外壳页面：字体样式表只在这里加载一次
+_SHELL_HTML = '''<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="UTF-8">
+{links}
+<style id="xhs-style"></style>
+</head>
+<body></body>
+</html>'''
+
+# 把卡片 HTML 的样式和 body 换进外壳
+_SWAP_JS = '''(html) => {
+    const doc = new DOMParser().parseFromString(html, 'text/html');
+    document.getElementById('xhs-style').textContent =
+        Array.from(doc.querySelectorAll('style'), el => el.textContent).join('\\n');
+    document.body.replaceWith(document.adoptNode(doc.body));
+    window.xhsReady = undefined;
+}'''
+
+# 就绪信号：字体、图片解码、模板自定义信号，再等两帧确保样式和布局已提交
+_READY_JS = '''async (timeout) => {
+    // 先做一次布局，触发页面内容需要的网页字体加载，fonts.ready 才会等它们
+    document.body.getBoundingClientRect();
+    const ready = (async () => {
+        await document.fonts.ready;
+        await Promise.all(Array.from(document.images, img => img.decode().catch(() => null)));
+        if (window.xhsReady) await window.xhsReady;
+    })();
+    await Promise.race([ready, new Promise(r => setTimeout(r, timeout))]);
+    await new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)));
+}'''
+
+# 每个页面当前外壳加载的字体样式表
+_shells: "weakref.WeakKeyDictionary[Page, Tuple[str, ...]]" = weakref.WeakKeyDictionary()
+
+
+async def wait_ready(page: Page, timeout_ms: int = READY_TIMEOUT_MS) -> None:
+    """等待字体、图片和模板就绪信号"""
+    await page.evaluate(_READY_JS, timeout_ms)
+
+
+async def show_html(page: Page, html: str, timeout_ms: int = READY_TIMEOUT_MS) -> None:
+    """
+    在页面中显示一张卡片的 HTML 并等待就绪
+
+    页面已加载相同字体的外壳时只替换样式和 body；首次使用、字体变化或 HTML 带脚本时整页加载。
+    外壳通过 file:// 加载，卡片中的本地图片路径可以正常显示。
+    """
+    fonts = tuple(_FONT_IMPORT.findall(html))
+    if '<script' in html:
+        # 脚本只有整页加载才会执行（模板可以用 window.xhsReady 声明自己何时就绪）
+        await _goto_html(page, html)
+        _shells.pop(page, None)
+    else:
+        if _shells.get(page) != fonts:
+            links = '\n'.join(f'<link rel="stylesheet" href="{url}">' for url in fonts)
+            await _goto_html(page, _SHELL_HTML.format(links=links))
+            _shells[page] = fonts
+        await page.evaluate(_SWAP_JS, _FONT_IMPORT.sub('', html))
+    await wait_ready(page, timeout_ms)
+
+
+async def timed_card(job: Awaitable[Optional[float]], path: str,
+                     on_card: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+    """
+    执行一张卡片的渲染任务并计时
+
+    Args:
+        job: render_html_to_image(...) 协程，命中渲染缓存时返回 None
+        path: 输出路径
+        on_card: 完成时的回调，参数为 {'path', 'seconds', 'cached'}
+    """
+    start = time.perf_counter()
+    result = await job
+    if on_card:
+        on_card({'path': path, 'seconds': round(time.perf_counter() - start, 3), 'cached': result is None})
+
+
+async def _goto_html(page: Page, html: str) -> None:
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
+        f.write(html)
+        temp_path = f.name
+    try:
+        await page.goto(f'file://{temp_path}', wait_until='load')
+    finally:
+        os.unlink(temp_path)
+
+
+class _PagePool:
+    """同一尺寸的页面池：空闲页面复用，不足时按上限新建，满了就排队"""
+
+    def __init__(self, browser: Browser, width: int, height: int, dpr: int, limit: int):
+        self.browser = browser
+        self.viewport = {'width': width, 'height': height}
+        self.dpr = dpr
+        self.limit = limit
+        self.pages: List[Page] = []
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> Page:
+        if not self.idle.empty():
+            return self.idle.get_nowait()
+        async with self._lock:
+            if len(self.pages) < self.limit:
+                page = await self.browser.new_page(viewport=self.viewport, device_scale_factor=self.dpr)
+                self.pages.append(page)
+                return page
+        return await self.idle.get()
+
+    def release(self, page: Page) -> None:
+        self.idle.put_nowait(page)
+
+
+class RenderSession:
+    """共享浏览器 + 页面池"""
+
+    def __init__(self, pages: int = DEFAULT_PAGES):
+        """
+        Args:
+            pages: 每种尺寸最多并发使用的页面数
+        """
+        self.pages = max(1, pages)
+        self.browser: Optional[Browser] = None
+        self._playwright = None
+        self._pools: Dict[Tuple[int, int, int], _PagePool] = {}
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> 'RenderSession':
+        """启动浏览器（已启动时直接返回）"""
+        async with self._start_lock:
+            if self.browser is None:
+                self._playwright = await async_playwright().start()
+                self.browser = await self._playwright.chromium.launch()
+        return self
+
+    async def close(self) -> None:
+        if self.browser is not None:
+            await self.browser.close()
+            await self._playwright.stop()
+            self.browser = None
+            self._playwright = None
+            self._pools.clear()
+
+    async def __aenter__(self) -> 'RenderSession':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    @asynccontextmanager
+    async def page(self, width: int, height: int, dpr: int = 2):
+        """借用一个指定视口尺寸的页面，用完自动归还"""
+        await self.start()
+        key = (width, height, dpr)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _PagePool(self.browser, width, height, dpr, self.pages)
+        page = await pool.acquire()
+        try:
+            yield page
+        finally:
+            pool.release(page)
@@ -19,10 +19,17 @@
     --height, -h         图片高度（默认 1440，dynamic 模式下为最小高度）
     --max-height         dynamic 模式下的最大高度（默认 4320
     --dpr                设备像素比（默认 2）
+    --pages              并发渲染的页面数（共用一个浏览器，默认 min(4, CPU核数)）
+    --no-server          不使用常驻渲染服务（render_server.py），始终在本进程渲染
+    --no-cache           不使用渲染缓存，所有卡片重新截图
+    --format, -f         图片格式：png（默认）、jpeg、webp
+    --quality, -q        jpeg/webp 质量（默认 90，指定 --target-kb 时为上限）
+    --target-kb          jpeg/webp 每张图片的目标大小（KB），超出时自动降低质量
 
 依赖安装:
     pip install markdown pyyaml playwright
     playwright install chromium
+    pip install Pillow   # 可选，--format webp 必需
 """
 
 import argparse
@@ -30,19 +37,25 @@ import asyncio
 import os
 import re
 import sys
-import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional
 
 try:
     import markdown
     import yaml
-    from playwright.async_api import async_playwright
+    import playwright  # 只检查依赖，浏览器由 RenderSession 启动
 except ImportError as e:
     print(f"缺少依赖: {e}")
     print("请运行: pip install markdown pyyaml playwright && playwright install chromium")
     sys.exit(1)
 
+from card_encoder import DEFAULT_QUALITY, IMAGE_FORMATS, CardEncoder, encoder_from_args
+from paginator import Paginator
+from render_cache import RenderCache
+from render_client import render_via_server
+from render_session import DEFAULT_PAGES, RenderSession, show_html, timed_card, wait_ready
+
 
 # 获取脚本所在目录
 SCRIPT_DIR = Path(__file__).parent.parent
@@ -69,6 +82,15 @@ AVAILABLE_THEMES = [
 # 分页模式
 PAGING_MODES = ['separator', 'auto-fit', 'auto-split', 'dynamic']
 
+# Markdown 扩展
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite', 'tables', 'nl2br']
+TAGS_PATTERN = re.compile(r'((?:#[\w\u4e00-\u9fa5]+\s*)+)$', re.MULTILINE)
+TAG_PATTERN = re.compile(r'#([\w\u4e00-\u9fa5]+)')
+
+# 卡片模板中正文和页码的占位符，模板预先在这两处拆开
+_CONTENT_SLOT = '\0content\0'
+_PAGE_SLOT = '\0page\0'
+
 
 def parse_markdown_file(file_path: str) -> dict:
     """解析 Markdown 文件，提取 YAML 头部和正文内容"""
@@ -101,17 +123,28 @@ def split_content_by_separator(body: str) -> List[str]:
     return [part.strip() for part in parts if part.strip()]
 
 
-def convert_markdown_to_html(md_content: str) -> str:
-    """将 Markdown 转换为 HTML"""
+@lru_cache(maxsize=None)
+def _shared_markdown() -> markdown.Markdown:
+    return markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+
+
+def convert_markdown_to_html(md_content: str, md: Optional[markdown.Markdown] = None) -> str:
+    """
+    将 Markdown 转换为 HTML
+    
+    md 为复用的 Markdown 解析器（每次转换前 reset），默认使用模块共享的一个；
+    创建解析器要加载 extra/codehilite 等扩展，比转换一段文本慢得多
+    """
+    md = md or _shared_markdown()
+    
     # 处理 tags（以 # 开头的标签）
-    tags_pattern = r'((?:#[\w\u4e00-\u9fa5]+\s*)+)$'
-    tags_match = re.search(tags_pattern, md_content, re.MULTILINE)
+    tags_match = TAGS_PATTERN.search(md_content)
     tags_html = ""
     
     if tags_match:
         tags_str = tags_match.group(1)
         md_content = md_content[:tags_match.start()].strip()
-        tags = re.findall(r'#([\w\u4e00-\u9fa5]+)', tags_str)
+        tags = TAG_PATTERN.findall(tags_str)
         if tags:
             tags_html = '<div class="tags-container">'
             for tag in tags:
@@ -119,27 +152,31 @@ def convert_markdown_to_html(md_content: str) -> str:
             tags_html += '</div>'
     
     # 转换 Markdown 为 HTML
-    html = markdown.markdown(
-        md_content,
-        extensions=['extra', 'codehilite', 'tables', 'nl2br']
-    )
+    html = md.reset().convert(md_content)
     
     return html + tags_html
 
 
 def load_theme_css(theme: str) -> str:
-    """加载主题 CSS 样式"""
+    """
+    加载主题 CSS 样式，主题不存在时使用默认主题
+    
+    按文件路径和修改时间缓存：文件不变时只读一次，常驻渲染服务中修改主题文件后自动重新读取
+    """
     theme_file = THEMES_DIR / f"{theme}.css"
-    if theme_file.exists():
-        with open(theme_file, 'r', encoding='utf-8') as f:
-            return f.read()
-    else:
-        # 如果主题不存在，使用默认主题
-        default_file = THEMES_DIR / "default.css"
-        if default_file.exists():
-            with open(default_file, 'r', encoding='utf-8') as f:
-                return f.read()
+    if not theme_file.exists():
+        theme_file = THEMES_DIR / "default.css"
+    try:
+        mtime = theme_file.stat().st_mtime_ns
+    except OSError:
         return ""
+    return _read_theme_css(str(theme_file), mtime)
+
+
+@lru_cache(maxsize=32)
+def _read_theme_css(path: str, mtime_ns: int) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
 
 
 def generate_cover_html(metadata: dict, theme: str, width: int, height: int) -> str:
@@ -265,15 +302,60 @@ def generate_cover_html(metadata: dict, theme: str, width: int, height: int) ->
     return html
 
 
+class CardRenderer:
+    """
+    一种主题、尺寸、分页模式的正文卡片渲染器
+    
+    主题 CSS、Markdown 解析器和按占位符拆好的卡片模板只准备一次，
+    之后生成卡片（以及分页测量每个块）只需转换 Markdown 文本再拼接字符串。
+    用 get_card_renderer() 取进程内共享的实例。
+    """
+    
+    def __init__(self, theme: str, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                 mode: str = 'separator'):
+        self.theme = theme
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self._md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        template = _card_template(theme, width, height, mode)
+        self._head, rest = template.split(_CONTENT_SLOT)
+        self._middle, self._tail = rest.split(_PAGE_SLOT)
+    
+    def to_html(self, md_content: str) -> str:
+        """将一段 Markdown 转换为卡片正文 HTML"""
+        return convert_markdown_to_html(md_content, self._md)
+    
+    def card_html(self, content: str, page_number: int = 1, total_pages: int = 1) -> str:
+        """生成正文卡片 HTML"""
+        page_text = f"{page_number}/{total_pages}" if total_pages > 1 else ""
+        return self._head + self.to_html(content) + self._middle + page_text + self._tail
+
+
+def get_card_renderer(theme: str, width: int = DEFAULT_WIDTH, height: int = DEFAULT_HEIGHT,
+                      mode: str = 'separator') -> CardRenderer:
+    """按主题、尺寸、模式缓存的卡片渲染器，主题 CSS 修改后重新创建"""
+    return _cached_card_renderer(theme, width, height, mode, load_theme_css(theme))
+
+
+@lru_cache(maxsize=64)
+def _cached_card_renderer(theme: str, width: int, height: int, mode: str, theme_css: str) -> CardRenderer:
+    # theme_css 只参与缓存键：同一主题的 CSS 内容变化时得到新的渲染器
+    return CardRenderer(theme, width, height, mode)
+
+
 def generate_card_html(content: str, theme: str, page_number: int = 1, 
                        total_pages: int = 1, width: int = DEFAULT_WIDTH, 
                        height: int = DEFAULT_HEIGHT, mode: str = 'separator') -> str:
     """生成正文卡片 HTML"""
-    
-    html_content = convert_markdown_to_html(content)
+    return get_card_renderer(theme, width, height, mode).card_html(content, page_number, total_pages)
+
+
+def _card_template(theme: str, width: int, height: int, mode: str) -> str:
+    """正文卡片模板，正文和页码处为占位符"""
     theme_css = load_theme_css(theme)
-    
-    page_text = f"{page_number}/{total_pages}" if total_pages > 1 else ""
+    html_content = _CONTENT_SLOT
+    page_text = _PAGE_SLOT
     
     # 获取主题背景色
     theme_backgrounds = {
@@ -420,157 +502,126 @@ async def render_html_to_image(html_content: str, output_path: str,
                                height: int = DEFAULT_HEIGHT,
                                mode: str = 'separator',
                                max_height: int = MAX_HEIGHT,
-                               dpr: int = 2):
-    """使用 Playwright 将 HTML 渲染为图片"""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
+                               dpr: int = 2,
+                               session: Optional[RenderSession] = None,
+                               cache: Optional[RenderCache] = None,
+                               encoder: Optional[CardEncoder] = None):
+    """
+    使用 Playwright 将 HTML 渲染为图片（传入 session 时复用其浏览器和页面池）
+    
+    encoder 决定输出格式和质量（默认 PNG）。
+    传入 cache 时先查渲染缓存，命中则直接放置缓存的图片并返回 None，否则返回截图高度
+    """
+    encoder = encoder or CardEncoder()
+    key = None
+    if cache is not None:
+        key = RenderCache.make_key(html_content, width, height, mode, max_height, dpr,
+                                   encoder.cache_tag())
+        if cache.get(key, output_path):
+            print(f"  ♻️ 缓存命中: {output_path}")
+            return None
+    
+    if session is None:
+        async with RenderSession(pages=1) as session:
+            return await render_html_to_image(html_content, output_path, width, height,
+                                              mode, max_height, dpr, session, cache, encoder)
+    
+    # 设置视口大小
+    viewport_height = height if mode != 'dynamic' else max_height
+    async with session.page(width, viewport_height, dpr) as page:
+        # 加载卡片并等待字体、图片就绪
+        await show_html(page, html_content)
+        
+        if mode == 'auto-fit':
+            # 自动缩放模式：对整个内容块做 transform 缩放（标题/代码块等固定 px 也会一起缩放）
+            await page.evaluate('''() => {
+                const viewportContent = document.querySelector('.card-content');
+                const scaleEl = document.querySelector('.card-content-scale');
+                if (!viewportContent || !scaleEl) return;
+
+                // 先重置，测量原始尺寸
+                scaleEl.style.transform = 'none';
+                scaleEl.style.width = '';
+                scaleEl.style.height = '';
+
+                const availableWidth = viewportContent.clientWidth;
+                const availableHeight = viewportContent.clientHeight;
+
+                // scrollWidth/scrollHeight 反映内容的自然尺寸
+                const contentWidth = Math.max(scaleEl.scrollWidth, scaleEl.getBoundingClientRect().width);
+                const contentHeight = Math.max(scaleEl.scrollHeight, scaleEl.getBoundingClientRect().height);
+
+                if (!contentWidth || !contentHeight || !availableWidth || !availableHeight) return;
+
+                // 只缩小不放大，避免“撑太大”
+                const scale = Math.min(1, availableWidth / contentWidth, availableHeight / contentHeight);
+
+                // 为避免 transform 后布局尺寸不匹配导致裁切，扩大布局盒子
+                scaleEl.style.width = (availableWidth / scale) + 'px';
+
+                // 顶部对齐更稳；如需居中可计算 offset
+                const offsetX = 0;
+                const offsetY = 0;
+
+                scaleEl.style.transformOrigin = 'top left';
+                scaleEl.style.transform = `translate(${offsetX}px, ${offsetY}px) scale(${scale})`;
+            }''')
+            # 等缩放后的布局提交
+            await wait_ready(page)
+            actual_height = height
+            
+        elif mode == 'dynamic':
+            # 动态高度模式：根据内容调整图片高度
+            content_height = await page.evaluate('''() => {
+                const container = document.querySelector('.card-container');
+                return container ? container.scrollHeight : document.body.scrollHeight;
+            }''')
+            # 确保高度在合理范围内
+            actual_height = max(height, min(content_height, max_height))
+            
+        else:  # separator 和 auto-split
+            # 获取实际内容高度
+            content_height = await page.evaluate('''() => {
+                const container = document.querySelector('.card-container');
+                return container ? container.scrollHeight : document.body.scrollHeight;
+            }''')
+            actual_height = max(height, content_height)
         
-        # 设置视口大小
-        viewport_height = height if mode != 'dynamic' else max_height
-        page = await browser.new_page(
-            viewport={'width': width, 'height': viewport_height},
-            device_scale_factor=dpr
+        # 旧文件可能是指向缓存的硬链接，先删除再写，避免改写缓存
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+        
+        # 截图并在内存中编码，只写盘一次
+        size = await encoder.capture(
+            page, output_path,
+            clip={'x': 0, 'y': 0, 'width': width, 'height': actual_height}
         )
         
-        # 创建临时 HTML 文件
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
-            f.write(html_content)
-            temp_html_path = f.name
+        if key is not None:
+            cache.put(key, output_path)
         
-        try:
-            await page.goto(f'file://{temp_html_path}')
-            await page.wait_for_load_state('networkidle')
-            
-            # 等待字体加载
-            await page.wait_for_timeout(500)
-            
-            if mode == 'auto-fit':
-                # 自动缩放模式：对整个内容块做 transform 缩放（标题/代码块等固定 px 也会一起缩放）
-                await page.evaluate('''() => {
-                    const viewportContent = document.querySelector('.card-content');
-                    const scaleEl = document.querySelector('.card-content-scale');
-                    if (!viewportContent || !scaleEl) return;
-
-                    // 先重置，测量原始尺寸
-                    scaleEl.style.transform = 'none';
-                    scaleEl.style.width = '';
-                    scaleEl.style.height = '';
-
-                    const availableWidth = viewportContent.clientWidth;
-                    const availableHeight = viewportContent.clientHeight;
-
-                    // scrollWidth/scrollHeight 反映内容的自然尺寸
-                    const contentWidth = Math.max(scaleEl.scrollWidth, scaleEl.getBoundingClientRect().width);
-                    const contentHeight = Math.max(scaleEl.scrollHeight, scaleEl.getBoundingClientRect().height);
-
-                    if (!contentWidth || !contentHeight || !availableWidth || !availableHeight) return;
-
-                    // 只缩小不放大，避免“撑太大”
-                    const scale = Math.min(1, availableWidth / contentWidth, availableHeight / contentHeight);
-
-                    // 为避免 transform 后布局尺寸不匹配导致裁切，扩大布局盒子
-                    scaleEl.style.width = (availableWidth / scale) + 'px';
-
-                    // 顶部对齐更稳；如需居中可计算 offset
-                    const offsetX = 0;
-                    const offsetY = 0;
-
-                    scaleEl.style.transformOrigin = 'top left';
-                    scaleEl.style.transform = `translate(${offsetX}px, ${offsetY}px) scale(${scale})`;
-                }''')
-                await page.wait_for_timeout(100)
-                actual_height = height
-                
-            elif mode == 'dynamic':
-                # 动态高度模式：根据内容调整图片高度
-                content_height = await page.evaluate('''() => {
-                    const container = document.querySelector('.card-container');
-                    return container ? container.scrollHeight : document.body.scrollHeight;
-                }''')
-                # 确保高度在合理范围内
-                actual_height = max(height, min(content_height, max_height))
-                
-            else:  # separator 和 auto-split
-                # 获取实际内容高度
-                content_height = await page.evaluate('''() => {
-                    const container = document.querySelector('.card-container');
-                    return container ? container.scrollHeight : document.body.scrollHeight;
-                }''')
-                actual_height = max(height, content_height)
-            
-            # 截图
-            await page.screenshot(
-                path=output_path,
-                clip={'x': 0, 'y': 0, 'width': width, 'height': actual_height},
-                type='png'
-            )
-            
-            print(f"  ✅ 已生成: {output_path} ({width}x{actual_height})")
-            return actual_height
-            
-        finally:
-            os.unlink(temp_html_path)
-            await browser.close()
+        print(f"  ✅ 已生成: {output_path} ({width}x{actual_height}, {size / 1024:.0f} KB)")
+        return actual_height
 
 
 async def auto_split_content(body: str, theme: str, width: int, height: int, 
-                             dpr: int = 2) -> List[str]:
-    """自动切分内容：根据渲染后的高度自动分页"""
+                             dpr: int = 2, session: Optional[RenderSession] = None) -> List[str]:
+    """自动切分内容：一次加载卡片外壳，测量各段落高度后分页（见 paginator.py）"""
+    if session is None:
+        async with RenderSession(pages=1) as session:
+            return await auto_split_content(body, theme, width, height, dpr, session)
     
-    # 将内容按段落分割
-    paragraphs = re.split(r'\n\n+', body)
-    
-    cards = []
-    current_content = []
-    
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page(
-            viewport={'width': width, 'height': height * 2},
-            device_scale_factor=dpr
+    renderer = get_card_renderer(theme, width, height, 'auto-split')
+    async with session.page(width, height * 2, dpr) as page:
+        paginator = Paginator(
+            page, renderer.to_html,
+            # 内容区域的可用高度（去除 padding 等）
+            available_height=height - 220,  # 50*2 padding + 60*2 inner padding
+            content_selector='.card-content-scale',
+            measure_selector='.card-content'
         )
-        
-        try:
-            for para in paragraphs:
-                # 尝试将当前段落加入
-                test_content = current_content + [para]
-                test_md = '\n\n'.join(test_content)
-                
-                html = generate_card_html(test_md, theme, 1, 1, width, height, 'auto-split')
-                
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
-                    f.write(html)
-                    temp_path = f.name
-                
-                await page.goto(f'file://{temp_path}')
-                await page.wait_for_load_state('networkidle')
-                await page.wait_for_timeout(200)
-                
-                content_height = await page.evaluate('''() => {
-                    const content = document.querySelector('.card-content');
-                    return content ? content.scrollHeight : 0;
-                }''')
-                
-                os.unlink(temp_path)
-                
-                # 内容区域的可用高度（去除 padding 等）
-                available_height = height - 220  # 50*2 padding + 60*2 inner padding
-                
-                if content_height > available_height and current_content:
-                    # 当前卡片已满，保存并开始新卡片
-                    cards.append('\n\n'.join(current_content))
-                    current_content = [para]
-                else:
-                    current_content = test_content
-            
-            # 保存最后一张卡片
-            if current_content:
-                cards.append('\n\n'.join(current_content))
-                
-        finally:
-            await browser.close()
-    
-    return cards
+        await paginator.load(renderer.card_html(''))
+        return await paginator.paginate(body)
 
 
 async def render_markdown_to_cards(md_file: str, output_dir: str, 
@@ -579,8 +630,29 @@ async def render_markdown_to_cards(md_file: str, output_dir: str,
                                    width: int = DEFAULT_WIDTH,
                                    height: int = DEFAULT_HEIGHT,
                                    max_height: int = MAX_HEIGHT,
-                                   dpr: int = 2):
-    """主渲染函数：将 Markdown 文件渲染为多张卡片图片"""
+                                   dpr: int = 2,
+                                   session: Optional[RenderSession] = None,
+                                   pages: int = DEFAULT_PAGES,
+                                   use_cache: bool = True,
+                                   on_card: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                   encoder: Optional[CardEncoder] = None):
+    """
+    主渲染函数：将 Markdown 文件渲染为多张卡片图片
+    
+    传入 session 时复用其浏览器（连续渲染多篇笔记），否则临时创建一个 pages 个页面的会话；
+    封面和正文卡片在页面池上并发渲染。HTML 未变化的卡片直接取自渲染缓存（use_cache=False 关闭）。
+    每张图完成时调用 on_card({'path', 'seconds', 'cached'})，可用于统计耗时。
+    encoder 决定图片格式（默认 PNG），文件扩展名随格式变化。
+    
+    Returns:
+        生成的图片路径列表（封面在前）
+    """
+    if session is None:
+        async with RenderSession(pages=pages) as session:
+            return await render_markdown_to_cards(md_file, output_dir, theme, mode, width, height,
+                                                  max_height, dpr, session, use_cache=use_cache,
+                                                  on_card=on_card, encoder=encoder)
+    
     print(f"\n🎨 开始渲染: {md_file}")
     print(f"  📐 主题: {theme}")
     print(f"  📏 模式: {mode}")
@@ -597,29 +669,51 @@ async def render_markdown_to_cards(md_file: str, output_dir: str,
     # 根据模式处理内容分割
     if mode == 'auto-split':
         print("  ⏳ 自动分析内容并切分...")
-        card_contents = await auto_split_content(body, theme, width, height, dpr)
+        card_contents = await auto_split_content(body, theme, width, height, dpr, session)
     else:
         card_contents = split_content_by_separator(body)
     
     total_cards = len(card_contents)
     print(f"  📄 检测到 {total_cards} 张正文卡片")
     
+    encoder = encoder or CardEncoder()
+    renderer = get_card_renderer(theme, width, height, mode)
+    cache = RenderCache.default() if use_cache else None
+    hits_before = cache.hits if cache else 0
+    jobs = []
+    images = []
+    
     # 生成封面
     if metadata.get('emoji') or metadata.get('title'):
         print("  📷 生成封面...")
         cover_html = generate_cover_html(metadata, theme, width, height)
-        cover_path = os.path.join(output_dir, 'cover.png')
-        await render_html_to_image(cover_html, cover_path, width, height, 'separator', max_height, dpr)
+        cover_path = os.path.join(output_dir, 'cover' + encoder.extension)
+        images.append(cover_path)
+        jobs.append(timed_card(render_html_to_image(cover_html, cover_path, width, height, 'separator',
+                                                    max_height, dpr, session, cache, encoder),
+                               cover_path, on_card))
     
     # 生成正文卡片
     for i, content in enumerate(card_contents, 1):
         print(f"  📷 生成卡片 {i}/{total_cards}...")
-        card_html = generate_card_html(content, theme, i, total_cards, width, height, mode)
-        card_path = os.path.join(output_dir, f'card_{i}.png')
-        await render_html_to_image(card_html, card_path, width, height, mode, max_height, dpr)
+        card_html = renderer.card_html(content, i, total_cards)
+        card_path = os.path.join(output_dir, f'card_{i}{encoder.extension}')
+        images.append(card_path)
+        jobs.append(timed_card(render_html_to_image(card_html, card_path, width, height, mode,
+                                                    max_height, dpr, session, cache, encoder),
+                               card_path, on_card))
+    
+    # 页面池决定实际并发数，多余的任务排队等待空闲页面
+    await asyncio.gather(*jobs)
+    
+    if cache is not None:
+        hits = cache.hits - hits_before
+        stats = cache.stats()
+        print(f"  💾 渲染缓存: 命中 {hits}/{len(images)} 张"
+              f"（累计命中率 {stats['hit_rate']:.0%}，占用 {stats['size_mb']}/{stats['max_size_mb']} MB）")
     
     print(f"\n✨ 渲染完成！图片已保存到: {output_dir}")
-    return total_cards
+    return images
 
 
 def main():
@@ -689,6 +783,39 @@ def main():
         default=2,
         help='设备像素比（默认: 2）'
     )
+    parser.add_argument(
+        '--pages',
+        type=int,
+        default=DEFAULT_PAGES,
+        help=f'并发渲染的页面数，共用一个浏览器（默认: {DEFAULT_PAGES}）'
+    )
+    parser.add_argument(
+        '--format', '-f',
+        choices=IMAGE_FORMATS,
+        default='png',
+        help='图片格式，jpeg/webp 体积远小于 png（默认: png）'
+    )
+    parser.add_argument(
+        '--quality', '-q',
+        type=int,
+        default=DEFAULT_QUALITY,
+        help=f'jpeg/webp 质量，指定 --target-kb 时为质量上限（默认: {DEFAULT_QUALITY}）'
+    )
+    parser.add_argument(
+        '--target-kb',
+        type=float,
+        help='jpeg/webp 每张图片的目标大小（KB），超出时自动降低质量'
+    )
+    parser.add_argument(
+        '--no-server',
+        action='store_true',
+        help='不使用常驻渲染服务，始终在本进程渲染'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='不使用渲染缓存，所有卡片重新截图'
+    )
     
     args = parser.parse_args()
     
@@ -696,6 +823,28 @@ def main():
         print(f"❌ 错误: 文件不存在 - {args.markdown_file}")
         sys.exit(1)
     
+    encoder = encoder_from_args(args.format, args.quality, args.target_kb)
+    
+    # 渲染服务在运行时交给它渲染，省去浏览器冷启动
+    if not args.no_server:
+        result = render_via_server({
+            'renderer': 'v1',
+            'markdown_file': args.markdown_file,
+            'output_dir': args.output_dir,
+            'theme': args.theme,
+            'mode': args.mode,
+            'width': args.width,
+            'height': args.height,
+            'max_height': args.max_height,
+            'dpr': args.dpr,
+            'format': args.format,
+            'quality': args.quality,
+            'target_kb': args.target_kb,
+            'no_cache': args.no_cache
+        })
+        if result is not None:
+            sys.exit(0 if result['success'] else 1)
+    
     asyncio.run(render_markdown_to_cards(
         args.markdown_file,
         args.output_dir,
@@ -704,7 +853,10 @@ def main():
         width=args.width,
         height=args.height,
         max_height=args.max_height,
-        dpr=args.dpr
+        dpr=args.dpr,
+        pages=args.pages,
+        use_cache=not args.no_cache,
+        encoder=encoder
     ))
 
 
@@ -6,7 +6,8 @@
 新特性：
 1. 智能分页：自动检测内容高度，超出时自动拆分到多张卡片
 2. 多种样式：支持多种预设样式主题
-3. 字数预估：基于字数预分配内容，减少渲染次数
+3. 高度预估：按样式校准的高度模型直接分页，只有预估不确定时才用浏览器测量
+4. 体积可控：--format jpeg/webp 输出，--target-kb 按目标大小自动调整质量
 
 使用方法:
     python render_xhs_v2.py <markdown_file> [options]
@@ -14,6 +15,7 @@
 依赖安装:
     pip install markdown pyyaml playwright
     playwright install chromium
+    pip install Pillow   # 可选，--format webp 必需
 """
 
 import argparse
@@ -21,19 +23,26 @@ import asyncio
 import os
 import re
 import sys
-import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Any, Callable, List, Dict, Optional
 
 try:
     import markdown
     import yaml
-    from playwright.async_api import async_playwright, Page
+    import playwright  # 只检查依赖，浏览器由 RenderSession 启动
 except ImportError as e:
     print(f"缺少依赖: {e}")
     print("请运行: pip install markdown pyyaml playwright && playwright install chromium")
     sys.exit(1)
 
+from card_encoder import DEFAULT_QUALITY, IMAGE_FORMATS, CardEncoder, encoder_from_args
+from height_profile import HeightEstimator
+from paginator import Paginator
+from render_cache import RenderCache
+from render_client import render_via_server
+from render_session import RenderSession, show_html, timed_card
+
 
 # 获取脚本所在目录
 SCRIPT_DIR = Path(__file__).parent.parent
@@ -43,13 +52,6 @@ ASSETS_DIR = SCRIPT_DIR / "assets"
 CARD_WIDTH = 1080
 CARD_HEIGHT = 1440
 
-# 内容区域安全高度（考虑 padding 和 margin）
-# card-inner padding: 60px * 2 = 120px
-# card-container padding: 50px * 2 = 100px  
-# 页码区域: ~80px
-# 安全边距: ~40px
-SAFE_HEIGHT = CARD_HEIGHT - 120 - 100 - 80 - 40  # ~1100px
-
 # 样式配置
 STYLES = {
     "purple": {
@@ -97,6 +99,15 @@ STYLES = {
     },
 }
 
+# Markdown 扩展
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite', 'tables', 'nl2br']
+TAGS_PATTERN = re.compile(r'((?:#[\w\u4e00-\u9fa5]+\s*)+)$', re.MULTILINE)
+TAG_PATTERN = re.compile(r'#([\w\u4e00-\u9fa5]+)')
+
+# 卡片模板中正文和页码的占位符，模板预先在这两处拆开
+_CONTENT_SLOT = '\0content\0'
+_PAGE_SLOT = '\0page\0'
+
 
 def parse_markdown_file(file_path: str) -> dict:
     """解析 Markdown 文件，提取 YAML 头部和正文内容"""
@@ -129,148 +140,29 @@ def split_content_by_separator(body: str) -> list:
     return [part.strip() for part in parts if part.strip()]
 
 
-def estimate_content_height(content: str) -> int:
-    """预估内容高度（基于字数和元素类型）"""
-    lines = content.split('\n')
-    total_height = 0
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            total_height += 20  # 空行
-            continue
-            
-        # 标题
-        if line.startswith('# '):
-            total_height += 130  # h1: font-size 72 + margin
-        elif line.startswith('## '):
-            total_height += 110  # h2
-        elif line.startswith('### '):
-            total_height += 90   # h3
-        # 代码块
-        elif line.startswith('```'):
-            total_height += 80   # 代码块起始/结束
-        # 列表
-        elif line.startswith(('- ', '* ', '+ ')):
-            total_height += 85   # li: line-height ~1.6, font-size 42
-        # 引用
-        elif line.startswith('>'):
-            total_height += 100  # blockquote padding
-        # 图片
-        elif line.startswith('!['):
-            total_height += 300  # 图片高度估计
-        # 普通段落
-        else:
-            # 估算字数
-            char_count = len(line)
-            # 一行约25-30个中文字，行高1.7，字体42px
-            lines_needed = max(1, char_count / 28)
-            total_height += int(lines_needed * 42 * 1.7) + 35  # + margin-bottom
-    
-    return total_height
-
-
-def smart_split_content(content: str, max_height: int = SAFE_HEIGHT) -> List[str]:
-    """
-    智能拆分内容到多张卡片
-    基于预估高度进行拆分，尽量保持段落完整
-    """
-    # 首先尝试识别内容块（以标题或空行分隔）
-    blocks = []
-    current_block = []
-    
-    lines = content.split('\n')
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        
-        # 新标题开始新块（除非是第一个）
-        if line.strip().startswith('#') and current_block:
-            blocks.append('\n'.join(current_block))
-            current_block = [line]
-        # 分隔线
-        elif line.strip() == '---':
-            if current_block:
-                blocks.append('\n'.join(current_block))
-                current_block = []
-        else:
-            current_block.append(line)
-        
-        i += 1
-    
-    if current_block:
-        blocks.append('\n'.join(current_block))
-    
-    # 如果没有明显的块边界，按段落拆分
-    if len(blocks) <= 1:
-        blocks = [b for b in content.split('\n\n') if b.strip()]
-    
-    # 合并块到卡片，确保每张卡片高度不超过限制
-    cards = []
-    current_card = []
-    current_height = 0
-    
-    for block in blocks:
-        block_height = estimate_content_height(block)
-        
-        # 如果单个块就超过限制，需要进一步拆分
-        if block_height > max_height:
-            # 如果当前卡片有内容，先保存
-            if current_card:
-                cards.append('\n\n'.join(current_card))
-                current_card = []
-                current_height = 0
-            
-            # 将大块按行拆分
-            lines = block.split('\n')
-            sub_block = []
-            sub_height = 0
-            
-            for line in lines:
-                line_height = estimate_content_height(line)
-                
-                if sub_height + line_height > max_height and sub_block:
-                    cards.append('\n'.join(sub_block))
-                    sub_block = [line]
-                    sub_height = line_height
-                else:
-                    sub_block.append(line)
-                    sub_height += line_height
-            
-            if sub_block:
-                cards.append('\n'.join(sub_block))
-        
-        # 如果当前卡片加上这个块会超，先保存当前卡片
-        elif current_height + block_height > max_height and current_card:
-            cards.append('\n\n'.join(current_card))
-            current_card = [block]
-            current_height = block_height
-        
-        # 否则加入当前卡片
-        else:
-            current_card.append(block)
-            current_height += block_height
-    
-    # 保存最后一个卡片
-    if current_card:
-        cards.append('\n\n'.join(current_card))
-    
-    return cards if cards else [content]
+@lru_cache(maxsize=None)
+def _shared_markdown() -> markdown.Markdown:
+    return markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
 
 
-def convert_markdown_to_html(md_content: str, style: dict = None) -> str:
-    """将 Markdown 转换为 HTML"""
+def convert_markdown_to_html(md_content: str, style: dict = None,
+                             md: Optional[markdown.Markdown] = None) -> str:
+    """
+    将 Markdown 转换为 HTML
+    
+    md 为复用的 Markdown 解析器（每次转换前 reset），默认使用模块共享的一个
+    """
     style = style or STYLES["purple"]
+    md = md or _shared_markdown()
     
     # 处理 tags（以 # 开头的标签）
-    tags_pattern = r'((?:#[\w\u4e00-\u9fa5]+\s*)+)$'
-    tags_match = re.search(tags_pattern, md_content, re.MULTILINE)
+    tags_match = TAGS_PATTERN.search(md_content)
     tags_html = ""
     
     if tags_match:
         tags_str = tags_match.group(1)
         md_content = md_content[:tags_match.start()].strip()
-        tags = re.findall(r'#([\w\u4e00-\u9fa5]+)', tags_str)
+        tags = TAG_PATTERN.findall(tags_str)
         if tags:
             accent = style.get('accent_color', '#6366f1')
             tags_html = f'<div class="tags-container">'
@@ -279,10 +171,7 @@ def convert_markdown_to_html(md_content: str, style: dict = None) -> str:
             tags_html += '</div>'
     
     # 转换 Markdown 为 HTML
-    html = markdown.markdown(
-        md_content,
-        extensions=['extra', 'codehilite', 'tables', 'nl2br']
-    )
+    html = md.reset().convert(md_content)
     
     return html + tags_html
 
@@ -363,12 +252,48 @@ def generate_cover_html(metadata: dict, style_key: str = "purple") -> str:
 </html>'''
 
 
+class CardRenderer:
+    """
+    一种样式的正文卡片渲染器
+    
+    Markdown 解析器和按占位符拆好的卡片模板只准备一次，之后生成卡片、
+    分页测量每个块都只需转换 Markdown 文本再拼接字符串。用 get_card_renderer() 取共享实例。
+    """
+    
+    def __init__(self, style_key: str = "purple"):
+        self.style_key = style_key
+        self.style = STYLES.get(style_key, STYLES["purple"])
+        self._md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+        self._head, rest = _card_template(style_key).split(_CONTENT_SLOT)
+        self._middle, self._tail = rest.split(_PAGE_SLOT)
+    
+    def to_html(self, md_content: str) -> str:
+        """将一段 Markdown 转换为卡片正文 HTML"""
+        return convert_markdown_to_html(md_content, self.style, self._md)
+    
+    def card_html(self, content: str, page_number: int = 1, total_pages: int = 1) -> str:
+        """生成正文卡片 HTML"""
+        page_text = f"{page_number}/{total_pages}" if total_pages > 1 else ""
+        return self._head + self.to_html(content) + self._middle + page_text + self._tail
+
+
+@lru_cache(maxsize=None)
+def get_card_renderer(style_key: str = "purple") -> CardRenderer:
+    """按样式缓存的卡片渲染器"""
+    return CardRenderer(style_key)
+
+
 def generate_card_html(content: str, page_number: int = 1, total_pages: int = 1, 
                        style_key: str = "purple") -> str:
     """生成正文卡片 HTML"""
+    return get_card_renderer(style_key).card_html(content, page_number, total_pages)
+
+
+def _card_template(style_key: str) -> str:
+    """正文卡片模板，正文和页码处为占位符"""
     style = STYLES.get(style_key, STYLES["purple"])
-    html_content = convert_markdown_to_html(content, style)
-    page_text = f"{page_number}/{total_pages}" if total_pages > 1 else ""
+    html_content = _CONTENT_SLOT
+    page_text = _PAGE_SLOT
     
     # 暗黑模式特殊处理
     is_dark = style_key == "dark"
@@ -515,109 +440,111 @@ def generate_card_html(content: str, page_number: int = 1, total_pages: int = 1,
 </html>'''
 
 
-async def measure_content_height(page: Page, html_content: str) -> int:
-    """使用 Playwright 测量实际内容高度"""
-    await page.set_content(html_content, wait_until='networkidle')
-    await page.wait_for_timeout(300)  # 等待字体渲染
-    
-    height = await page.evaluate('''() => {
-        const inner = document.querySelector('.card-inner');
-        if (inner) {
-            return inner.scrollHeight;
-        }
-        const container = document.querySelector('.card-container');
-        return container ? container.scrollHeight : document.body.scrollHeight;
-    }''')
+async def render_html_to_image(html_content: str, output_path: str, 
+                                width: int = CARD_WIDTH, height: int = CARD_HEIGHT,
+                                session: Optional[RenderSession] = None,
+                                cache: Optional[RenderCache] = None,
+                                encoder: Optional[CardEncoder] = None):
+    """
+    使用 Playwright 将 HTML 渲染为图片（传入 session 时复用其浏览器和页面池）
     
-    return height
+    encoder 决定输出格式和质量（默认 PNG）。
+    传入 cache 时先查渲染缓存，命中则直接放置缓存的图片并返回 None，否则返回截图高度
+    """
+    encoder = encoder or CardEncoder()
+    key = None
+    if cache is not None:
+        key = RenderCache.make_key(html_content, width, height, encoding=encoder.cache_tag())
+        if cache.get(key, output_path):
+            print(f"  ♻️ 缓存命中: {output_path}")
+            return None
+    
+    if session is None:
+        async with RenderSession(pages=1) as session:
+            return await render_html_to_image(html_content, output_path, width, height, session, cache,
+                                              encoder)
+    
+    async with session.page(width, height, 1) as page:
+        # 加载卡片并等待字体、图片就绪
+        await show_html(page, html_content)
+        
+        # 旧文件可能是指向缓存的硬链接，先删除再写，避免改写缓存
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+        
+        # 截图固定尺寸，在内存中编码后只写盘一次
+        size = await encoder.capture(
+            page, output_path,
+            clip={'x': 0, 'y': 0, 'width': width, 'height': height}
+        )
+        
+        if key is not None:
+            cache.put(key, output_path)
+        
+        print(f"  ✅ 已生成: {output_path} ({size / 1024:.0f} KB)")
+        return height
 
 
-async def render_html_to_image(html_content: str, output_path: str, 
-                                width: int = CARD_WIDTH, height: int = CARD_HEIGHT):
-    """使用 Playwright 将 HTML 渲染为图片"""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page(viewport={'width': width, 'height': height})
-        
-        try:
-            await page.set_content(html_content, wait_until='networkidle')
-            await page.wait_for_timeout(300)
-            
-            # 截图固定尺寸
-            await page.screenshot(
-                path=output_path,
-                clip={'x': 0, 'y': 0, 'width': width, 'height': height},
-                type='png'
+async def process_and_render_cards(card_contents: List[str], style_key: str,
+                                   session: Optional[RenderSession] = None) -> List[str]:
+    """
+    处理卡片内容，测量高度并自动分页
+    返回分页后每张卡片的 Markdown 内容
+    
+    先用按样式校准的高度模型预估分页（见 height_profile.py），分页点都明确时直接采用；
+    含图片/表格或分页点接近页高的内容才交给浏览器：卡片外壳只加载一次，
+    每个内容块的高度在一次 evaluate 中测完（见 paginator.py），只有单个块超过一页时才二分查找切分点。
+    """
+    if session is None:
+        async with RenderSession(pages=1) as session:
+            return await process_and_render_cards(card_contents, style_key, session)
+    
+    renderer = get_card_renderer(style_key)
+    shell_html = renderer.card_html('')
+    available_height = CARD_HEIGHT - 100
+    
+    estimator = await HeightEstimator.for_style(style_key, shell_html, session)
+    paged = [estimator.paginate(content, available_height) for content in card_contents]
+    pending = [i for i, pages in enumerate(paged) if pages is None]
+    print(f"  📏 高度预估直接分页 {len(card_contents) - len(pending)}/{len(card_contents)} 个内容块")
+    
+    if pending:
+        async with session.page(CARD_WIDTH, CARD_HEIGHT, 1) as page:
+            paginator = Paginator(
+                page, renderer.to_html,
+                available_height=available_height,
+                content_selector='.card-content',
+                measure_selector='.card-inner'
             )
+            await paginator.load(shell_html)
             
-            print(f"  ✅ 已生成: {output_path}")
-            
-        finally:
-            await browser.close()
+            for i in pending:
+                paged[i] = await paginator.paginate(card_contents[i])
+    
+    return [page_content for pages in paged for page_content in pages]
 
 
-async def process_and_render_cards(card_contents: List[str], output_dir: str, 
-                                   style_key: str) -> List[str]:
+async def render_markdown_to_cards(md_file: str, output_dir: str, style_key: str = "purple",
+                                   session: Optional[RenderSession] = None,
+                                   use_cache: bool = True,
+                                   on_card: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                   encoder: Optional[CardEncoder] = None) -> List[str]:
     """
-    处理卡片内容，检测高度并自动分页，然后渲染
-    返回最终生成的所有卡片文件路径
+    主渲染函数：将 Markdown 文件渲染为多张卡片图片
+    
+    传入 session 时复用其浏览器（如渲染服务），否则临时启动一个；封面和正文卡片在页面池上并发渲染。
+    HTML 未变化的卡片直接取自渲染缓存（use_cache=False 关闭）。
+    每张图完成时调用 on_card({'path', 'seconds', 'cached'})，可用于统计耗时。
+    encoder 决定图片格式（默认 PNG），文件扩展名随格式变化。
+    
+    Returns:
+        生成的图片路径列表（封面在前）
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page(viewport={'width': CARD_WIDTH, 'height': CARD_HEIGHT})
-        
-        all_cards = []
-        
-        try:
-            for content in card_contents:
-                # 预估内容高度
-                estimated_height = estimate_content_height(content)
-                
-                # 如果预估高度超过安全高度，尝试拆分
-                if estimated_height > SAFE_HEIGHT:
-                    split_contents = smart_split_content(content, SAFE_HEIGHT)
-                else:
-                    split_contents = [content]
-                
-                # 验证每个拆分后的内容
-                for split_content in split_contents:
-                    # 生成临时 HTML 测量
-                    temp_html = generate_card_html(split_content, 1, 1, style_key)
-                    actual_height = await measure_content_height(page, temp_html)
-                    
-                    # 如果仍然超出，进一步按行拆分
-                    if actual_height > CARD_HEIGHT - 100:
-                        lines = split_content.split('\n')
-                        sub_contents = []
-                        sub_lines = []
-                        sub_height = 0
-                        
-                        for line in lines:
-                            test_lines = sub_lines + [line]
-                            test_html = generate_card_html('\n'.join(test_lines), 1, 1, style_key)
-                            test_height = await measure_content_height(page, test_html)
-                            
-                            if test_height > CARD_HEIGHT - 100 and sub_lines:
-                                sub_contents.append('\n'.join(sub_lines))
-                                sub_lines = [line]
-                            else:
-                                sub_lines = test_lines
-                        
-                        if sub_lines:
-                            sub_contents.append('\n'.join(sub_lines))
-                        
-                        all_cards.extend(sub_contents)
-                    else:
-                        all_cards.append(split_content)
-        
-        finally:
-            await browser.close()
+    if session is None:
+        async with RenderSession(pages=1) as session:
+            return await render_markdown_to_cards(md_file, output_dir, style_key, session, use_cache,
+                                                  on_card, encoder)
     
-    return all_cards
-
-
-async def render_markdown_to_cards(md_file: str, output_dir: str, style_key: str = "purple"):
-    """主渲染函数：将 Markdown 文件渲染为多张卡片图片"""
     print(f"\n🎨 开始渲染: {md_file}")
     print(f"🎨 使用样式: {STYLES[style_key]['name']}")
     
@@ -635,43 +562,48 @@ async def render_markdown_to_cards(md_file: str, output_dir: str, style_key: str
     
     # 处理内容，智能分页
     print("  🔍 分析内容高度并智能分页...")
-    processed_cards = await process_and_render_cards(card_contents, output_dir, style_key)
+    processed_cards = await process_and_render_cards(card_contents, style_key, session)
     total_cards = len(processed_cards)
     print(f"  📄 将生成 {total_cards} 张卡片")
     
+    encoder = encoder or CardEncoder()
+    renderer = get_card_renderer(style_key)
+    cache = RenderCache.default() if use_cache else None
+    hits_before = cache.hits if cache else 0
+    jobs = []
+    images = []
+    
     # 生成封面
     if metadata.get('emoji') or metadata.get('title'):
         print("  📷 生成封面...")
         cover_html = generate_cover_html(metadata, style_key)
-        cover_path = os.path.join(output_dir, 'cover.png')
-        await render_html_to_image(cover_html, cover_path)
+        cover_path = os.path.join(output_dir, 'cover' + encoder.extension)
+        jobs.append(timed_card(render_html_to_image(cover_html, cover_path, session=session, cache=cache,
+                                                    encoder=encoder),
+                               cover_path, on_card))
+        images.append(cover_path)
     
     # 生成正文卡片
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page(viewport={'width': CARD_WIDTH, 'height': CARD_HEIGHT})
-        
-        try:
-            for i, content in enumerate(processed_cards, 1):
-                print(f"  📷 生成卡片 {i}/{total_cards}...")
-                card_html = generate_card_html(content, i, total_cards, style_key)
-                card_path = os.path.join(output_dir, f'card_{i}.png')
-                
-                await page.set_content(card_html, wait_until='networkidle')
-                await page.wait_for_timeout(300)
-                
-                await page.screenshot(
-                    path=card_path,
-                    clip={'x': 0, 'y': 0, 'width': CARD_WIDTH, 'height': CARD_HEIGHT},
-                    type='png'
-                )
-                print(f"  ✅ 已生成: {card_path}")
-        
-        finally:
-            await browser.close()
+    for i, content in enumerate(processed_cards, 1):
+        print(f"  📷 生成卡片 {i}/{total_cards}...")
+        card_html = renderer.card_html(content, i, total_cards)
+        card_path = os.path.join(output_dir, f'card_{i}{encoder.extension}')
+        jobs.append(timed_card(render_html_to_image(card_html, card_path, session=session, cache=cache,
+                                                    encoder=encoder),
+                               card_path, on_card))
+        images.append(card_path)
+    
+    # 页面池决定实际并发数，多余的任务排队等待空闲页面
+    await asyncio.gather(*jobs)
+    
+    if cache is not None:
+        hits = cache.hits - hits_before
+        stats = cache.stats()
+        print(f"  💾 渲染缓存: 命中 {hits}/{len(images)} 张"
+              f"（累计命中率 {stats['hit_rate']:.0%}，占用 {stats['size_mb']}/{stats['max_size_mb']} MB）")
     
     print(f"\n✨ 渲染完成！共生成 {total_cards} 张卡片，保存到: {output_dir}")
-    return total_cards
+    return images
 
 
 def list_styles():
@@ -715,6 +647,33 @@ def main():
         action='store_true',
         help='列出所有可用样式'
     )
+    parser.add_argument(
+        '--format', '-f',
+        choices=IMAGE_FORMATS,
+        default='png',
+        help='图片格式，jpeg/webp 体积远小于 png（默认: png）'
+    )
+    parser.add_argument(
+        '--quality', '-q',
+        type=int,
+        default=DEFAULT_QUALITY,
+        help=f'jpeg/webp 质量，指定 --target-kb 时为质量上限（默认: {DEFAULT_QUALITY}）'
+    )
+    parser.add_argument(
+        '--target-kb',
+        type=float,
+        help='jpeg/webp 每张图片的目标大小（KB），超出时自动降低质量'
+    )
+    parser.add_argument(
+        '--no-server',
+        action='store_true',
+        help='不使用常驻渲染服务（render_server.py），始终在本进程渲染'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='不使用渲染缓存，所有卡片重新截图'
+    )
     
     args = parser.parse_args()
     
@@ -730,7 +689,25 @@ def main():
         print(f"❌ 错误: 文件不存在 - {args.markdown_file}")
         sys.exit(1)
     
-    asyncio.run(render_markdown_to_cards(args.markdown_file, args.output_dir, args.style))
+    encoder = encoder_from_args(args.format, args.quality, args.target_kb)
+    
+    # 渲染服务在运行时交给它渲染，省去浏览器冷启动
+    if not args.no_server:
+        result = render_via_server({
+            'renderer': 'v2',
+            'markdown_file': args.markdown_file,
+            'output_dir': args.output_dir,
+            'theme': args.style,
+            'format': args.format,
+            'quality': args.quality,
+            'target_kb': args.target_kb,
+            'no_cache': args.no_cache
+        })
+        if result is not None:
+            sys.exit(0 if result['success'] else 1)
+    
+    asyncio.run(render_markdown_to_cards(args.markdown_file, args.output_dir, args.style,
+                                         use_cache=not args.no_cache, encoder=encoder))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+API 重试工具 (API Retry)
+读取 settings.json 的 retry 配置，对限流/服务端错误按 Retry-After 或指数退避重试
+
+Author: 翟星人
+"""
+
+import asyncio
+import email.utils
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable, Awaitable, TypeVar
+
+import httpx
+
+# 可重试的状态码：超时、冲突、限流、服务端错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+DEFAULT_RETRY = {
+    "max_attempts": 3,
+    "backoff_multiplier": 2,
+    "initial_delay_seconds": 1
+}
+
+T = TypeVar("T")
+
+SETTINGS_PATH = Path(__file__).parent.parent / 'config' / 'settings.json'
+
+
+def load_settings_section(section: str) -> Dict[str, Any]:
+    """读取 settings.json 的某个配置段，文件不存在时返回空字典"""
+    if not SETTINGS_PATH.exists():
+        return {}
+    with open(SETTINGS_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f).get(section, {}) or {}
+
+
+def load_retry_settings() -> Dict[str, Any]:
+    """读取重试配置（max_attempts / backoff_multiplier / initial_delay_seconds）"""
+    settings = dict(DEFAULT_RETRY)
+    settings.update(load_settings_section('retry'))
+    return settings
+
+
+def load_timeout(name: str, default: float) -> float:
+    """读取 limits.timeout_seconds 中某个接口的超时秒数"""
+    return float(load_settings_section('limits').get('timeout_seconds', {}).get(name, default))
+
+
+def _retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期）"""
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def backoff_delay(attempt: int, settings: Dict[str, Any], response: Optional[httpx.Response] = None) -> float:
+    """
+    第 attempt 次（从 0 开始）失败后的等待秒数
+
+    服务端给了 Retry-After 就按它等，否则 initial * multiplier^attempt，加少量随机抖动
+    避免并发请求同时重试。
+    """
+    server_delay = _retry_after(response)
+    if server_delay is not None:
+        return server_delay
+    delay = settings["initial_delay_seconds"] * settings["backoff_multiplier"] ** attempt
+    return delay + random.uniform(0, delay * 0.25)
+
+
+def is_retryable(error: Exception) -> bool:
+    """网络错误和限流/服务端错误可重试，其余（如 400/401）直接失败"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+async def aretry(send: Callable[[], Awaitable[T]], settings: Optional[Dict[str, Any]] = None) -> T:
+    """
+    执行 send()，失败按配置重试
+
+    Raises:
+        httpx.HTTPStatusError / httpx.TransportError: 重试用尽或不可重试
+    """
+    settings = settings or load_retry_settings()
+    attempts = max(1, int(settings["max_attempts"]))
+    for attempt in range(attempts):
+        try:
+            return await send()
+        except (httpx.HTTPStatusError, httpx.TransportError) as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            response = e.response if isinstance(e, httpx.HTTPStatusError) else None
+            await asyncio.sleep(backoff_delay(attempt, settings, response))
+
+
+async def apost_json(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    settings: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    异步 POST JSON，失败按配置重试，返回响应 JSON
+
+    Raises:
+        httpx.HTTPStatusError / httpx.TransportError: 重试用尽或不可重试
+    """
+    async def send() -> Dict[str, Any]:
+        response = await client.post(url, headers=headers, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    return await aretry(send, settings)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+图片响应流式落盘 (Base64 Stream)
+图片接口返回的 JSON 里 b64_json 字段动辄十几 MB，整体 json() 后再 b64decode 会在内存里同时存在
+响应体、base64 字符串、解码后的字节三份。这里边接收边解析：b64_json 的值按 4 字符对齐分块解码直接写文件，
+其余部分拼成去掉图片数据的 JSON（b64_json 置为 null），内存占用与图片大小无关。
+
+Author: 翟星人
+"""
+
+import base64
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+
+from api_retry import aretry
+
+_KEY = b'"b64_json"'
+_WHITESPACE = b' \t\r\n'
+
+
+def indexed_output_path(output_path: str, index: int) -> str:
+    """多张图时第 index 张的保存路径：第一张用原路径，其余加 _1、_2 后缀"""
+    if index == 0:
+        return output_path
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}_{index}{path.suffix}"))
+
+
+class B64JsonWriter:
+    """增量解析图片接口响应，b64_json 边读边解码写入文件"""
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+        self.saved_paths: List[str] = []
+        self._skeleton = bytearray()
+        self._buf = bytearray()
+        self._pending = b''
+        self._state = "scan"
+        self._file = None
+        self._part_path: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> None:
+        """喂入一段响应字节"""
+        self._buf += chunk
+        while self._buf:
+            if self._state == "scan":
+                i = self._buf.find(_KEY)
+                if i < 0:
+                    # 保留可能被截断的键名前缀
+                    keep = len(_KEY) - 1
+                    self._skeleton += self._buf[:-keep]
+                    del self._buf[:-keep]
+                    return
+                end = i + len(_KEY)
+                self._skeleton += self._buf[:end]
+                del self._buf[:end]
+                self._state = "colon"
+            elif self._state == "colon":
+                j = self._buf.find(b'"')
+                if j < 0:
+                    return
+                if self._buf[:j].strip(_WHITESPACE) != b':':
+                    # 值不是字符串（如 null），按普通内容处理
+                    self._state = "scan"
+                    continue
+                self._skeleton += b':null'
+                del self._buf[:j + 1]
+                self._open()
+                self._state = "value"
+            else:
+                k = self._buf.find(b'"')
+                data = bytes(self._buf if k < 0 else self._buf[:k])
+                if k < 0 and data.endswith(b'\\'):
+                    # 转义符被截断，留到下一段
+                    data = data[:-1]
+                    del self._buf[:len(data)]
+                else:
+                    del self._buf[:len(data) if k < 0 else k + 1]
+                self._write(data.replace(b'\\/', b'/').replace(b'\\n', b'').replace(b'\\r', b''))
+                if k < 0:
+                    return
+                self._close_file()
+                self._state = "scan"
+
+    def _open(self) -> None:
+        path = indexed_output_path(self.output_path, len(self.saved_paths))
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._part_path = f"{path}.part"
+        self._file = open(self._part_path, 'wb')
+        self.saved_paths.append(path)
+        self._pending = b''
+
+    def _write(self, data: bytes) -> None:
+        data = self._pending + data
+        n = len(data) // 4 * 4
+        if n:
+            self._file.write(base64.b64decode(data[:n]))
+        self._pending = data[n:]
+
+    def _close_file(self) -> None:
+        if self._pending:
+            self._file.write(base64.b64decode(self._pending + b'=' * (-len(self._pending) % 4)))
+        self._file.close()
+        self._file = None
+        os.replace(self._part_path, self.saved_paths[-1])
+
+    def abort(self) -> None:
+        """出错时删除写了一半的文件"""
+        if self._file:
+            self._file.close()
+            self._file = None
+            os.remove(self._part_path)
+
+    def close(self) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        结束解析
+
+        Returns:
+            (去掉图片数据的响应 JSON, 已保存的文件路径列表)
+        """
+        if self._state == "colon":
+            # 键后面再没有引号：值不是字符串（如结尾的 "b64_json": null），剩余部分按普通内容处理
+            self._state = "scan"
+        if self._state != "scan":
+            self.abort()
+            raise ValueError("响应不完整：图片数据被截断")
+        self._skeleton += self._buf
+        self._buf.clear()
+        return json.loads(bytes(self._skeleton)), self.saved_paths
+
+
+def post_image_stream(
+    client: httpx.Client,
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    output_path: str
+) -> Tuple[Dict[str, Any], List[str]]:
+    """同步流式请求图片接口，图片直接解码写入 output_path"""
+    with client.stream("POST", url, headers=headers, json=payload) as response:
+        response.raise_for_status()
+        writer = B64JsonWriter(output_path)
+        try:
+            for chunk in response.iter_bytes():
+                writer.feed(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.close()
+
+
+async def apost_image_stream(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    output_path: str,
+    settings: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], List[str]]:
+    """异步流式请求图片接口，失败按 retry 配置重试"""
+    async def send():
+        async with client.stream("POST", url, headers=headers, json=payload) as response:
+            response.raise_for_status()
+            writer = B64JsonWriter(output_path)
+            try:
+                async for chunk in response.aiter_bytes():
+                    writer.feed(chunk)
+            except BaseException:
+                writer.abort()
+                raise
+            return writer.close()
+
+    return await aretry(send, settings)
+
+
+def strip_b64(result: Dict[str, Any]) -> None:
+    """图片已落盘后，去掉响应里的 b64_json 数据"""
+    for item in result.get("data") or []:
+        if item.get("b64_json"):
+            item["b64_json"] = None
+
+
+def copy_cached_files(files: List[str], output_path: str) -> List[str]:
+    """把缓存中的图片文件复制到输出路径（多张按 _1、_2 后缀）"""
+    saved = []
+    for i, src in enumerate(files):
+        dst = indexed_output_path(output_path, i)
+        Path(dst).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(src, dst)
+        saved.append(dst)
+    return saved
+
+
+def restore_b64(result: Dict[str, Any], files: List[str]) -> None:
+    """调用方没有指定输出路径时，把缓存的图片文件还原成 b64_json"""
+    for item, path in zip(result.get("data") or [], files):
+        with open(path, 'rb') as f:
+            item["b64_json"] = base64.b64encode(f.read()).decode('utf-8')
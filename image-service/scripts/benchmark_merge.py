@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+长图拼接基准测试 - 对比不同线程数下 10/50/200 张图的拼接耗时
+
+用法:
+    python benchmark_merge.py
+    python benchmark_merge.py --panels 10 50 --workers 1 4 8 --stream
+
+Author: 翟星人
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from merge_long_image import LongImageMerger
+
+
+def make_panels(directory: Path, count: int, size=(1792, 1024), fmt: str = "jpg"):
+    """生成带噪声的测试图片（噪声让解码/缩放开销接近真实生图）"""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    paths = []
+    for i in range(count):
+        path = directory / f"panel_{i:03d}.{fmt}"
+        Image.fromarray(np.roll(base, i * 17, axis=1)).save(path, quality=90)
+        paths.append(str(path))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='长图拼接基准测试')
+    parser.add_argument('--panels', type=int, nargs='+', default=[10, 50, 200], help='图片数量')
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help='线程数，默认 1 和 CPU核数')
+    parser.add_argument('--format', choices=['jpg', 'png'], default='jpg', help='测试图片格式')
+    parser.add_argument('--blend', type=int, default=40, help='接缝融合高度')
+    parser.add_argument('--stream', action='store_true', help='测试流式拼接')
+    args = parser.parse_args()
+
+    workers_list = args.workers or sorted({1, os.cpu_count() or 1})
+
+    print(f"{'图片数':>6}{'线程':>6}{'耗时(秒)':>10}{'加速比':>8}")
+    print("-" * 30)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        for count in args.panels:
+            panel_dir = tmp_dir / f"panels_{count}"
+            panel_dir.mkdir()
+            paths = make_panels(panel_dir, count, fmt=args.format)
+            baseline = None
+            for workers in workers_list:
+                merger = LongImageMerger(workers=workers)
+                output = str(tmp_dir / f"out_{count}_{workers}.png")
+                start = time.perf_counter()
+                result = merger.merge(paths, output, blend=args.blend, stream=args.stream)
+                elapsed = time.perf_counter() - start
+                if not result["success"]:
+                    print(f"拼接失败: {result['error']}")
+                    return
+                baseline = baseline or elapsed
+                print(f"{count:>6}{workers:>6}{elapsed:>10.2f}{baseline / elapsed:>7.1f}x")
+                os.remove(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+上传前图片预处理 (Image Preprocess)
+图生文、图生图、参考图上传前统一处理：按文件头识别真实格式，按用途限制最长边，重新编码成 JPEG/WebP
+
+- OCR / 图表需要看清小字，允许的尺寸比普通描述大
+- 已经是 JPEG/WebP、尺寸和体积都不超限的图片原样上传，不做有损重编码
+- 带透明通道的图片编码为 WebP（保留 alpha）
+- 按文件内容 sha256 + 参数做进程内记忆，同一张图反复分析不重复解码编码
+- 未安装 Pillow 时退化为原样上传（仍按文件头给出正确的 MIME 类型）
+
+配置（settings.json）:
+    "preprocess": {"enabled": true, "format": "jpeg", "quality": 85,
+                   "max_dim": {"describe": 1536, "ocr": 2560, ...}}
+
+Author: 翟星人
+"""
+
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
+
+from api_retry import load_settings_section
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# 各用途的最长边上限（像素）
+MODE_MAX_DIM = {
+    "describe": 1536,
+    "ocr": 2560,
+    "chart": 2048,
+    "fashion": 1536,
+    "product": 1536,
+    "scene": 1536,
+    "edit": 2048,
+    "reference": 1536,
+}
+DEFAULT_MAX_DIM = 1536
+DEFAULT_FORMAT = "jpeg"
+DEFAULT_QUALITY = 85
+# 不超过此体积的 JPEG/WebP 直接上传
+RAW_MAX_BYTES = 1024 * 1024
+MEMO_SIZE = 32
+
+# 文件头魔数 -> MIME
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+_memo: "OrderedDict[Tuple, str]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def sniff_mime(data: bytes) -> str:
+    """按文件头识别真实格式，无法识别时返回 image/png"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    for magic, mime in _SIGNATURES:
+        if data.startswith(magic):
+            return mime
+    return 'image/png'
+
+
+@lru_cache(maxsize=1)
+def load_preprocess_settings() -> Dict[str, Any]:
+    """读取 preprocess 配置并补齐默认值"""
+    settings = load_settings_section('preprocess')
+    max_dim = dict(MODE_MAX_DIM)
+    max_dim.update(settings.get('max_dim', {}))
+    return {
+        "enabled": settings.get('enabled', True),
+        "format": settings.get('format', DEFAULT_FORMAT).lower(),
+        "quality": int(settings.get('quality', DEFAULT_QUALITY)),
+        "max_dim": max_dim,
+    }
+
+
+def _data_url(mime: str, data: bytes) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def _reencode(data: bytes, mime: str, max_dim: int, fmt: str, quality: int) -> Tuple[str, bytes]:
+    """缩放并重新编码，返回 (MIME, 编码后字节)；不值得处理时返回原图"""
+    img = Image.open(io.BytesIO(data))
+    if getattr(img, 'n_frames', 1) > 1:
+        # 动图保持原样
+        return mime, data
+
+    oversized = max(img.size) > max_dim
+    if not oversized and mime in ('image/jpeg', 'image/webp') and len(data) <= RAW_MAX_BYTES:
+        return mime, data
+
+    if img.format == 'JPEG':
+        # JPEG 按 1/2、1/4、1/8 直接解码到接近目标的尺寸
+        img.draft('RGB', (max_dim, max_dim))
+    img = ImageOps.exif_transpose(img)
+    if oversized:
+        img.thumbnail((max_dim, max_dim), Image.Resampling.LANCZOS)
+
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    out = io.BytesIO()
+    if has_alpha or fmt == 'webp':
+        img.convert('RGBA' if has_alpha else 'RGB').save(out, 'WEBP', quality=quality, method=4)
+        new_mime = 'image/webp'
+    else:
+        img.convert('RGB').save(out, 'JPEG', quality=quality, optimize=True)
+        new_mime = 'image/jpeg'
+
+    encoded = out.getvalue()
+    if not oversized and len(encoded) >= len(data):
+        return mime, data
+    return new_mime, encoded
+
+
+def prepare_image(
+    image_path: str,
+    mode: str = "describe",
+    max_dim: Optional[int] = None,
+    fmt: Optional[str] = None,
+    quality: Optional[int] = None
+) -> str:
+    """
+    读取图片并按用途预处理，返回 data URL
+
+    Args:
+        image_path: 图片路径
+        mode: 用途（describe/ocr/chart/... 或 edit/reference），决定默认最长边
+        max_dim: 最长边上限，覆盖 mode 的默认值
+        fmt: 重编码格式 jpeg / webp
+        quality: 编码质量
+
+    Returns:
+        data:<mime>;base64,... 字符串
+    """
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    mime = sniff_mime(data)
+
+    settings = load_preprocess_settings()
+    if Image is None or not settings["enabled"]:
+        return _data_url(mime, data)
+
+    max_dim = max_dim or settings["max_dim"].get(mode, DEFAULT_MAX_DIM)
+    fmt = (fmt or settings["format"]).lower()
+    quality = quality or settings["quality"]
+
+    key = (hashlib.sha256(data).hexdigest(), max_dim, fmt, quality)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+
+    try:
+        new_mime, encoded = _reencode(data, mime, max_dim, fmt, quality)
+    except (OSError, ValueError):
+        # Pillow 无法解码的格式原样上传
+        new_mime, encoded = mime, data
+    url = _data_url(new_mime, encoded)
+
+    with _memo_lock:
+        _memo[key] = url
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return url
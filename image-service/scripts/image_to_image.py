@@ -13,6 +13,10 @@ import os
 from typing import Dict, Any, Optional, Union
 from pathlib import Path
 
+from b64_stream import copy_cached_files, post_image_stream, restore_b64, strip_b64
+from image_preprocess import prepare_image, sniff_mime
+from result_cache import ResultCache
+
 VALID_ASPECT_RATIOS = [
     "1:1", "2:3", "3:2", "3:4", "4:3", "4:5", "5:4", "9:16", "16:9", "21:9"
 ]
@@ -40,13 +44,20 @@ RATIO_TO_SIZE = {
 class ImageToImageEditor:
     """图生图编辑器"""
     
-    def __init__(self, config: Optional[Dict[str, str]] = None):
+    def __init__(
+        self,
+        config: Optional[Dict[str, str]] = None,
+        use_cache: bool = True,
+        stream: bool = True
+    ):
         """
         初始化编辑器
         
         Args:
             config: 配置字典，包含 api_key, base_url, model
                    如果不传则从环境变量或配置文件读取
+            use_cache: 是否使用结果缓存（相同请求直接读盘）
+            stream: 指定输出路径时流式接收响应，图片边解码边写盘，返回结果不含 base64 数据
         """
         if config is None:
             config = self._load_config()
@@ -57,6 +68,9 @@ class ImageToImageEditor:
         
         if not self.api_key or not self.base_url:
             raise ValueError("缺少必要的 API 配置：api_key 和 base_url")
+        
+        self.cache = ResultCache.default() if use_cache else None
+        self.stream = stream
     
     def _load_config(self) -> Dict[str, str]:
         """从配置文件或环境变量加载配置"""
@@ -80,13 +94,16 @@ class ImageToImageEditor:
         return config
     
     @staticmethod
-    def image_to_base64(image_path: str, with_prefix: bool = True) -> str:
+    def image_to_base64(image_path: str, with_prefix: bool = True, mode: str = "edit") -> str:
         """
-        将图片文件转换为 base64 编码
+        将图片文件预处理后转换为 base64 编码
+        
+        按文件头识别真实格式，超过 edit 用途的最长边时缩小并重编码（见 image_preprocess）
         
         Args:
             image_path: 图片文件路径
             with_prefix: 是否添加 data URL 前缀
+            mode: 预处理用途，决定最长边上限
             
         Returns:
             base64 编码字符串
@@ -95,23 +112,10 @@ class ImageToImageEditor:
         if not path.exists():
             raise FileNotFoundError(f"图片文件不存在: {image_path}")
         
-        # 获取 MIME 类型
-        suffix = path.suffix.lower()
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.webp': 'image/webp'
-        }
-        mime_type = mime_types.get(suffix, 'image/png')
-        
-        with open(image_path, 'rb') as f:
-            b64_str = base64.b64encode(f.read()).decode('utf-8')
-        
+        data_url = prepare_image(image_path, mode)
         if with_prefix:
-            return f"data:{mime_type};base64,{b64_str}"
-        return b64_str
+            return data_url
+        return data_url.split(',', 1)[1]
     
     def edit(
         self,
@@ -146,7 +150,7 @@ class ImageToImageEditor:
                 # 假设是纯 base64 字符串
                 image_b64 = f"data:image/png;base64,{image}"
         else:
-            image_b64 = f"data:image/png;base64,{base64.b64encode(image).decode('utf-8')}"
+            image_b64 = f"data:{sniff_mime(image)};base64,{base64.b64encode(image).decode('utf-8')}"
         
         payload: Dict[str, Any] = {
             "model": self.model,
@@ -169,28 +173,55 @@ class ImageToImageEditor:
         }
         
         try:
-            with httpx.Client(timeout=180.0) as client:
-                response = client.post(
-                    f"{self.base_url}/images/edits",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                # 如果指定了输出路径，保存图片
-                if output_path and result.get("data"):
-                    b64_data = result["data"][0].get("b64_json")
-                    if b64_data:
-                        self._save_image(b64_data, output_path)
-                        result["saved_path"] = output_path
-                
-                return {
-                    "success": True,
-                    "data": result,
-                    "saved_path": output_path if output_path else None
-                }
-                
+            # 相同请求（模型、指令、尺寸、原图数据）命中缓存则不调用 API
+            cache_key = self.cache.make_key("/images/edits", payload) if self.cache else None
+            result = self.cache.get(cache_key) if cache_key else None
+            cached = result is not None
+            
+            saved = None
+            if not cached:
+                with httpx.Client(timeout=180.0) as client:
+                    if self.stream and output_path and response_format == "b64_json":
+                        # 流式接收，图片边解码边写盘
+                        result, saved = post_image_stream(
+                            client, f"{self.base_url}/images/edits", headers, payload, output_path
+                        )
+                    else:
+                        response = client.post(
+                            f"{self.base_url}/images/edits",
+                            headers=headers,
+                            json=payload
+                        )
+                        response.raise_for_status()
+                        result = response.json()
+                if cache_key:
+                    self.cache.put(cache_key, result, saved)
+            
+            cached_files = result.pop("_cached_files", None)
+            if cached_files:
+                if output_path:
+                    copy_cached_files(cached_files, output_path)
+                    result["saved_path"] = output_path
+                else:
+                    restore_b64(result, cached_files)
+            elif saved:
+                result["saved_path"] = output_path
+            # 如果指定了输出路径，保存图片
+            elif output_path and result.get("data"):
+                b64_data = result["data"][0].get("b64_json")
+                if b64_data:
+                    self._save_image(b64_data, output_path)
+                    result["saved_path"] = output_path
+                    if self.stream:
+                        strip_b64(result)
+            
+            return {
+                "success": True,
+                "data": result,
+                "saved_path": output_path if output_path else None,
+                "cached": cached
+            }
+            
         except httpx.HTTPStatusError as e:
             return {
                 "success": False,
@@ -235,6 +266,8 @@ def main():
     parser.add_argument('-o', '--output', help='输出文件路径（默认保存到当前目录）')
     parser.add_argument('-r', '--ratio', help=f'宽高比（推荐）。可选: {", ".join(VALID_ASPECT_RATIOS)}')
     parser.add_argument('-s', '--size', help='传统尺寸，如 1024x1536')
+    parser.add_argument('--no-cache', action='store_true', help='不使用结果缓存，强制调用 API')
+    parser.add_argument('--no-stream', action='store_true', help='整体读取响应后再保存（默认流式解码写盘）')
     
     args = parser.parse_args()
     
@@ -251,7 +284,7 @@ def main():
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         output_path = f"edited_{timestamp}.png"
     
-    editor = ImageToImageEditor()
+    editor = ImageToImageEditor(use_cache=not args.no_cache, stream=not args.no_stream)
     result = editor.edit(
         image=args.image,
         prompt=args.prompt,
@@ -261,7 +294,7 @@ def main():
     )
     
     if result["success"]:
-        print(f"编辑成功！")
+        print(f"编辑成功！{'（缓存）' if result.get('cached') else ''}")
         if result.get("saved_path"):
             print(f"图片已保存到: {result['saved_path']}")
     else:
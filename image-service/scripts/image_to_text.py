@@ -7,12 +7,19 @@ Author: 翟星人
 """
 
 import httpx
+import asyncio
 import base64
 import json
 import os
-from typing import Dict, Any, Optional, Union, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Union, List, Callable
 from pathlib import Path
 
+from api_retry import apost_json, load_retry_settings, load_timeout
+from image_preprocess import prepare_image, sniff_mime
+from result_cache import ResultCache
+
 
 class ImageToTextAnalyzer:
     """图生文分析器 - 视觉识别"""
@@ -27,13 +34,14 @@ class ImageToTextAnalyzer:
         "scene": "请描述这张图片的场景，包括：地点、环境、氛围、时间（白天/夜晚）等。"
     }
     
-    def __init__(self, config: Optional[Dict[str, str]] = None):
+    def __init__(self, config: Optional[Dict[str, str]] = None, use_cache: bool = True):
         """
         初始化分析器
         
         Args:
             config: 配置字典，包含 api_key, base_url, model
                    如果不传则从环境变量或配置文件读取
+            use_cache: 是否使用结果缓存（相同请求直接读盘）
         """
         if config is None:
             config = self._load_config()
@@ -44,6 +52,8 @@ class ImageToTextAnalyzer:
         
         if not self.api_key or not self.base_url:
             raise ValueError("缺少必要的 API 配置：api_key 和 base_url")
+        
+        self.cache = ResultCache.default() if use_cache else None
     
     def _load_config(self) -> Dict[str, str]:
         """从配置文件或环境变量加载配置"""
@@ -74,12 +84,16 @@ class ImageToTextAnalyzer:
         return config
     
     @staticmethod
-    def image_to_base64(image_path: str) -> str:
+    def image_to_base64(image_path: str, mode: str = "describe") -> str:
         """
-        将图片文件转换为 base64 编码（带 data URL 前缀）
+        将图片文件预处理后转换为 base64 编码（带 data URL 前缀）
+        
+        按文件头识别真实格式，按分析模式限制最长边（OCR 保留更多像素）并重编码，
+        同一张图的结果按内容哈希记忆（见 image_preprocess）
         
         Args:
             image_path: 图片文件路径
+            mode: 分析模式，决定最长边上限
             
         Returns:
             base64 编码字符串（含 data URL 前缀）
@@ -88,21 +102,7 @@ class ImageToTextAnalyzer:
         if not path.exists():
             raise FileNotFoundError(f"图片文件不存在: {image_path}")
         
-        # 获取 MIME 类型
-        suffix = path.suffix.lower()
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.webp': 'image/webp'
-        }
-        mime_type = mime_types.get(suffix, 'image/png')
-        
-        with open(image_path, 'rb') as f:
-            b64_str = base64.b64encode(f.read()).decode('utf-8')
-        
-        return f"data:{mime_type};base64,{b64_str}"
+        return prepare_image(image_path, mode)
     
     def analyze(
         self,
@@ -125,24 +125,54 @@ class ImageToTextAnalyzer:
         Returns:
             包含分析结果的字典
         """
-        # 确定使用的提示词
-        if prompt is None:
-            prompt = self.ANALYSIS_MODES.get(mode, self.ANALYSIS_MODES["describe"])
-        
-        # 处理图片输入
+        try:
+            payload = self._build_payload(self._image_url(image, mode), prompt, mode, max_tokens, temperature)
+            
+            # 相同请求（模型、提示词、图片数据、模式）命中缓存则不调用 API
+            cache_key = self.cache.make_key("/chat/completions", payload, mode) if self.cache else None
+            result = self.cache.get(cache_key) if cache_key else None
+            cached = result is not None
+            
+            if not cached:
+                with httpx.Client(timeout=120.0) as client:
+                    response = client.post(
+                        f"{self.base_url}/chat/completions",
+                        headers=self._headers(),
+                        json=payload
+                    )
+                    response.raise_for_status()
+                    result = response.json()
+                if cache_key:
+                    self.cache.put(cache_key, result)
+            
+            return self._finish(result, mode, cached)
+        except Exception as e:
+            return self._error(e)
+    
+    def _image_url(self, image: Union[str, bytes], mode: str = "describe") -> str:
+        """把图片路径 / URL / base64 / 字节统一成请求里的 image_url"""
         if isinstance(image, str):
             if os.path.isfile(image):
-                image_url = self.image_to_base64(image)
-            elif image.startswith('data:') or image.startswith('http'):
-                image_url = image
-            else:
-                # 假设是纯 base64 字符串
-                image_url = f"data:image/png;base64,{image}"
-        else:
-            image_url = f"data:image/png;base64,{base64.b64encode(image).decode('utf-8')}"
+                return self.image_to_base64(image, mode)
+            if image.startswith('data:') or image.startswith('http'):
+                return image
+            # 假设是纯 base64 字符串
+            return f"data:image/png;base64,{image}"
+        return f"data:{sniff_mime(image)};base64,{base64.b64encode(image).decode('utf-8')}"
+    
+    def _build_payload(
+        self,
+        image_url: str,
+        prompt: Optional[str],
+        mode: str,
+        max_tokens: int,
+        temperature: float
+    ) -> Dict[str, Any]:
+        """构建 /chat/completions 请求体；prompt 为空时按 mode 取预定义提示词"""
+        if prompt is None:
+            prompt = self.ANALYSIS_MODES.get(mode, self.ANALYSIS_MODES["describe"])
         
-        # 构建请求
-        payload = {
+        return {
             "model": self.model,
             "messages": [
                 {
@@ -164,44 +194,45 @@ class ImageToTextAnalyzer:
             "max_tokens": max_tokens,
             "temperature": temperature
         }
-        
-        headers = {
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
+    
+    @staticmethod
+    def _finish(result: Dict[str, Any], mode: str, cached: bool) -> Dict[str, Any]:
+        """从接口响应中提取文本内容"""
+        content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
         
-        try:
-            with httpx.Client(timeout=120.0) as client:
-                response = client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                # 提取文本内容
-                content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                
-                return {
-                    "success": True,
-                    "content": content,
-                    "mode": mode,
-                    "usage": result.get("usage", {})
-                }
-                
-        except httpx.HTTPStatusError as e:
+        return {
+            "success": True,
+            "content": content,
+            "mode": mode,
+            "usage": result.get("usage", {}),
+            "cached": cached
+        }
+    
+    @staticmethod
+    def _error(e: Exception) -> Dict[str, Any]:
+        if isinstance(e, httpx.HTTPStatusError):
             return {
                 "success": False,
                 "error": f"HTTP 错误: {e.response.status_code}",
                 "detail": str(e)
             }
-        except Exception as e:
+        if isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)):
             return {
                 "success": False,
-                "error": "分析失败",
-                "detail": str(e)
+                "error": "分析超时",
+                "detail": str(e) or type(e).__name__
             }
+        return {
+            "success": False,
+            "error": "分析失败",
+            "detail": str(e)
+        }
     
     def describe(self, image: Union[str, bytes]) -> Dict[str, Any]:
         """通用图片描述"""
@@ -227,27 +258,136 @@ class ImageToTextAnalyzer:
         """场景分析"""
         return self.analyze(image, mode="scene")
     
+    async def abatch_analyze(
+        self,
+        images: List[str],
+        mode: str = "describe",
+        prompt: Optional[str] = None,
+        concurrency: int = 4,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        max_tokens: int = 2000,
+        temperature: float = 0.7,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        异步批量分析
+        
+        所有请求共用一个 httpx.AsyncClient 连接池（keep-alive），信号量限制并发；
+        图片的读取和 base64 编码在线程池里提前进行，与网络等待重叠，
+        预编码窗口为 2 倍并发数，避免几百张图的 base64 同时驻留内存。
+        限流(429)和服务端错误按 Retry-After 或指数退避重试。
+        
+        Args:
+            images: 图片路径 / URL 列表
+            mode: 分析模式
+            prompt: 自定义提示词（所有图片共用）
+            concurrency: 最大并发请求数
+            timeout: 单张图请求的总超时秒数（含重试，不含排队），默认 settings.json 的 limits.timeout_seconds.image_to_text
+            retries: 单张图最多尝试次数，默认 settings.json 的 retry.max_attempts
+            on_result: 单张图完成时的回调（按完成顺序，可用于流式输出）
+            
+        Returns:
+            与 images 顺序一致的结果列表，每项额外包含 index、image、elapsed
+        """
+        concurrency = max(1, concurrency)
+        retry = load_retry_settings()
+        if retries is not None:
+            retry["max_attempts"] = retries
+        timeout = timeout or load_timeout("image_to_text", 120.0)
+        semaphore = asyncio.Semaphore(concurrency)
+        window = asyncio.Semaphore(concurrency * 2)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        loop = asyncio.get_running_loop()
+        
+        with ThreadPoolExecutor(max_workers=min(concurrency, os.cpu_count() or 1)) as encoder:
+            async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+                async def request(payload: Dict[str, Any]) -> Dict[str, Any]:
+                    cache_key = self.cache.make_key("/chat/completions", payload, mode) if self.cache else None
+                    result = self.cache.get(cache_key) if cache_key else None
+                    if result is not None:
+                        return self._finish(result, mode, True)
+                    async with semaphore:
+                        result = await asyncio.wait_for(
+                            apost_json(client, f"{self.base_url}/chat/completions",
+                                       self._headers(), payload, retry),
+                            timeout
+                        )
+                    if cache_key:
+                        await asyncio.to_thread(self.cache.put, cache_key, result)
+                    return self._finish(result, mode, False)
+                
+                async def run(index: int, image: str) -> Dict[str, Any]:
+                    async with window:
+                        start = time.perf_counter()
+                        try:
+                            image_url = await loop.run_in_executor(encoder, self._image_url, image, mode)
+                            payload = self._build_payload(image_url, prompt, mode, max_tokens, temperature)
+                            result = await request(payload)
+                        except Exception as e:
+                            result = self._error(e)
+                    result.update(index=index, image=image, elapsed=round(time.perf_counter() - start, 2))
+                    if on_result:
+                        on_result(result)
+                    return result
+                
+                return await asyncio.gather(*(run(i, image) for i, image in enumerate(images)))
+    
     def batch_analyze(
         self,
         images: List[str],
-        mode: str = "describe"
+        mode: str = "describe",
+        concurrency: int = 4,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        **kwargs
     ) -> List[Dict[str, Any]]:
         """
-        批量分析多张图片
+        批量分析多张图片（abatch_analyze 的同步入口）
         
         Args:
             images: 图片路径列表
             mode: 分析模式
+            concurrency: 最大并发请求数
+            timeout: 单张图的总超时秒数
+            retries: 单张图最多尝试次数
+            on_result: 单张图完成时的回调
+            **kwargs: 透传给 abatch_analyze（prompt / max_tokens / temperature）
             
         Returns:
-            分析结果列表
+            与 images 顺序一致的分析结果列表
         """
-        results = []
-        for image in images:
-            result = self.analyze(image, mode=mode)
-            result["image"] = image
-            results.append(result)
-        return results
+        return asyncio.run(self.abatch_analyze(
+            images, mode, concurrency=concurrency, timeout=timeout,
+            retries=retries, on_result=on_result, **kwargs
+        ))
+
+
+def run_batch(analyzer: ImageToTextAnalyzer, args) -> None:
+    """并发分析多张图片，按完成顺序打印，按输入顺序保存"""
+    total = len(args.images)
+    
+    def report(result: Dict[str, Any]) -> None:
+        tag = f"[{result['index'] + 1}/{total}] {result['image']} ({result['elapsed']}s)"
+        if result["success"]:
+            print(f"\n=== {tag} ===\n{result['content']}")
+        else:
+            print(f"\n✗ {tag} {result['error']}: {result.get('detail', 'N/A')}")
+    
+    print(f"批量分析 {total} 张图片 (模式 {args.mode}，并发 {args.concurrency})...")
+    start = time.perf_counter()
+    results = analyzer.batch_analyze(
+        args.images, args.mode, concurrency=args.concurrency, timeout=args.timeout,
+        retries=args.retries, on_result=report, prompt=args.prompt, max_tokens=args.max_tokens
+    )
+    ok = sum(1 for r in results if r["success"])
+    print(f"\n完成: 成功 {ok}/{total}，总耗时 {time.perf_counter() - start:.1f}s")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
 
 
 def main():
@@ -255,25 +395,34 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='图生文分析工具（视觉识别）')
-    parser.add_argument('image', help='输入图片路径')
+    parser.add_argument('images', nargs='+', help='输入图片路径，多张时并发批量分析')
     parser.add_argument('-m', '--mode', default='describe',
                        choices=['describe', 'ocr', 'chart', 'fashion', 'product', 'scene'],
                        help='分析模式')
     parser.add_argument('-p', '--prompt', help='自定义分析提示词')
     parser.add_argument('--max-tokens', type=int, default=2000, help='最大输出 token 数')
+    parser.add_argument('--no-cache', action='store_true', help='不使用结果缓存，强制调用 API')
+    parser.add_argument('-j', '--concurrency', type=int, default=4, help='批量分析的并发数，默认4')
+    parser.add_argument('--timeout', type=float, help='批量分析时单张图的超时秒数')
+    parser.add_argument('--retries', type=int, help='批量分析时单张图最多尝试次数')
+    parser.add_argument('-o', '--output', help='批量结果保存为 JSON 文件（按输入顺序）')
     
     args = parser.parse_args()
     
-    analyzer = ImageToTextAnalyzer()
+    analyzer = ImageToTextAnalyzer(use_cache=not args.no_cache)
+    if len(args.images) > 1 or args.output:
+        run_batch(analyzer, args)
+        return
+    
     result = analyzer.analyze(
-        image=args.image,
+        image=args.images[0],
         prompt=args.prompt,
         mode=args.mode,
         max_tokens=args.max_tokens
     )
     
     if result["success"]:
-        print(f"\n=== 分析结果 ({result['mode']}) ===\n")
+        print(f"\n=== 分析结果 ({result['mode']}{'，缓存' if result.get('cached') else ''}) ===\n")
         print(result["content"])
         print(f"\n=== Token 使用 ===")
         print(f"输入: {result['usage'].get('prompt_tokens', 'N/A')}")
@@ -8,57 +8,203 @@ Author: 翟星人
 
 import argparse
 import os
+import struct
+import zlib
 import glob as glob_module
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 
-from PIL import Image
+from PIL import Image, ImageColor
 import numpy as np
 
 
+class StreamingPNGWriter:
+    """逐行写 PNG：行数据经 Up 滤波后增量压缩成 IDAT 块，不在内存中保留整张画布
+
+    先写到 path.part，close() 成功后才替换为 path；出错时调用 abort() 删除半成品
+    """
+    
+    def __init__(self, path: str, width: int, height: int, compress_level: int = 6):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._prev_row = np.zeros((width * 3,), dtype=np.uint8)
+        self._compressor = zlib.compressobj(compress_level)
+        self._part_path = f"{path}.part"
+        self._file = open(self._part_path, 'wb')
+        self._file.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+    
+    def _chunk(self, tag: bytes, data: bytes):
+        self._file.write(struct.pack('>I', len(data)))
+        self._file.write(tag)
+        self._file.write(data)
+        self._file.write(struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+    
+    def write_rows(self, rows: np.ndarray):
+        """写入若干行，rows 形状为 (n, width, 3) 的 uint8 数组"""
+        flat = rows.reshape(rows.shape[0], -1)
+        # Up 滤波：每行减去上一行（按字节模 256）
+        prev = np.vstack([self._prev_row[None, :], flat[:-1]])
+        filtered = flat - prev
+        self._prev_row = flat[-1].copy()
+        
+        data = np.empty((flat.shape[0], flat.shape[1] + 1), dtype=np.uint8)
+        data[:, 0] = 2
+        data[:, 1:] = filtered
+        compressed = self._compressor.compress(data.tobytes())
+        if compressed:
+            self._chunk(b'IDAT', compressed)
+        self.rows_written += flat.shape[0]
+    
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"写入行数 {self.rows_written} 与声明高度 {self.height} 不一致")
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+        self._file.close()
+        self._file = None
+        os.replace(self._part_path, self.path)
+    
+    def abort(self):
+        """出错时关闭并删除写了一半的文件"""
+        if self._file:
+            self._file.close()
+            self._file = None
+            os.remove(self._part_path)
+
+
 class LongImageMerger:
     """长图拼接器"""
     
-    def __init__(self, target_width: int = 1080):
+    def __init__(self, target_width: int = 1080, workers: Optional[int] = None):
         """
         初始化拼接器
         
         Args:
             target_width: 目标宽度，默认1080（微信推荐宽度）
+            workers: 并行解码/缩放的线程数，默认CPU核数；1为串行
         """
         self.target_width = target_width
+        self.workers = max(1, workers or os.cpu_count() or 1)
+    
+    def _scaled_height(self, size) -> int:
+        """按目标宽度等比缩放后的高度"""
+        width, height = size
+        ratio = self.target_width / width
+        return int(height * ratio)
     
-    def _blend_images(self, img_top: Image.Image, img_bottom: Image.Image, blend_height: int) -> Image.Image:
+    def _load_resized(self, path: str) -> Image.Image:
+        """解码单张图片，转 RGB 并缩放到目标宽度
+
+        JPEG 通过 draft() 在解码时直接按 1/2、1/4、1/8 降采样（不低于目标尺寸），
+        大图省掉大部分解码和缩放开销。
         """
-        在两张图的接缝处创建渐变融合过渡
-        
-        Args:
-            img_top: 上方图片
-            img_bottom: 下方图片
-            blend_height: 融合区域高度（像素）
-            
-        Returns:
-            融合后的下方图片（顶部已与上方图片底部融合）
+        with Image.open(path) as img:
+            # 目标高度按文件头尺寸计算（与 _read_heights 一致），draft() 之后 img.size 已是降采样尺寸
+            target_h = self._scaled_height(img.size)
+            img.draft('RGB', (self.target_width, target_h))
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            return img.resize((self.target_width, target_h), Image.Resampling.LANCZOS)
+    
+    def _iter_resized(self, image_paths: List[str], window: Optional[int] = None):
         """
-        blend_height = min(blend_height, img_top.height // 4, img_bottom.height // 4)
+        按顺序产出缩放后的图片，解码和缩放在线程池中并发进行
         
-        top_region = img_top.crop((0, img_top.height - blend_height, img_top.width, img_top.height))
-        bottom_region = img_bottom.crop((0, 0, img_bottom.width, blend_height))
+        PIL 的解码和缩放会释放 GIL，线程即可并行。最多提前 window 张（默认 workers 张），
+        避免一次性把所有图片都解码进内存。
+        """
+        window = window or self.workers
+        if self.workers == 1:
+            for p in image_paths:
+                yield self._load_resized(p)
+            return
         
-        top_array = np.array(top_region, dtype=np.float32)
-        bottom_array = np.array(bottom_region, dtype=np.float32)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            paths = iter(image_paths)
+            for p in paths:
+                pending.append(pool.submit(self._load_resized, p))
+                if len(pending) >= window:
+                    break
+            while pending:
+                img = pending.popleft().result()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append(pool.submit(self._load_resized, next_path))
+                yield img
+    
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _alpha_ramp(blend_height: int) -> np.ndarray:
+        """
+        上方图片的定点权重（0-256），从 256 线性降到 0，按融合高度缓存
         
-        alpha = np.linspace(1, 0, blend_height).reshape(-1, 1, 1)
+        形状 (blend_height, 1, 1)，可直接广播到 (..., blend_height, W, 3)
+        """
+        ramp = np.rint(np.linspace(256, 0, blend_height)).astype(np.uint16)
+        ramp.flags.writeable = False
+        return ramp.reshape(-1, 1, 1)
+    
+    def _blend_arrays(self, top: np.ndarray, bottom: np.ndarray) -> np.ndarray:
+        """
+        接缝渐变融合：uint8 定点运算，支持批量（前导维度为接缝数）
         
-        blended_array = top_array * alpha + bottom_array * (1 - alpha)
-        blended_array = np.clip(blended_array, 0, 255).astype(np.uint8)
+        Args:
+            top: 上方图片底部区域，形状 (..., blend_height, W, 3)
+            bottom: 下方图片顶部区域，形状同 top
+            
+        Returns:
+            融合后的区域（uint8）
+        """
+        alpha = self._alpha_ramp(top.shape[-3])
+        mixed = top.astype(np.uint16) * alpha
+        mixed += bottom.astype(np.uint16) * (256 - alpha)
+        mixed += 128
+        mixed >>= 8
+        return mixed.astype(np.uint8)
+    
+    def _blend_seams(self, canvas: Image.Image, seams: List[tuple]):
+        """
+        在画布上原地融合所有接缝，开销只与接缝面积成正比
         
-        blended_region = Image.fromarray(blended_array)
+        相同融合高度的接缝一次性堆叠成批做 NumPy 运算，结果只回贴接缝条带。
         
-        result = img_bottom.copy()
-        result.paste(blended_region, (0, 0))
+        Args:
+            canvas: 已贴好所有图片的长图画布
+            seams: [(上方图片底边 y, 下方图片顶边 y, 融合高度)]
+        """
+        groups: Dict[int, List[tuple]] = {}
+        for top_end, bottom_start, blend_height in seams:
+            if blend_height > 0:
+                groups.setdefault(blend_height, []).append((top_end, bottom_start))
         
-        return result
+        width = canvas.width
+        for blend_height, group in groups.items():
+            tops = np.stack([
+                np.asarray(canvas.crop((0, top_end - blend_height, width, top_end)))
+                for top_end, _ in group
+            ])
+            bottoms = np.stack([
+                np.asarray(canvas.crop((0, bottom_start, width, bottom_start + blend_height)))
+                for _, bottom_start in group
+            ])
+            blended = self._blend_arrays(tops, bottoms)
+            for (_, bottom_start), strip in zip(group, blended):
+                canvas.paste(Image.fromarray(strip), (0, bottom_start))
+    
+    def _read_heights(self, image_paths: List[str]) -> List[int]:
+        """只读文件头，计算每张图片缩放后的高度"""
+        heights = []
+        for p in image_paths:
+            with Image.open(p) as img:
+                heights.append(self._scaled_height(img.size))
+        return heights
     
     def merge(
         self,
@@ -66,7 +212,8 @@ class LongImageMerger:
         output_path: str,
         gap: int = 0,
         background_color: str = "white",
-        blend: int = 0
+        blend: int = 0,
+        stream: bool = False
     ) -> Dict[str, Any]:
         """
         拼接多张图片为长图
@@ -77,6 +224,7 @@ class LongImageMerger:
             gap: 图片之间的间隔像素，默认0
             background_color: 背景颜色，默认白色
             blend: 接缝融合过渡区域高度（像素），默认0不融合，推荐30-50
+            stream: 流式拼接（仅 PNG 输出），逐张解码并增量写出，内存占用与图片数量无关
             
         Returns:
             包含拼接结果的字典
@@ -94,45 +242,104 @@ class LongImageMerger:
         if not valid_paths:
             return {"success": False, "error": "没有有效的图片文件"}
         
+        if stream:
+            if Path(output_path).suffix.lower() == '.png':
+                return self._merge_streaming(valid_paths, output_path, gap, background_color, blend)
+            print("警告: 流式拼接仅支持 PNG 输出，改用普通模式")
+        
         try:
-            imgs = [Image.open(p) for p in valid_paths]
-            
-            resized_imgs = []
-            for img in imgs:
-                if img.mode in ('RGBA', 'P'):
-                    img = img.convert('RGB')
-                ratio = self.target_width / img.width
-                new_height = int(img.height * ratio)
-                resized = img.resize((self.target_width, new_height), Image.Resampling.LANCZOS)
-                resized_imgs.append(resized)
-            
-            if blend > 0 and len(resized_imgs) > 1:
-                for i in range(1, len(resized_imgs)):
-                    resized_imgs[i] = self._blend_images(resized_imgs[i-1], resized_imgs[i], blend)
-            
-            total_height = sum(img.height for img in resized_imgs) + gap * (len(resized_imgs) - 1)
+            heights = self._read_heights(valid_paths)
+            total_height = sum(heights) + gap * (len(heights) - 1)
             
             long_image = Image.new('RGB', (self.target_width, total_height), background_color)
             
+            # 缩放结果边产出边贴到画布上，随即释放
             y_offset = 0
-            for img in resized_imgs:
+            seams = []
+            for i, img in enumerate(self._iter_resized(valid_paths)):
+                if i > 0:
+                    blend_height = min(blend, heights[i - 1] // 4, img.height // 4)
+                    seams.append((y_offset - gap, y_offset, blend_height))
                 long_image.paste(img, (0, y_offset))
                 y_offset += img.height + gap
+                img.close()
+            
+            if blend > 0:
+                self._blend_seams(long_image, seams)
             
             Path(output_path).parent.mkdir(parents=True, exist_ok=True)
             long_image.save(output_path, quality=95)
+            long_image.close()
             
-            for img in imgs:
-                img.close()
-            for img in resized_imgs:
-                img.close()
+            return {
+                "success": True,
+                "saved_path": output_path,
+                "width": self.target_width,
+                "height": total_height,
+                "image_count": len(heights)
+            }
+            
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def _merge_streaming(
+        self,
+        image_paths: List[str],
+        output_path: str,
+        gap: int,
+        background_color: str,
+        blend: int
+    ) -> Dict[str, Any]:
+        """
+        流式拼接：逐张解码、缩放、融合，直接写出 PNG 行
+        
+        总高度只读文件头计算；除线程池预取的 workers 张外，只持有当前图片和上一张图片底部的融合条带
+        （workers=1 时最多两张）。
+        融合结果与普通模式一致（下方图片顶部与上方图片底部渐变）。
+        """
+        try:
+            heights = self._read_heights(image_paths)
+            total_height = sum(heights) + gap * (len(heights) - 1)
+            
+            gap_rows = None
+            if gap > 0:
+                color = ImageColor.getrgb(background_color)[:3]
+                gap_rows = np.empty((gap, self.target_width, 3), dtype=np.uint8)
+                gap_rows[:] = color
+            
+            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+            writer = StreamingPNGWriter(output_path, self.target_width, total_height)
+            try:
+                # 融合只用到上一张图片底部 min(blend, 高度/4) 行，只保留这一条带
+                prev_strip = None
+                
+                for i, img in enumerate(self._iter_resized(image_paths)):
+                    rows = np.asarray(img)
+                    img.close()
+                    if i > 0 and gap_rows is not None:
+                        writer.write_rows(gap_rows)
+                    
+                    blend_height = min(blend, heights[i - 1] // 4, rows.shape[0] // 4) if i > 0 else 0
+                    if prev_strip is not None and blend_height > 0:
+                        writer.write_rows(self._blend_arrays(prev_strip[-blend_height:], rows[:blend_height]))
+                        writer.write_rows(rows[blend_height:])
+                    else:
+                        writer.write_rows(rows)
+                    
+                    keep = min(blend, rows.shape[0] // 4)
+                    prev_strip = rows[-keep:].copy() if keep > 0 else None
+                writer.close()
+            except BaseException:
+                writer.abort()
+                raise
             
             return {
                 "success": True,
                 "saved_path": output_path,
                 "width": self.target_width,
                 "height": total_height,
-                "image_count": len(resized_imgs)
+                "image_count": len(image_paths),
+                "stream": True
             }
             
         except Exception as e:
@@ -145,7 +352,8 @@ class LongImageMerger:
         sort_by: str = "name",
         gap: int = 0,
         background_color: str = "white",
-        blend: int = 0
+        blend: int = 0,
+        stream: bool = False
     ) -> Dict[str, Any]:
         """
         通过 glob 模式匹配图片并拼接
@@ -157,6 +365,7 @@ class LongImageMerger:
             gap: 图片间隔
             background_color: 背景颜色
             blend: 接缝融合过渡高度
+            stream: 流式拼接（仅 PNG 输出）
             
         Returns:
             包含拼接结果的字典
@@ -175,7 +384,7 @@ class LongImageMerger:
         for i, p in enumerate(image_paths, 1):
             print(f"  {i}. {os.path.basename(p)}")
         
-        return self.merge(image_paths, output_path, gap, background_color, blend)
+        return self.merge(image_paths, output_path, gap, background_color, blend, stream)
 
 
 def main():
@@ -199,6 +408,9 @@ def main():
   
   # 启用接缝融合过渡（推荐40px）
   python merge_long_image.py img1.png img2.png -o out.png --blend 40
+  
+  # 几十张图的长图用流式拼接，内存占用不随图片数量增长（仅PNG）
+  python merge_long_image.py -p "*.png" -o long.png --stream
         """
     )
     
@@ -212,13 +424,17 @@ def main():
     parser.add_argument('--bg', default='white', help='背景颜色，默认 white')
     parser.add_argument('--blend', type=int, default=0, 
                         help='接缝融合过渡高度（像素），推荐30-50，默认0不融合')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='并行解码/缩放线程数，默认CPU核数')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式拼接，逐张解码增量写出，内存占用与图片数量无关（仅PNG输出）')
     
     args = parser.parse_args()
     
     if not args.images and not args.pattern:
         parser.error("请提供图片路径列表或使用 -p 指定匹配模式")
     
-    merger = LongImageMerger(target_width=args.width)
+    merger = LongImageMerger(target_width=args.width, workers=args.workers)
     
     if args.pattern:
         result = merger.merge_from_pattern(
@@ -227,7 +443,8 @@ def main():
             sort_by=args.sort,
             gap=args.gap,
             background_color=args.bg,
-            blend=args.blend
+            blend=args.blend,
+            stream=args.stream
         )
     else:
         result = merger.merge(
@@ -235,7 +452,8 @@ def main():
             output_path=args.output,
             gap=args.gap,
             background_color=args.bg,
-            blend=args.blend
+            blend=args.blend,
+            stream=args.stream
         )
     
     if result["success"]:
@@ -3,13 +3,18 @@
 调研报告专用信息图生成脚本
 预设手绘风格可视化模板，保持系列配图风格统一
 
+进程内调用 TextToImageGenerator；批量模式读取 YAML/JSON 任务列表，共用一个生成器并发生成。
+
 Author: 翟星人
 """
 
 import argparse
-import subprocess
+import json
 import sys
-import os
+import time
+from typing import Dict, Any, List, Optional
+
+from text_to_image import SeriesSession, TextToImageGenerator
 
 # 预设风格模板 - 手绘体可视化风格
 STYLE_TEMPLATES = {
@@ -39,12 +44,24 @@ STYLE_TEMPLATES = {
     }
 }
 
-# 基础路径
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-TEXT_TO_IMAGE_SCRIPT = os.path.join(BASE_DIR, "scripts", "text_to_image.py")
+
+def build_prompt(style: str, title: str, content: str) -> str:
+    """按风格模板组装完整提示词"""
+    if style not in STYLE_TEMPLATES:
+        raise ValueError(f"未知风格 '{style}'，可用风格: {', '.join(STYLE_TEMPLATES.keys())}")
+    template = STYLE_TEMPLATES[style]
+    return f"{template['prefix']}标题：{title}，{content}，{template['suffix']}"
 
 
-def generate_image(style: str, title: str, content: str, output: str):
+def generate_image(
+    style: str,
+    title: str,
+    content: str,
+    output: str,
+    generator: Optional[TextToImageGenerator] = None,
+    aspect_ratio: Optional[str] = None,
+    ref_image: Optional[str] = None
+) -> Dict[str, Any]:
     """
     使用预设风格生成信息图
     
@@ -53,34 +70,116 @@ def generate_image(style: str, title: str, content: str, output: str):
         title: 图表标题
         content: 图表内容描述
         output: 输出路径
+        generator: 复用的生成器，不传则新建
+        aspect_ratio: 宽高比，默认沿用 text_to_image 的默认尺寸
+        ref_image: 风格参考图
+        
+    Returns:
+        text_to_image 的结果字典
     """
-    if style not in STYLE_TEMPLATES:
-        print(f"错误: 未知风格 '{style}'")
-        print(f"可用风格: {', '.join(STYLE_TEMPLATES.keys())}")
-        sys.exit(1)
+    prompt = build_prompt(style, title, content)
     
-    template = STYLE_TEMPLATES[style]
-    
-    # 组装完整提示词
-    prompt = f"{template['prefix']}标题：{title}，{content}，{template['suffix']}"
-    
-    print(f"生成 {template['name']}: {title}")
+    print(f"生成 {STYLE_TEMPLATES[style]['name']}: {title}")
     print(f"风格: 手绘体可视化")
+    if ref_image:
+        print(f"参考图: {ref_image}")
     print(f"输出: {output}")
     
-    # 调用 text_to_image.py
-    cmd = [
-        sys.executable,
-        TEXT_TO_IMAGE_SCRIPT,
-        prompt,
-        "--output", output
+    generator = generator or TextToImageGenerator()
+    return generator.generate(prompt, aspect_ratio=aspect_ratio, output_path=output, ref_image=ref_image)
+
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """
+    读取批量任务文件（.yaml/.yml 或 .json）
+    
+    每项: {style, title, content, output, ratio?}，style/title 也可写作 type/name
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            jobs = yaml.safe_load(f)
+        else:
+            jobs = json.load(f)
+    if isinstance(jobs, dict):
+        jobs = jobs.get("jobs", [])
+    
+    normalized = []
+    for i, job in enumerate(jobs):
+        style = job.get("style") or job.get("type")
+        title = job.get("title") or job.get("name")
+        if not all([style, title, job.get("content"), job.get("output")]):
+            raise ValueError(f"第 {i + 1} 个任务缺少 style/title/content/output")
+        normalized.append({
+            "style": style,
+            "title": title,
+            "content": job["content"],
+            "output": job["output"],
+            "ratio": job.get("ratio") or job.get("aspect_ratio")
+        })
+    return normalized
+
+
+def generate_batch(
+    jobs: List[Dict[str, Any]],
+    concurrency: int = 4,
+    generator: Optional[TextToImageGenerator] = None,
+    ref_image: Optional[str] = None,
+    on_result=None
+) -> List[Dict[str, Any]]:
+    """
+    并发批量生成信息图，共用一个生成器（连接池、配置、缓存只初始化一次）
+    
+    Args:
+        jobs: load_jobs 格式的任务列表
+        concurrency: 最大并发请求数
+        generator: 复用的生成器，不传则新建
+        ref_image: 风格参考图，给出时整批按系列配图生成
+        on_result: 单张完成时的回调，结果含 index 和 elapsed（秒）
+        
+    Returns:
+        与 jobs 顺序一致的结果列表
+    """
+    generator = generator or TextToImageGenerator()
+    image_jobs = [
+        {
+            "prompt": build_prompt(job["style"], job["title"], job["content"]),
+            "output": job["output"],
+            "ratio": job.get("ratio")
+        }
+        for job in jobs
     ]
+    if ref_image:
+        return SeriesSession(generator, ref_image).generate(image_jobs, concurrency, on_result)
+    return generator.generate_batch(image_jobs, concurrency, on_result)
+
+
+def run_batch(path: str, concurrency: int, ref_image: Optional[str] = None) -> bool:
+    """执行批量任务文件，打印每张耗时和总耗时，全部成功返回 True"""
+    jobs = load_jobs(path)
     
-    result = subprocess.run(cmd, capture_output=False)
+    def report(result: Dict[str, Any]) -> None:
+        job = jobs[result["index"]]
+        name = STYLE_TEMPLATES[job["style"]]["name"]
+        if result["success"]:
+            print(f"  ✓ [{result['index'] + 1}/{len(jobs)}] {name} {job['title']} -> {job['output']} ({result['elapsed']}s)")
+        else:
+            print(f"  ✗ [{result['index'] + 1}/{len(jobs)}] {name} {job['title']}: {result['error']} {result.get('detail', '')}")
     
-    if result.returncode != 0:
-        print(f"生成失败")
-        sys.exit(1)
+    print(f"批量生成 {len(jobs)} 张调研配图 (并发 {concurrency})...")
+    start = time.perf_counter()
+    results = generate_batch(jobs, concurrency, ref_image=ref_image, on_result=report)
+    total = time.perf_counter() - start
+    
+    ok = sum(1 for r in results if r["success"])
+    latencies = sorted(r["elapsed"] for r in results if r["success"])
+    print(f"完成: 成功 {ok}/{len(jobs)}，总耗时 {total:.1f}s")
+    if latencies:
+        waits = [r.get("wait", 0.0) for r in results if r["success"]]
+        print(f"单张耗时（不含排队）: 平均 {sum(latencies) / len(latencies):.2f}s，"
+              f"中位 {latencies[len(latencies) // 2]:.2f}s，最长 {latencies[-1]:.2f}s；"
+              f"排队最长 {max(waits):.2f}s")
+    return ok == len(jobs)
 
 
 def list_styles():
@@ -110,6 +209,9 @@ def main():
   # 生成概念图
   python research_image.py -t concept -n "状态持久化" -c "中心是Agent，周围是progress.txt、prd.json、Git历史、代码文件四个要素" -o images/concept.png
 
+  # 批量生成（YAML/JSON 任务列表，每项 style/title/content/output，可选 ratio）
+  python research_image.py --batch images.yaml -j 4
+
   # 查看所有风格
   python research_image.py --list
         """
@@ -120,6 +222,10 @@ def main():
     parser.add_argument("-n", "--name", help="图表标题")
     parser.add_argument("-c", "--content", help="图表内容描述")
     parser.add_argument("-o", "--output", help="输出文件路径")
+    parser.add_argument("-r", "--ratio", help="宽高比，如 16:9")
+    parser.add_argument("--batch", help="批量任务文件（YAML 或 JSON 列表）")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="批量生成的并发数，默认4")
+    parser.add_argument("--ref", help="风格参考图，批量时整批共用")
     parser.add_argument("--list", action="store_true", help="列出所有可用风格")
     
     args = parser.parse_args()
@@ -128,12 +234,26 @@ def main():
         list_styles()
         return
     
+    if args.batch:
+        try:
+            ok = run_batch(args.batch, args.concurrency, args.ref)
+        except (OSError, ValueError) as e:
+            print(f"错误: {e}")
+            sys.exit(1)
+        sys.exit(0 if ok else 1)
+    
     if not all([args.type, args.name, args.content, args.output]):
         parser.print_help()
         print("\n错误: 必须提供 -t, -n, -c, -o 参数")
         sys.exit(1)
     
-    generate_image(args.type, args.name, args.content, args.output)
+    result = generate_image(args.type, args.name, args.content, args.output,
+                            aspect_ratio=args.ratio, ref_image=args.ref)
+    if not result["success"]:
+        print(f"生成失败: {result['error']}")
+        print(f"详情: {result.get('detail', 'N/A')}")
+        sys.exit(1)
+    print(f"图片已保存到: {result['saved_path']}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+接口结果缓存 (Result Cache)
+文生图、图生图、图生文共用的磁盘缓存：相同请求直接读盘，不再调用远程 API
+
+缓存键 = sha256(接口 + 请求体)，请求体里已包含 model、prompt、size、参考图 base64、mode 等全部参数。
+按总大小做 LRU 淘汰（命中时刷新 mtime，超限时删最久未用的）。
+流式落盘的图片不进 JSON，而是作为 {key}.{i}.bin 与响应一起存放，命中时返回这些文件路径。
+
+配置（settings.json）:
+    "cache": {"enabled": true, "dir": "~/.cache/image-service", "max_size_mb": 500}
+关闭缓存：环境变量 IMAGE_SERVICE_NO_CACHE=1，或各脚本的 --no-cache
+
+Author: 翟星人
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from api_retry import load_settings_section
+
+DEFAULT_CACHE_DIR = "~/.cache/image-service"
+DEFAULT_MAX_SIZE_MB = 500
+
+
+class ResultCache:
+    """按请求内容寻址的磁盘 LRU 缓存"""
+
+    _default: Optional["ResultCache"] = None
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_size_mb: 缓存总大小上限（MB），超出按最久未使用淘汰
+        """
+        self.cache_dir = Path(os.path.expanduser(cache_dir or DEFAULT_CACHE_DIR))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._total_bytes = sum(p.stat().st_size for p in self._entries())
+
+    @classmethod
+    def default(cls) -> Optional["ResultCache"]:
+        """
+        进程内共享的默认缓存，按 settings.json 的 cache 配置创建
+
+        Returns:
+            缓存实例；配置关闭或设置了 IMAGE_SERVICE_NO_CACHE 时返回 None
+        """
+        if os.getenv('IMAGE_SERVICE_NO_CACHE'):
+            return None
+        settings = load_settings_section('cache')
+        if not settings.get('enabled', True):
+            return None
+        if cls._default is None:
+            cls._default = cls(settings.get('dir'), settings.get('max_size_mb', DEFAULT_MAX_SIZE_MB))
+        return cls._default
+
+    @staticmethod
+    def make_key(endpoint: str, payload: Dict[str, Any], mode: Optional[str] = None) -> str:
+        """由接口、请求体（含模型、提示词、尺寸、参考图数据）和模式计算缓存键"""
+        h = hashlib.sha256()
+        h.update(endpoint.encode('utf-8'))
+        h.update(b'\0')
+        h.update((mode or '').encode('utf-8'))
+        h.update(b'\0')
+        h.update(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+    
+    def _blob_path(self, key: str, index: int) -> Path:
+        return self.cache_dir / f"{key}.{index}.bin"
+    
+    def _entries(self) -> List[Path]:
+        return [p for p in self.cache_dir.iterdir() if p.suffix in ('.json', '.bin')]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的响应，命中时刷新访问时间
+        
+        带图片文件的条目返回时 _cached_files 为这些文件的路径列表
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            blobs = [self._blob_path(key, i) for i in range(result.get("_cached_files", 0))]
+            for blob in blobs:
+                os.utime(blob)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        if blobs:
+            result["_cached_files"] = [str(b) for b in blobs]
+        os.utime(path)
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result: Dict[str, Any], files: Optional[List[str]] = None) -> None:
+        """
+        写入响应（原子替换），超出上限时淘汰最久未使用的条目
+        
+        Args:
+            key: 缓存键
+            result: 响应 JSON
+            files: 已落盘的图片文件，复制进缓存与响应一起保存
+        """
+        delta = 0
+        for i, src in enumerate(files or []):
+            delta += self._replace(self._blob_path(key, i), lambda tmp: shutil.copyfile(src, tmp))
+        if files:
+            result = dict(result, _cached_files=len(files))
+        
+        def dump(tmp: Path) -> None:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+        
+        delta += self._replace(self._path(key), dump)
+        with self._lock:
+            self._total_bytes += delta
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+    
+    @staticmethod
+    def _replace(path: Path, write) -> int:
+        """先写临时文件再原子替换，返回占用变化的字节数"""
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+        write(tmp_path)
+        size = tmp_path.stat().st_size
+        old_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+        return size - old_size
+
+    def _evict(self) -> None:
+        """按 mtime 从旧到新删除，直到总大小回到上限的 90%"""
+        entries = sorted(self._entries(), key=lambda p: p.stat().st_mtime)
+        target = int(self.max_bytes * 0.9)
+        for path in entries:
+            if self._total_bytes <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中/淘汰次数和当前占用"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "size_mb": round(self._total_bytes / 1024 / 1024, 2),
+            "max_size_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "dir": str(self.cache_dir)
+        }
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+图片响应流式落盘测试 - 任意切块方式喂入响应，结果都与整体 json() 解析一致
+
+覆盖 b64_json 为字符串（含 \\/ 转义、冒号两侧空白、多张图）和为 null（响应以 null 结尾、
+null 后还有其他字段）的情况，以及响应被截断时报错并删除半成品。
+
+用法:
+    python test_b64_stream.py
+    python -m pytest test_b64_stream.py
+
+Author: 翟星人
+"""
+
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from b64_stream import B64JsonWriter, indexed_output_path
+
+ROUNDS = 50
+
+
+def random_chunks(data: bytes, rng: random.Random):
+    """把 data 切成随机长度（含 1 字节）的块"""
+    i = 0
+    while i < len(data):
+        n = rng.choice([1, 2, 3, rng.randint(1, 64)])
+        yield data[i:i + n]
+        i += n
+
+
+def stream(body: bytes, output: str, rng: random.Random):
+    writer = B64JsonWriter(output)
+    for chunk in random_chunks(body, rng):
+        writer.feed(chunk)
+    return writer.close()
+
+
+def image_bytes(rng: random.Random, size: int) -> bytes:
+    # 含 0xff/0xfe 等字节，base64 中会出现 / 和 +
+    return bytes(rng.choice([0xff, 0xfe, 0xfb, rng.randrange(256)]) for _ in range(size))
+
+
+def test_string_values():
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "out.png")
+        for _ in range(ROUNDS):
+            images = [image_bytes(rng, rng.randint(0, 300)) for _ in range(rng.randint(1, 3))]
+            items = []
+            for data in images:
+                # JSON 允许把 / 转义为 \/，冒号两侧可有空白
+                b64 = base64.b64encode(data).decode().replace('/', '\\/')
+                colon = rng.choice([':', ' : ', ':\n  '])
+                items.append(f'{{"revised_prompt": "p", "b64_json"{colon}"{b64}"}}')
+            body = f'{{"created": 1, "data": [{", ".join(items)}]}}'.encode()
+
+            skeleton, saved = stream(body, output, rng)
+            assert saved == [indexed_output_path(output, i) for i in range(len(images))]
+            for path, data in zip(saved, images):
+                with open(path, 'rb') as f:
+                    assert f.read() == data
+            expected = json.loads(body)
+            for item in expected["data"]:
+                item["b64_json"] = None
+            assert skeleton == expected
+            assert not [p for p in os.listdir(tmp) if p.endswith('.part')]
+
+
+def test_null_values():
+    rng = random.Random(1)
+    bodies = [
+        b'{"data":[{"url":"u","b64_json":null}]}',
+        b'{"data":[{"url":"u","b64_json": null}]}',
+        b'{"data":[{"url":"u","b64_json" :\n null}]}',
+        b'{"data":[{"b64_json":null,"url":"https://x/y.png"}],"created":1}',
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "out.png")
+        for body in bodies:
+            for _ in range(ROUNDS):
+                skeleton, saved = stream(body, output, rng)
+                assert skeleton == json.loads(body), body
+                assert saved == []
+        assert os.listdir(tmp) == []
+
+
+def test_truncated_value():
+    rng = random.Random(2)
+    b64 = base64.b64encode(image_bytes(rng, 200)).decode()
+    body = f'{{"data":[{{"b64_json":"{b64}'.encode()
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            stream(body, os.path.join(tmp, "out.png"), rng)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("截断的响应应当报错")
+        assert os.listdir(tmp) == []
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            try:
+                func()
+                print(f"  ✅ {name}")
+            except Exception as e:
+                failed += 1
+                print(f"  ❌ {name}: {type(e).__name__}: {e}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+长图拼接测试 - 文件头计算的高度必须与实际缩放结果一致
+
+JPEG 解码时 draft() 会降采样，若按降采样后的尺寸计算目标高度，可能与 _read_heights 差 1 像素，
+流式拼接因此报行数不一致，普通模式则丢掉最后一行或多出一行背景色。
+
+用法:
+    python test_merge_long_image.py
+    python -m pytest test_merge_long_image.py
+
+Author: 翟星人
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from merge_long_image import LongImageMerger
+
+# 奇数尺寸的 JPEG，其中 3300x1533 缩放到 1080 宽时曾差 1 像素
+ODD_SIZES = [(3300, 1533), (2000, 1000), (2999, 1777), (4321, 2345), (2161, 1081), (5003, 3001)]
+
+
+def make_jpegs(directory: Path, sizes):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i, (w, h) in enumerate(sizes):
+        path = directory / f"panel_{i:02d}.jpg"
+        Image.fromarray(rng.integers(0, 255, (h, w, 3), dtype=np.uint8)).save(path, quality=85)
+        paths.append(str(path))
+    return paths
+
+
+def test_read_heights_match_resized():
+    merger = LongImageMerger(target_width=1080, workers=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_jpegs(Path(tmp), ODD_SIZES)
+        heights = merger._read_heights(paths)
+        for path, expected in zip(paths, heights):
+            img = merger._load_resized(path)
+            assert img.size == (1080, expected), f"{Path(path).name}: {img.size} != (1080, {expected})"
+            img.close()
+
+
+def test_stream_merge_odd_jpegs():
+    merger = LongImageMerger(target_width=1080, workers=2)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_jpegs(Path(tmp), ODD_SIZES[:2])
+        output = str(Path(tmp) / "long.png")
+        result = merger.merge(paths, output, blend=40, stream=True)
+        assert result["success"], result.get("error")
+        with Image.open(output) as img:
+            assert img.size == (1080, sum(merger._read_heights(paths)))
+
+
+if __name__ == "__main__":
+    failed = 0
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            try:
+                func()
+                print(f"  ✅ {name}")
+            except AssertionError as e:
+                failed += 1
+                print(f"  ❌ {name}: {e}")
+    sys.exit(1 if failed else 0)
@@ -8,12 +8,21 @@ Author: 翟星人
 """
 
 import httpx
+import asyncio
 import base64
+import hashlib
 import json
 import os
-from typing import Dict, Any, Optional, Union
+import threading
+import time
+from typing import Dict, Any, Optional, Union, List, Callable, Tuple
 from pathlib import Path
 
+from api_retry import apost_json, load_retry_settings, load_timeout
+from b64_stream import apost_image_stream, copy_cached_files, post_image_stream, restore_b64, strip_b64
+from image_preprocess import prepare_image
+from result_cache import ResultCache
+
 VALID_ASPECT_RATIOS = [
     "1:1", "2:3", "3:2", "3:4", "4:3", "4:5", "5:4", "9:16", "16:9", "21:9"
 ]
@@ -41,13 +50,20 @@ RATIO_TO_SIZE = {
 class TextToImageGenerator:
     """文生图生成器"""
     
-    def __init__(self, config: Optional[Dict[str, str]] = None):
+    def __init__(
+        self,
+        config: Optional[Dict[str, str]] = None,
+        use_cache: bool = True,
+        stream: bool = True
+    ):
         """
         初始化生成器
         
         Args:
             config: 配置字典，包含 api_key, base_url, model
                    如果不传则从环境变量或配置文件读取
+            use_cache: 是否使用结果缓存（相同请求直接读盘）
+            stream: 指定输出路径时流式接收响应，图片边解码边写盘，返回结果不含 base64 数据
         """
         if config is None:
             config = self._load_config()
@@ -58,6 +74,19 @@ class TextToImageGenerator:
         
         if not self.api_key or not self.base_url:
             raise ValueError("缺少必要的 API 配置：api_key 和 base_url")
+        
+        self.cache = ResultCache.default() if use_cache else None
+        self.stream = stream
+        
+        # 参考图上传接口（如 /files），不配置则参考图内联 base64
+        self.reference_upload = config.get('reference_upload')
+        # (路径, 大小, 修改时间) -> 请求体里的参考图取值
+        self._references: Dict[Tuple[str, int, int], str] = {}
+        # 参考图取值 -> 内容哈希，算缓存键时代替几 MB 的 base64
+        self._reference_tokens: Dict[str, str] = {}
+        self._reference_lock = threading.Lock()
+        # 每张参考图一把锁：同一张只准备一次，不同参考图可以同时预处理、上传
+        self._reference_key_locks: Dict[Tuple[str, int, int], threading.Lock] = {}
     
     def _load_config(self) -> Dict[str, str]:
         """从配置文件或环境变量加载配置"""
@@ -71,36 +100,79 @@ class TextToImageGenerator:
                 config['api_key'] = api_config.get('key')
                 config['base_url'] = api_config.get('base_url')
                 config['model'] = api_config.get('model')
+                config['reference_upload'] = api_config.get('reference_upload')
         
         config['api_key'] = os.getenv('IMAGE_API_KEY', config.get('api_key'))
         config['base_url'] = os.getenv('IMAGE_API_BASE_URL', config.get('base_url'))
         config['model'] = os.getenv('IMAGE_MODEL', config.get('model'))
+        config['reference_upload'] = os.getenv('IMAGE_REFERENCE_UPLOAD', config.get('reference_upload'))
         
         return config
     
     @staticmethod
-    def image_to_base64(image_path: str, with_prefix: bool = True) -> str:
-        """将图片文件转换为 base64 编码"""
+    def image_to_base64(image_path: str, with_prefix: bool = True, mode: str = "reference") -> str:
+        """将图片文件预处理（识别格式、限制尺寸、重编码）后转换为 base64 编码"""
         path = Path(image_path)
         if not path.exists():
             raise FileNotFoundError(f"图片文件不存在: {image_path}")
         
-        suffix = path.suffix.lower()
-        mime_types = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.webp': 'image/webp'
-        }
-        mime_type = mime_types.get(suffix, 'image/png')
+        data_url = prepare_image(image_path, mode)
+        if with_prefix:
+            return data_url
+        return data_url.split(',', 1)[1]
+    
+    def reference(self, ref_image: str) -> str:
+        """
+        参考图在请求体里的取值
         
-        with open(image_path, 'rb') as f:
-            b64_str = base64.b64encode(f.read()).decode('utf-8')
+        同一文件（路径、大小、修改时间不变）只预处理编码一次；配置了 reference_upload 时
+        只上传一次，之后各帧传接口返回的 url/id。
         
-        if with_prefix:
-            return f"data:{mime_type};base64,{b64_str}"
-        return b64_str
+        Args:
+            ref_image: 参考图片路径
+            
+        Returns:
+            data URL，或上传后的 url/id
+        """
+        path = Path(ref_image)
+        if not path.exists():
+            raise FileNotFoundError(f"图片文件不存在: {ref_image}")
+        stat = path.stat()
+        key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+        
+        with self._reference_lock:
+            value = self._references.get(key)
+            if value is not None:
+                return value
+            key_lock = self._reference_key_locks.setdefault(key, threading.Lock())
+        
+        with key_lock:
+            value = self._references.get(key)
+            if value is None:
+                data_url = self.image_to_base64(ref_image)
+                value = (self._upload_reference(data_url, path.name) if self.reference_upload else None) or data_url
+                with self._reference_lock:
+                    self._reference_tokens[value] = "sha256:" + hashlib.sha256(data_url.encode('utf-8')).hexdigest()
+                    self._references[key] = value
+        return value
+    
+    def _upload_reference(self, data_url: str, name: str) -> Optional[str]:
+        """上传参考图，返回接口给出的 url 或文件 id；失败返回 None（回退到内联 base64）"""
+        mime, b64_str = data_url[len("data:"):].split(';base64,', 1)
+        try:
+            with httpx.Client(timeout=load_timeout("upload", 60.0)) as client:
+                response = client.post(
+                    f"{self.base_url}{self.reference_upload}",
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    files={"file": (name, base64.b64decode(b64_str), mime)},
+                    data={"purpose": "vision"}
+                )
+                response.raise_for_status()
+                data = response.json()
+        except Exception as e:
+            print(f"警告: 参考图上传失败，改为内联 base64: {e}")
+            return None
+        return data.get("url") or data.get("id")
     
     def generate(
         self,
@@ -137,6 +209,46 @@ class TextToImageGenerator:
                 response_format=response_format
             )
         
+        return self._post(
+            "/images/generations",
+            self._build_payload(prompt, size, aspect_ratio, response_format),
+            output_path
+        )
+    
+    def _generate_with_reference(
+        self,
+        prompt: str,
+        ref_image: str,
+        aspect_ratio: Optional[str] = None,
+        size: Optional[str] = None,
+        output_path: Optional[str] = None,
+        response_format: str = "b64_json"
+    ) -> Dict[str, Any]:
+        """
+        参考图片风格生成新图
+        
+        Args:
+            prompt: 新图内容描述
+            ref_image: 参考图片路径
+            aspect_ratio: 宽高比
+            size: 尺寸
+            output_path: 输出路径
+            response_format: 响应格式
+        """
+        return self._post(
+            "/images/edits",
+            self._build_reference_payload(prompt, ref_image, aspect_ratio, size, response_format),
+            output_path
+        )
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        size: Optional[str] = None,
+        aspect_ratio: Optional[str] = None,
+        response_format: str = "b64_json"
+    ) -> Dict[str, Any]:
+        """构建文生图请求体"""
         payload: Dict[str, Any] = {
             "model": self.model,
             "prompt": prompt,
@@ -151,67 +263,18 @@ class TextToImageGenerator:
         else:
             payload["size"] = "1792x1024"  # 默认 16:9
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        try:
-            with httpx.Client(timeout=180.0) as client:
-                response = client.post(
-                    f"{self.base_url}/images/generations",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                if output_path and result.get("data"):
-                    b64_data = result["data"][0].get("b64_json")
-                    if b64_data:
-                        self._save_image(b64_data, output_path)
-                        result["saved_path"] = output_path
-                
-                return {
-                    "success": True,
-                    "data": result,
-                    "saved_path": output_path if output_path else None
-                }
-                
-        except httpx.HTTPStatusError as e:
-            return {
-                "success": False,
-                "error": f"HTTP 错误: {e.response.status_code}",
-                "detail": str(e)
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "error": "生成失败",
-                "detail": str(e)
-            }
+        return payload
     
-    def _generate_with_reference(
+    def _build_reference_payload(
         self,
         prompt: str,
         ref_image: str,
         aspect_ratio: Optional[str] = None,
         size: Optional[str] = None,
-        output_path: Optional[str] = None,
         response_format: str = "b64_json"
     ) -> Dict[str, Any]:
-        """
-        参考图片风格生成新图
-        
-        Args:
-            prompt: 新图内容描述
-            ref_image: 参考图片路径
-            aspect_ratio: 宽高比
-            size: 尺寸
-            output_path: 输出路径
-            response_format: 响应格式
-        """
-        image_b64 = self.image_to_base64(ref_image)
+        """构建参考图风格生成的请求体"""
+        image_b64 = self.reference(ref_image)
         
         enhanced_prompt = f"参考这张图片的背景风格、配色方案和视觉设计，保持完全一致的风格，生成新内容：{prompt}"
         
@@ -219,53 +282,200 @@ class TextToImageGenerator:
         if size is None:
             size = RATIO_TO_SIZE.get(aspect_ratio, "1024x1792") if aspect_ratio else "1024x1792"
         
-        payload = {
+        return {
             "model": self.model,
             "prompt": enhanced_prompt,
             "image": image_b64,
             "size": size,
             "response_format": response_format
         }
-        
-        headers = {
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
+    
+    def _finish(
+        self,
+        result: Dict[str, Any],
+        output_path: Optional[str],
+        saved_paths: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """保存图片（如需）并组装成功结果；流式模式下返回结果不含 base64 数据"""
+        cached_files = result.pop("_cached_files", None)
+        if cached_files:
+            if output_path:
+                copy_cached_files(cached_files, output_path)
+                result["saved_path"] = output_path
+            else:
+                restore_b64(result, cached_files)
+        elif saved_paths:
+            result["saved_path"] = output_path
+        elif output_path and result.get("data"):
+            b64_data = result["data"][0].get("b64_json")
+            if b64_data:
+                self._save_image(b64_data, output_path)
+                result["saved_path"] = output_path
+                if self.stream:
+                    strip_b64(result)
         
-        try:
-            with httpx.Client(timeout=180.0) as client:
-                response = client.post(
-                    f"{self.base_url}/images/edits",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                if output_path and result.get("data"):
-                    b64_data = result["data"][0].get("b64_json")
-                    if b64_data:
-                        self._save_image(b64_data, output_path)
-                        result["saved_path"] = output_path
-                
-                return {
-                    "success": True,
-                    "data": result,
-                    "saved_path": output_path if output_path else None
-                }
-                
-        except httpx.HTTPStatusError as e:
+        return {
+            "success": True,
+            "data": result,
+            "saved_path": output_path if output_path else None
+        }
+    
+    @staticmethod
+    def _error(e: Exception) -> Dict[str, Any]:
+        if isinstance(e, httpx.HTTPStatusError):
             return {
                 "success": False,
                 "error": f"HTTP 错误: {e.response.status_code}",
                 "detail": str(e)
             }
+        return {
+            "success": False,
+            "error": "生成失败",
+            "detail": str(e)
+        }
+    
+    def _cache_lookup(self, endpoint: str, payload: Dict[str, Any]):
+        """查缓存，返回 (缓存键, 命中的响应)；未启用缓存时返回 (None, None)"""
+        if self.cache is None:
+            return None, None
+        image = payload.get("image")
+        token = self._reference_tokens.get(image) if isinstance(image, str) else None
+        key = self.cache.make_key(endpoint, dict(payload, image=token) if token else payload)
+        return key, self.cache.get(key)
+    
+    def _finish_cached(self, cached: Dict[str, Any], output_path: Optional[str]) -> Dict[str, Any]:
+        result = self._finish(cached, output_path)
+        result["cached"] = True
+        return result
+    
+    def _streams(self, payload: Dict[str, Any], output_path: Optional[str]) -> bool:
+        """是否流式接收：需要落盘且响应是 b64_json"""
+        return bool(self.stream and output_path and payload.get("response_format") == "b64_json")
+    
+    def _post(self, endpoint: str, payload: Dict[str, Any], output_path: Optional[str]) -> Dict[str, Any]:
+        """同步请求一次接口，命中缓存时不调用 API"""
+        try:
+            key, cached = self._cache_lookup(endpoint, payload)
+            if cached is not None:
+                return self._finish_cached(cached, output_path)
+            
+            saved = None
+            with httpx.Client(timeout=180.0) as client:
+                if self._streams(payload, output_path):
+                    data, saved = post_image_stream(
+                        client, f"{self.base_url}{endpoint}", self._headers(), payload, output_path
+                    )
+                else:
+                    response = client.post(
+                        f"{self.base_url}{endpoint}",
+                        headers=self._headers(),
+                        json=payload
+                    )
+                    response.raise_for_status()
+                    data = response.json()
+            if key:
+                self.cache.put(key, data, saved)
+            return self._finish(data, output_path, saved)
         except Exception as e:
-            return {
-                "success": False,
-                "error": "生成失败",
-                "detail": str(e)
-            }
+            return self._error(e)
+    
+    def _job_request(self, job: Dict[str, Any]):
+        """把批量任务转成 (endpoint, payload)"""
+        ratio = job.get("ratio") or job.get("aspect_ratio")
+        response_format = job.get("response_format", "b64_json")
+        ref_image = job.get("ref") or job.get("ref_image")
+        if ref_image:
+            return "/images/edits", self._build_reference_payload(
+                job["prompt"], ref_image, ratio, job.get("size"), response_format
+            )
+        return "/images/generations", self._build_payload(
+            job["prompt"], job.get("size"), ratio, response_format
+        )
+    
+    async def agenerate_batch(
+        self,
+        jobs: List[Dict[str, Any]],
+        concurrency: int = 4,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        异步批量生成
+        
+        所有任务共用一个 httpx.AsyncClient 连接池，信号量限制并发；
+        限流(429)和服务端错误按 Retry-After 或指数退避重试（settings.json 的 retry 配置）。
+        每张图请求完成即写盘，不等整批结束；流式模式下响应边接收边解码写盘。
+        
+        Args:
+            jobs: 任务列表，每项含 prompt，可选 output / ratio / size / ref
+            concurrency: 最大并发请求数
+            on_result: 单个任务完成时的回调
+            
+        Returns:
+            与 jobs 顺序一致的结果列表，每项额外包含 index、prompt、
+            elapsed（单张请求耗时，不含排队）和 wait（准备参考图、等待并发名额的时间）
+        """
+        retry = load_retry_settings()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        timeout = load_timeout("text_to_image", 180.0)
+        
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            async def run(index: int, job: Dict[str, Any]) -> Dict[str, Any]:
+                queued = time.perf_counter()
+                ref_image = job.get("ref") or job.get("ref_image")
+                if ref_image:
+                    # 参考图的预处理、编码和上传都是阻塞的，在线程里准备好（同一张只准备一次），
+                    # 之后 _job_request 只查缓存，不会卡住事件循环上的其他请求；出错的在下面报告
+                    try:
+                        await asyncio.to_thread(self.reference, ref_image)
+                    except Exception:
+                        pass
+                async with semaphore:
+                    # elapsed 只算请求本身，排队等待并发名额的时间单独记为 wait
+                    start = time.perf_counter()
+                    try:
+                        endpoint, payload = self._job_request(job)
+                        key, cached = self._cache_lookup(endpoint, payload)
+                        if cached is not None:
+                            result = await asyncio.to_thread(self._finish_cached, cached, job.get("output"))
+                        else:
+                            output = job.get("output")
+                            saved = None
+                            if self._streams(payload, output):
+                                data, saved = await apost_image_stream(
+                                    client, f"{self.base_url}{endpoint}", self._headers(), payload, output, retry
+                                )
+                            else:
+                                data = await apost_json(client, f"{self.base_url}{endpoint}",
+                                                        self._headers(), payload, retry)
+                            if key:
+                                await asyncio.to_thread(self.cache.put, key, data, saved)
+                            result = await asyncio.to_thread(self._finish, data, output, saved)
+                    except Exception as e:
+                        result = self._error(e)
+                    elapsed = time.perf_counter() - start
+                result.update(index=index, prompt=job["prompt"], elapsed=round(elapsed, 2),
+                              wait=round(start - queued, 2))
+                if on_result:
+                    on_result(result)
+                return result
+            
+            return await asyncio.gather(*(run(i, job) for i, job in enumerate(jobs)))
+    
+    def generate_batch(
+        self,
+        jobs: List[Dict[str, Any]],
+        concurrency: int = 4,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """agenerate_batch 的同步入口"""
+        return asyncio.run(self.agenerate_batch(jobs, concurrency, on_result))
     
     def _save_image(self, b64_data: str, output_path: str) -> None:
         """保存 base64 图片到文件"""
@@ -275,10 +485,133 @@ class TextToImageGenerator:
             f.write(image_data)
 
 
+class SeriesSession:
+    """
+    系列配图会话
+    
+    一组图共用同一张风格参考图（长图分段、故事分镜、调研系列配图）：
+    参考图只编码（或上传）一次，各帧请求共用连接池并发发出。
+    不给参考图时，第一帧先按普通文生图生成，再作为后续各帧的参考图。
+    """
+    
+    def __init__(
+        self,
+        generator: TextToImageGenerator,
+        ref_image: Optional[str] = None,
+        aspect_ratio: Optional[str] = None,
+        size: Optional[str] = None
+    ):
+        self.generator = generator
+        self.ref_image = ref_image
+        self.aspect_ratio = aspect_ratio
+        self.size = size
+        if ref_image:
+            generator.reference(ref_image)
+    
+    def _job(self, frame: Union[str, Dict[str, Any]], with_ref: bool = True) -> Dict[str, Any]:
+        job = {"prompt": frame} if isinstance(frame, str) else dict(frame)
+        if with_ref and not (job.get("ref") or job.get("ref_image")):
+            job["ref"] = self.ref_image
+        if not (job.get("ratio") or job.get("aspect_ratio")):
+            job["ratio"] = self.aspect_ratio
+        job.setdefault("size", self.size)
+        return job
+    
+    async def agenerate(
+        self,
+        frames: List[Union[str, Dict[str, Any]]],
+        concurrency: int = 4,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        并发生成各帧
+        
+        Args:
+            frames: 提示词或任务字典（prompt / output / ratio / size）列表
+            concurrency: 最大并发请求数
+            on_result: 单帧完成时的回调
+            
+        Returns:
+            与 frames 顺序一致的结果列表
+        """
+        if not frames:
+            return []
+        
+        head: List[Dict[str, Any]] = []
+        if self.ref_image is None:
+            first = self._job(frames[0], with_ref=False)
+            if not first.get("output"):
+                raise ValueError("没有参考图时第一帧必须指定 output，作为后续各帧的参考图")
+            head = await self.generator.agenerate_batch([first], 1, on_result)
+            if not head[0]["success"]:
+                return head
+            self.ref_image = first["output"]
+            await asyncio.to_thread(self.generator.reference, self.ref_image)
+            frames = frames[1:]
+        
+        offset = len(head)
+        
+        def report(result: Dict[str, Any]) -> None:
+            result["index"] += offset
+            if on_result:
+                on_result(result)
+        
+        rest = await self.generator.agenerate_batch([self._job(f) for f in frames], concurrency, report)
+        return head + rest
+    
+    def generate(
+        self,
+        frames: List[Union[str, Dict[str, Any]]],
+        concurrency: int = 4,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """agenerate 的同步入口"""
+        return asyncio.run(self.agenerate(frames, concurrency, on_result))
+
+
+def run_batch(
+    batch_path: str,
+    concurrency: int = 4,
+    use_cache: bool = True,
+    stream: bool = True,
+    ref_image: Optional[str] = None,
+    series: bool = False
+) -> None:
+    """
+    执行批量任务文件，逐个打印完成结果
+    
+    ref_image 或 series 时按系列配图执行：所有任务共用同一张参考图
+    （series 且无 ref_image 时用第一张的结果作参考图）
+    """
+    with open(batch_path, 'r', encoding='utf-8') as f:
+        jobs = json.load(f)
+    
+    for i, job in enumerate(jobs):
+        job.setdefault("output", f"generated_{time.strftime('%Y%m%d_%H%M%S')}_{i:03d}.png")
+    
+    def report(result: Dict[str, Any]) -> None:
+        if result["success"]:
+            print(f"  ✓ [{result['index'] + 1}/{len(jobs)}] {result['saved_path']} ({result['elapsed']}s)")
+        else:
+            print(f"  ✗ [{result['index'] + 1}/{len(jobs)}] {result['error']}: {result.get('detail', 'N/A')}")
+    
+    print(f"批量生成 {len(jobs)} 张图片 (并发 {concurrency})...")
+    start = time.perf_counter()
+    generator = TextToImageGenerator(use_cache=use_cache, stream=stream)
+    if ref_image or series:
+        results = SeriesSession(generator, ref_image).generate(jobs, concurrency, on_result=report)
+    else:
+        results = generator.generate_batch(jobs, concurrency, on_result=report)
+    ok = sum(1 for r in results if r["success"])
+    print(f"完成: 成功 {ok}/{len(jobs)}，总耗时 {time.perf_counter() - start:.1f}s")
+    if generator.cache:
+        stats = generator.cache.stats()
+        print(f"缓存: 命中 {stats['hits']}，未命中 {stats['misses']}")
+
+
 def main():
     """命令行入口"""
     import argparse
-    import time
     
     parser = argparse.ArgumentParser(
         description='文生图工具',
@@ -298,17 +631,34 @@ def main():
   # 长图场景：首图定调，后续参考首图风格
   python text_to_image.py "首屏内容" -r 3:4 -o 01.png
   python text_to_image.py "第二屏内容" -r 3:4 --ref 01.png -o 02.png
+  
+  # 批量并发生成：jobs.json 为 [{{"prompt": "...", "output": "01.png", "ratio": "16:9"}}, ...]
+  python text_to_image.py --batch jobs.json -j 6
 '''
     )
-    parser.add_argument('prompt', help='中文图像描述提示词')
+    parser.add_argument('prompt', nargs='?', help='中文图像描述提示词')
     parser.add_argument('-o', '--output', help='输出文件路径（默认保存到当前目录）')
     parser.add_argument('-r', '--ratio', help=f'宽高比，推荐使用。可选: {", ".join(VALID_ASPECT_RATIOS)}')
     parser.add_argument('-s', '--size', help='图片尺寸 (如 1792x1024)')
     parser.add_argument('--resolution', help='分辨率 (1K/2K/4K)，仅部分模型支持')
     parser.add_argument('--ref', help='参考图片路径，用于风格参考（长图场景）')
+    parser.add_argument('--batch', help='批量任务 JSON 文件（任务列表），并发生成')
+    parser.add_argument('-j', '--concurrency', type=int, default=4, help='批量生成的并发数，默认4')
+    parser.add_argument('--series', action='store_true',
+                        help='批量任务按系列配图执行：共用 --ref 参考图，未给 --ref 时以第一张为参考')
+    parser.add_argument('--no-cache', action='store_true', help='不使用结果缓存，强制调用 API')
+    parser.add_argument('--no-stream', action='store_true', help='整体读取响应后再保存（默认流式解码写盘）')
     
     args = parser.parse_args()
     
+    if args.batch:
+        run_batch(args.batch, args.concurrency, not args.no_cache, not args.no_stream,
+                  args.ref, args.series)
+        return
+    
+    if not args.prompt:
+        parser.error("请提供提示词或使用 --batch 指定批量任务文件")
+    
     if args.ratio and args.ratio not in VALID_ASPECT_RATIOS:
         print(f"错误: 不支持的宽高比 '{args.ratio}'")
         print(f"支持的宽高比: {', '.join(VALID_ASPECT_RATIOS)}")
@@ -327,7 +677,7 @@ def main():
         timestamp = time.strftime("%Y%m%d_%H%M%S")
         output_path = f"generated_{timestamp}.png"
     
-    generator = TextToImageGenerator()
+    generator = TextToImageGenerator(use_cache=not args.no_cache, stream=not args.no_stream)
     result = generator.generate(
         prompt=args.prompt,
         size=args.size,
@@ -338,7 +688,7 @@ def main():
     )
     
     if result["success"]:
-        print(f"生成成功！")
+        print(f"生成成功！{'（缓存）' if result.get('cached') else ''}")
         if result.get("saved_path"):
             print(f"图片已保存到: {result['saved_path']}")
     else:
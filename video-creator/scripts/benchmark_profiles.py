@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+编码档位基准测试 - 对比 preview / final / archive 的合成耗时
+
+用法:
+    python benchmark_profiles.py video_config.yaml
+    python benchmark_profiles.py video_config.yaml --profiles preview final --srt subtitles.srt
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+import yaml
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+VIDEO_MAKER = SCRIPT_DIR / "video_maker.py"
+
+sys.path.insert(0, str(SCRIPT_DIR))
+from video_maker import ENCODE_PROFILES
+
+
+def run_profile(config_path, config, profile, extra_args, output_dir):
+    """用指定档位跑一次 video_maker，返回 (耗时秒, 输出文件大小)
+
+    输出写到 output_dir（临时目录），测完即删，不在素材目录留下 bench_*.mp4
+    """
+    output_path = Path(output_dir) / f"bench_{profile}.mp4"
+    bench_config = dict(config, output=str(output_path))
+    bench_config_path = config_path.parent / f".bench_{profile}.yaml"
+    with open(bench_config_path, 'w') as f:
+        yaml.safe_dump(bench_config, f, allow_unicode=True)
+
+    started = time.perf_counter()
+    try:
+        result = subprocess.run(
+            [sys.executable, str(VIDEO_MAKER), str(bench_config_path), '--profile', profile] + extra_args,
+            capture_output=True, text=True
+        )
+    finally:
+        bench_config_path.unlink()
+    elapsed = time.perf_counter() - started
+
+    if result.returncode != 0:
+        print(result.stdout[-1000:])
+        print(f"错误: {profile} 档位合成失败")
+        sys.exit(1)
+
+    size = output_path.stat().st_size
+    output_path.unlink()
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='编码档位基准测试')
+    parser.add_argument('config', help='配置文件路径 (YAML)')
+    parser.add_argument('--profiles', nargs='+', default=list(ENCODE_PROFILES),
+                        choices=list(ENCODE_PROFILES), help='要测试的档位')
+    parser.add_argument('--srt', type=str, default=None, help='字幕文件路径(SRT格式)')
+    parser.add_argument('--no-bgm', action='store_true', help='不添加BGM')
+    args = parser.parse_args()
+
+    config_path = Path(args.config).resolve()
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+
+    extra_args = []
+    if args.srt:
+        extra_args += ['--srt', str(Path(args.srt).resolve())]
+    if args.no_bgm:
+        extra_args.append('--no-bgm')
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_profiles_") as output_dir:
+        for profile in args.profiles:
+            print(f"  合成 {profile}...")
+            elapsed, size = run_profile(config_path, config, profile, extra_args, output_dir)
+            results.append((profile, elapsed, size))
+
+    baseline = dict((p, t) for p, t, _ in results).get('final')
+    print(f"\n{'档位':<10}{'耗时(秒)':>10}{'文件(MB)':>10}{'相对final':>12}")
+    print("-" * 42)
+    for profile, elapsed, size in results:
+        speedup = f"{baseline / elapsed:.1f}x" if baseline else "-"
+        print(f"{profile:<10}{elapsed:>10.1f}{size / 1024 / 1024:>10.1f}{speedup:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+片尾库生成器 - 并行渲染全部比例的片尾，自动加语音，写 manifest
+
+每个比例一个独立的 manim 进程并行渲染（assets/outro_generator.py 的参数化场景），
+渲染完自动混入 outro_voice.mp3，并把文件名、尺寸、fps、sha256 写入 assets/outro_manifest.json。
+video_maker 通过 get_outro() 查 manifest，缺失的比例在有 manim 时按需渲染。
+
+用法:
+    python outro_library.py                      # 渲染全部比例
+    python outro_library.py --ratios 9:16 3:4    # 只渲染指定比例
+    python outro_library.py --workers 2 --force  # 限制并行数，强制重新渲染
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+ASSETS_DIR = SCRIPT_DIR.parent / "assets"
+OUTRO_SCENE_FILE = ASSETS_DIR / "outro_generator.py"
+OUTRO_VOICE = ASSETS_DIR / "outro_voice.mp3"
+MANIFEST_PATH = ASSETS_DIR / "outro_manifest.json"
+OUTRO_FPS = 30
+# 语音在片尾开始 1 秒后进入
+VOICE_DELAY_MS = 1000
+
+_manifest_lock = threading.Lock()
+
+
+def outro_filename(ratio):
+    """片尾文件名：16:9 沿用 outro.mp4，其余 outro_{W}x{H}.mp4"""
+    if ratio == "16:9":
+        return "outro.mp4"
+    return f"outro_{ratio.replace(':', 'x')}.mp4"
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest():
+    if MANIFEST_PATH.exists():
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_PATH.with_suffix('.json.part')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _probe_duration(path):
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+        '-of', 'csv=p=0', str(path)
+    ], capture_output=True, text=True)
+    return float(result.stdout.strip())
+
+
+def render_outro(ratio, size, voice=OUTRO_VOICE):
+    """渲染单个比例的片尾并混入语音，返回 manifest 条目"""
+    width, height = size
+    filename = outro_filename(ratio)
+    output_path = ASSETS_DIR / filename
+
+    with tempfile.TemporaryDirectory(prefix=f"outro_{ratio.replace(':', 'x')}_") as tmp:
+        tmp_dir = Path(tmp)
+        env = dict(os.environ, OUTRO_RATIO=ratio)
+        cmd = [
+            'manim', '-qh', '--format=mp4', f'--fps={OUTRO_FPS}', '-r', f'{width},{height}',
+            '--media_dir', str(tmp_dir), '-o', 'silent.mp4',
+            str(OUTRO_SCENE_FILE), 'OutroAnimation'
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(f"{ratio} 渲染失败: {result.stderr[-1000:]}")
+        silent = next(tmp_dir.rglob('silent.mp4'))
+
+        if voice and Path(voice).exists():
+            duration = _probe_duration(silent)
+            voiced = tmp_dir / filename
+            cmd = [
+                'ffmpeg', '-y', '-i', str(silent), '-i', str(voice),
+                '-filter_complex',
+                f"[1:a]adelay={VOICE_DELAY_MS}|{VOICE_DELAY_MS},apad=whole_dur={duration}[aout]",
+                '-map', '0:v', '-map', '[aout]', '-c:v', 'copy', '-c:a', 'aac', '-ar', '44100',
+                str(voiced)
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise RuntimeError(f"{ratio} 混入语音失败: {result.stderr[-1000:]}")
+            silent = voiced
+
+        shutil.move(str(silent), str(output_path))
+
+    return {
+        "file": filename,
+        "width": width,
+        "height": height,
+        "fps": OUTRO_FPS,
+        "voice": bool(voice and Path(voice).exists()),
+        "sha256": file_sha256(output_path),
+    }
+
+
+def _update_manifest(ratio, entry):
+    with _manifest_lock:
+        manifest = load_manifest()
+        manifest[ratio] = entry
+        save_manifest(manifest)
+
+
+def build_library(sizes, workers=None, force=False):
+    """并行渲染多个比例，每个比例一个 manim 进程
+
+    Args:
+        sizes: {ratio: (width, height)}
+        workers: 并行数，默认 CPU 核数
+        force: 已有且校验通过的片尾也重新渲染
+
+    Returns:
+        {ratio: manifest 条目}
+    """
+    manifest = load_manifest()
+    todo = {r: s for r, s in sizes.items() if force or not verify_entry(manifest.get(r), s)}
+    if not todo:
+        print("  ✓ 片尾库已是最新")
+        return manifest
+
+    workers = workers or os.cpu_count() or 1
+    print(f"并行渲染 {len(todo)} 个片尾 (并行 {workers})...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(render_outro, ratio, size): ratio for ratio, size in todo.items()}
+        for future in as_completed(futures):
+            ratio = futures[future]
+            try:
+                entry = future.result()
+            except RuntimeError as e:
+                print(f"  ✗ {e}")
+                continue
+            _update_manifest(ratio, entry)
+            print(f"  ✓ {ratio}: {entry['file']} ({entry['width']}x{entry['height']})")
+    return load_manifest()
+
+
+def verify_entry(entry, size=None):
+    """manifest 条目对应文件存在、尺寸一致且校验和匹配"""
+    if not entry:
+        return False
+    path = ASSETS_DIR / entry["file"]
+    if not path.exists():
+        return False
+    if size and (entry["width"], entry["height"]) != tuple(size):
+        return False
+    return file_sha256(path) == entry["sha256"]
+
+
+def get_outro(ratio, size, render_missing=True):
+    """按 manifest 查找精确尺寸的片尾；缺失时若装了 manim 则按需渲染
+
+    Returns:
+        (Path, manifest 条目)，找不到返回 (None, None)
+    """
+    entry = load_manifest().get(ratio)
+    if verify_entry(entry, size):
+        return ASSETS_DIR / entry["file"], entry
+
+    if not render_missing or shutil.which('manim') is None:
+        return None, None
+
+    print(f"  渲染 {ratio} 片尾...")
+    try:
+        entry = render_outro(ratio, size)
+    except RuntimeError as e:
+        print(f"  ⚠ {e}")
+        return None, None
+    _update_manifest(ratio, entry)
+    return ASSETS_DIR / entry["file"], entry
+
+
+def main():
+    from video_maker import RATIO_TO_SIZE
+
+    parser = argparse.ArgumentParser(description='片尾库生成器')
+    parser.add_argument('--ratios', nargs='+', default=list(RATIO_TO_SIZE),
+                        help='要渲染的比例，默认全部')
+    parser.add_argument('--workers', type=int, default=None, help='并行渲染数，默认CPU核数')
+    parser.add_argument('--force', action='store_true', help='强制重新渲染')
+    args = parser.parse_args()
+
+    unknown = [r for r in args.ratios if r not in RATIO_TO_SIZE]
+    if unknown:
+        print(f"错误: 不支持的比例 {', '.join(unknown)}")
+        sys.exit(1)
+    if shutil.which('manim') is None:
+        print("错误: 未安装 manim (pip install manim)")
+        sys.exit(1)
+
+    build_library({r: RATIO_TO_SIZE[r] for r in args.ratios}, args.workers, args.force)
+    print(f"✓ manifest: {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
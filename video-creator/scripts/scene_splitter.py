@@ -8,7 +8,9 @@ import json
 import re
 import argparse
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from subtitle_layout import SubtitleLayout
 
 
 def split_by_sentence_timestamps(timestamps: List[Dict]) -> List[Dict]:
@@ -137,8 +139,18 @@ def generate_shot_prompts(shots: List[Dict], style: str, context: str = "") -> L
     return shots
 
 
-def generate_srt(shots: List[Dict], output_path: str):
-    """生成 SRT 字幕文件"""
+def generate_srt(shots: List[Dict], output_path: str, layout: Optional[SubtitleLayout] = None,
+                 timestamps: Optional[List[Dict]] = None):
+    """生成 SRT 字幕文件
+
+    传入 layout 时按像素宽度预先换行拆块，块时长按 timestamps 词级时间戳分配。
+    """
+    if layout is not None:
+        words = [ts for ts in (timestamps or []) if ts.get("type") != "sentence"]
+        layout.write_srt(layout.layout(shots, words), output_path)
+        print(f"  ✓ 字幕: {output_path}")
+        return
+    
     def format_time(seconds: float) -> str:
         hours = int(seconds // 3600)
         minutes = int((seconds % 3600) // 60)
@@ -155,7 +167,8 @@ def generate_srt(shots: List[Dict], output_path: str):
     print(f"  ✓ 字幕: {output_path}")
 
 
-def process_scene(text: str, timestamps_path: str, style: str, context: str = "", output_dir: str = ".") -> Dict:
+def process_scene(text: str, timestamps_path: str, style: str, context: str = "", output_dir: str = ".",
+                  ratio: Optional[str] = None) -> Dict:
     """
     处理单个场景，输出镜头配置
     
@@ -165,6 +178,7 @@ def process_scene(text: str, timestamps_path: str, style: str, context: str = ""
         style: 画风
         context: 上下文
         output_dir: 输出目录
+        ratio: 视频比例，指定时字幕按该分辨率预先排版
     
     Returns:
         场景配置字典
@@ -183,8 +197,13 @@ def process_scene(text: str, timestamps_path: str, style: str, context: str = ""
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
+    layout = None
+    if ratio:
+        from video_maker import RATIO_TO_SIZE
+        layout = SubtitleLayout(*RATIO_TO_SIZE.get(ratio, (1920, 1080)))
+    
     srt_path = output_path / "subtitles.srt"
-    generate_srt(shots, str(srt_path))
+    generate_srt(shots, str(srt_path), layout, timestamps)
     
     config_path = output_path / "shots.json"
     with open(config_path, "w", encoding="utf-8") as f:
@@ -201,6 +220,7 @@ def main():
     parser.add_argument('--style', type=str, default='', help='画风描述')
     parser.add_argument('--context', type=str, default='', help='上下文（角色等）')
     parser.add_argument('--output-dir', type=str, default='.', help='输出目录')
+    parser.add_argument('--ratio', type=str, default=None, help='视频比例，指定时字幕按该分辨率预先排版')
     
     args = parser.parse_args()
     
@@ -209,7 +229,8 @@ def main():
         timestamps_path=args.timestamps,
         style=args.style,
         context=args.context,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        ratio=args.ratio
     )
     
     print(f"\n拆分完成，共 {len(result['shots'])} 个镜头：")
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+字幕排版引擎 - 按真实字形宽度换行，按 TTS 时间戳分配字幕块时长
+
+供 video_maker.burn_subtitles 和 scene_splitter.generate_srt 共用：
+1. 从所选字体测量字形像素宽度（按 字体+字号 缓存）
+2. 按像素宽度换行，每个字幕块最多 max_lines 行
+3. 字幕块时长按 WordBoundary 时间戳分配，没有时间戳时按字宽比例分配
+4. 所有 cue 一次批量排版：先收集全部字符统一测量，再逐条换行
+
+用法:
+    python subtitle_layout.py subtitles.srt --ratio 9:16 --timestamps narration.json -o subtitles.ass
+"""
+import argparse
+import json
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    from PIL import ImageFont
+except ImportError:
+    ImageFont = None
+
+DEFAULT_FONT = "PingFang SC"
+
+# 字体名 → 常见安装路径（macOS / Linux / Windows）
+FONT_CANDIDATES = {
+    "PingFang SC": [
+        "/System/Library/Fonts/PingFang.ttc",
+        "/System/Library/Fonts/Supplemental/PingFang.ttc",
+        "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+        "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+        "C:/Windows/Fonts/msyh.ttc",
+    ],
+}
+
+# 标点替换为空格，便于换行分割
+PUNCTUATION_RE = re.compile(r'[，。、：；？！,.:;?!""''「」『』【】（）()《》]')
+SRT_TIME_RE = re.compile(r'(\d{2}):(\d{2}):(\d{2}),(\d{3}) --> (\d{2}):(\d{2}):(\d{2}),(\d{3})')
+
+
+def clean_text(text: str) -> str:
+    """标点转空格并合并多余空白"""
+    text = PUNCTUATION_RE.sub(' ', text.replace('\n', ' '))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _key_chars(text: str) -> str:
+    """用于和时间戳对齐的字符序列：去掉空白和标点"""
+    return re.sub(r'\s+', '', PUNCTUATION_RE.sub('', text))
+
+
+class GlyphMetrics:
+    """某个 字体+字号 的字形宽度表，测量过的字符会被缓存"""
+
+    def __init__(self, font: str, font_size: int):
+        self.font_size = font_size
+        self.font = self._load_font(font, font_size)
+        self.widths: Dict[str, float] = {}
+
+    @staticmethod
+    def _load_font(font: str, font_size: int):
+        if ImageFont is None:
+            return None
+        for candidate in [font] + FONT_CANDIDATES.get(font, []):
+            try:
+                return ImageFont.truetype(candidate, font_size)
+            except OSError:
+                continue
+        return None
+
+    def _estimate(self, char: str) -> float:
+        """没有字体文件时按东亚宽度估算"""
+        if unicodedata.east_asian_width(char) in ('W', 'F'):
+            return float(self.font_size)
+        return self.font_size * 0.55
+
+    def measure_chars(self, chars):
+        """批量测量尚未缓存的字符"""
+        for char in set(chars) - self.widths.keys():
+            if self.font is not None:
+                self.widths[char] = self.font.getlength(char)
+            else:
+                self.widths[char] = self._estimate(char)
+
+    def text_width(self, text: str) -> float:
+        self.measure_chars(text)
+        return sum(self.widths[c] for c in text)
+
+
+@lru_cache(maxsize=None)
+def get_glyph_metrics(font: str, font_size: int) -> GlyphMetrics:
+    """按 字体+字号 缓存字形宽度表"""
+    return GlyphMetrics(font, font_size)
+
+
+def parse_srt(srt_path) -> List[Dict]:
+    """解析 SRT，返回 [{text, start, end}]"""
+    with open(srt_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    cues = []
+    for block in re.split(r'\n\n+', content.strip()):
+        lines = block.strip().split('\n')
+        if len(lines) < 3:
+            continue
+        match = SRT_TIME_RE.match(lines[1])
+        if not match:
+            continue
+        g = [int(x) for x in match.groups()]
+        cues.append({
+            "text": ' '.join(lines[2:]),
+            "start": g[0] * 3600 + g[1] * 60 + g[2] + g[3] / 1000,
+            "end": g[4] * 3600 + g[5] * 60 + g[6] + g[7] / 1000,
+        })
+    return cues
+
+
+def load_word_timestamps(timestamps_path) -> List[Dict]:
+    """读取 tts_generator 输出的时间戳，只保留词级 WordBoundary"""
+    with open(timestamps_path, 'r', encoding='utf-8') as f:
+        timestamps = json.load(f)
+    return [ts for ts in timestamps if ts.get("type") != "sentence"]
+
+
+class SubtitleLayout:
+    """字幕排版：像素宽度换行 + 时间戳分配时长"""
+
+    def __init__(self, width: int, height: int, font: str = DEFAULT_FONT,
+                 font_size: Optional[int] = None, margin_bottom: Optional[int] = None,
+                 max_lines: int = 2, side_margin: int = 10):
+        self.width = width
+        self.height = height
+        self.font = font
+        # 字体大小：高度/25，16:9时约43px，9:16时约77px
+        self.font_size = font_size or max(36, int(height / 25))
+        self.margin_bottom = margin_bottom if margin_bottom is not None else int(height / 15)
+        self.max_lines = max_lines
+        self.side_margin = side_margin
+        # 左右各留 5% 安全边距
+        self.max_line_width = width * 0.9 - 2 * side_margin
+        self.metrics = get_glyph_metrics(font, self.font_size)
+
+    def wrap(self, text: str) -> List[str]:
+        """按像素宽度换行，优先在空格处断开（往回找不超过半行）"""
+        self.metrics.measure_chars(text)
+        widths = [self.metrics.widths[c] for c in text]
+        prefix = [0.0] + list(accumulate(widths))
+        lines = []
+        start = 0
+        n = len(text)
+        while start < n:
+            end = start
+            while end < n and prefix[end + 1] - prefix[start] <= self.max_line_width:
+                end += 1
+            if end == start:
+                end = start + 1
+            if end < n:
+                half = start + (end - start) // 2
+                space = text.rfind(' ', half, end + 1)
+                if space > start:
+                    end = space
+            line = text[start:end].strip()
+            if line:
+                lines.append(line)
+            start = end
+            while start < n and text[start] == ' ':
+                start += 1
+        return lines
+
+    def _block_times(self, blocks: List[List[str]], cue: Dict, words: List[Dict]):
+        """给每个字幕块分配 (start, end)
+
+        优先按词级时间戳：把每个词的时间赋给它的字符，块的起止取首字开始和末字结束；
+        对不上时按字宽比例分配。
+        """
+        start, end = cue["start"], cue["end"]
+        block_keys = [_key_chars(''.join(lines)) for lines in blocks]
+        total = sum(len(k) for k in block_keys)
+
+        char_times = []
+        if total:
+            for w in words:
+                char_times.extend([(w["start"], w["end"])] * len(_key_chars(w["text"])))
+
+        times = []
+        if char_times and len(char_times) == total:
+            pos = 0
+            for key in block_keys:
+                if key:
+                    times.append([char_times[pos][0], char_times[pos + len(key) - 1][1]])
+                else:
+                    times.append([None, None])
+                pos += len(key)
+        else:
+            block_widths = [self.metrics.text_width(''.join(lines)) for lines in blocks]
+            total_width = sum(block_widths) or 1.0
+            t = start
+            for bw in block_widths:
+                dur = (end - start) * bw / total_width
+                times.append([t, t + dur])
+                t += dur
+
+        # 块与块首尾相接，避免字幕闪烁；整体贴合 cue 的起止
+        times[0][0] = start
+        times[-1][1] = end
+        for i in range(len(times)):
+            if times[i][0] is None:
+                times[i][0] = times[i - 1][1]
+            if times[i][1] is None:
+                times[i][1] = times[i][0]
+        for i in range(len(times) - 1):
+            times[i][1] = times[i + 1][0]
+        return [tuple(t) for t in times]
+
+    def layout(self, cues: List[Dict], timestamps: Optional[List[Dict]] = None) -> List[Dict]:
+        """批量排版所有 cue
+
+        Args:
+            cues: [{text, start, end}]，可来自 parse_srt 或 scene_splitter 的 shots
+            timestamps: TTS 词级时间戳（load_word_timestamps），可选
+
+        Returns:
+            [{lines, start, end}]，每块最多 max_lines 行
+        """
+        texts = [clean_text(cue["text"]) for cue in cues]
+        # 一次性测量全部字符
+        self.metrics.measure_chars(''.join(texts))
+        words = sorted(timestamps or [], key=lambda w: w["start"])
+        word_starts = [w["start"] for w in words]
+
+        result = []
+        for cue, text in zip(cues, texts):
+            lines = self.wrap(text)
+            if not lines:
+                continue
+            blocks = [lines[i:i + self.max_lines] for i in range(0, len(lines), self.max_lines)]
+            # 只取起点落在该 cue 内的词（容差 50ms）
+            lo = bisect_left(word_starts, cue["start"] - 0.05)
+            hi = bisect_right(word_starts, cue["end"] + 0.05)
+            cue_words = words[lo:hi]
+            for block, (block_start, block_end) in zip(blocks, self._block_times(blocks, cue, cue_words)):
+                result.append({"lines": block, "start": block_start, "end": block_end})
+        return result
+
+    def write_ass(self, blocks: List[Dict], ass_path):
+        """写 ASS 字幕，固定底部居中"""
+        header = f"""[Script Info]
+Title: Subtitles
+ScriptType: v4.00+
+PlayResX: {self.width}
+PlayResY: {self.height}
+WrapStyle: 2
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,{self.font},{self.font_size},&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,2,1,2,{self.side_margin},{self.side_margin},{self.margin_bottom},1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+        events = []
+        for block in blocks:
+            lines = block["lines"]
+            # 单行时补一个空行，保持字幕底边位置固定
+            text = r'\N'.join(lines) if len(lines) > 1 else lines[0] + r'\N '
+            events.append(
+                f"Dialogue: 0,{sec_to_ass_time(block['start'])},{sec_to_ass_time(block['end'])},"
+                f"Default,,0,0,0,,{text}"
+            )
+        with open(ass_path, 'w', encoding='utf-8') as f:
+            f.write(header + '\n'.join(events))
+
+    @staticmethod
+    def write_srt(blocks: List[Dict], srt_path):
+        """写排版后的 SRT（每块一条，行内换行保留）"""
+        with open(srt_path, 'w', encoding='utf-8') as f:
+            for i, block in enumerate(blocks, 1):
+                f.write(f"{i}\n")
+                f.write(f"{sec_to_srt_time(block['start'])} --> {sec_to_srt_time(block['end'])}\n")
+                f.write('\n'.join(block["lines"]) + "\n\n")
+
+
+def sec_to_ass_time(sec: float) -> str:
+    """秒数转ASS时间格式"""
+    cs_total = int(round(sec * 100))
+    h, rem = divmod(cs_total, 360000)
+    m, rem = divmod(rem, 6000)
+    s, cs = divmod(rem, 100)
+    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+
+
+def sec_to_srt_time(sec: float) -> str:
+    """秒数转SRT时间格式"""
+    ms_total = int(round(sec * 1000))
+    h, rem = divmod(ms_total, 3600000)
+    m, rem = divmod(rem, 60000)
+    s, ms = divmod(rem, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def main():
+    from video_maker import RATIO_TO_SIZE
+
+    parser = argparse.ArgumentParser(description='字幕排版引擎')
+    parser.add_argument('srt', help='SRT 字幕文件')
+    parser.add_argument('--ratio', type=str, default='16:9', help='视频比例')
+    parser.add_argument('--timestamps', type=str, default=None, help='TTS时间戳JSON文件')
+    parser.add_argument('--font', type=str, default=DEFAULT_FONT, help='字体名或字体文件路径')
+    parser.add_argument('-o', '--output', type=str, default=None, help='输出 ASS 路径')
+    args = parser.parse_args()
+
+    width, height = RATIO_TO_SIZE.get(args.ratio, (1920, 1080))
+    layout = SubtitleLayout(width, height, font=args.font)
+    timestamps = load_word_timestamps(args.timestamps) if args.timestamps else None
+    blocks = layout.layout(parse_srt(args.srt), timestamps)
+
+    output = args.output or str(Path(args.srt).with_suffix('.ass'))
+    layout.write_ass(blocks, output)
+    print(f"  ✓ 字幕: {output} ({len(blocks)} 条)")
+
+
+if __name__ == "__main__":
+    main()
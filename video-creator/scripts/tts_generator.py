@@ -6,56 +6,149 @@ TTS 语音生成器 - 使用 edge-tts
 
 import asyncio
 import argparse
+import hashlib
 import os
 import json
+import shutil
 import yaml
 import edge_tts
 
 
+TICKS_PER_SECOND = 10000000
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+
+def _timestamp_entry(chunk: dict, sentence: bool = False) -> dict:
+    """把 edge-tts 的边界事件转成时间戳条目"""
+    offset = chunk.get("offset", 0)
+    entry = {
+        "text": chunk.get("text", ""),
+        "start": offset / TICKS_PER_SECOND,
+        "end": (offset + chunk.get("duration", 0)) / TICKS_PER_SECOND
+    }
+    if sentence:
+        entry["type"] = "sentence"
+    return entry
+
+
+def timestamps_path_for(audio_path: str) -> str:
+    """音频文件对应的时间戳 JSON 路径"""
+    return audio_path.rsplit(".", 1)[0] + ".json"
+
+
 async def generate_tts(text: str, voice: str, output_path: str, rate: str = "+0%", pitch: str = "+0Hz", with_timestamps: bool = False):
-    """生成单条语音，可选输出时间戳"""
+    """生成单条语音，可选输出时间戳
+
+    音频块边收边写入磁盘（先写 .part 再重命名），不在内存中缓存整段音频。
+    """
     communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
+    timestamps = []
+    part_path = output_path + ".part"
+    
+    try:
+        with open(part_path, "wb") as f:
+            async for chunk in communicate.stream():
+                chunk_type = chunk.get("type", "")
+                if chunk_type == "audio":
+                    f.write(chunk.get("data", b""))
+                elif not with_timestamps:
+                    continue
+                elif chunk_type == "WordBoundary":
+                    timestamps.append(_timestamp_entry(chunk))
+                elif chunk_type == "SentenceBoundary":
+                    timestamps.append(_timestamp_entry(chunk, sentence=True))
+        os.replace(part_path, output_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
     
     if with_timestamps:
-        timestamps = []
-        audio_chunks = []
-        
-        async for chunk in communicate.stream():
-            chunk_type = chunk.get("type", "")
-            if chunk_type == "audio":
-                audio_chunks.append(chunk.get("data", b""))
-            elif chunk_type == "WordBoundary":
-                timestamps.append({
-                    "text": chunk.get("text", ""),
-                    "start": chunk.get("offset", 0) / 10000000,
-                    "end": (chunk.get("offset", 0) + chunk.get("duration", 0)) / 10000000
-                })
-            elif chunk_type == "SentenceBoundary":
-                timestamps.append({
-                    "text": chunk.get("text", ""),
-                    "start": chunk.get("offset", 0) / 10000000,
-                    "end": (chunk.get("offset", 0) + chunk.get("duration", 0)) / 10000000,
-                    "type": "sentence"
-                })
-        
-        with open(output_path, "wb") as f:
-            for data in audio_chunks:
-                f.write(data)
-        
-        ts_path = output_path.rsplit(".", 1)[0] + ".json"
-        with open(ts_path, "w", encoding="utf-8") as f:
+        with open(timestamps_path_for(output_path), "w", encoding="utf-8") as f:
             json.dump(timestamps, f, ensure_ascii=False, indent=2)
-        
         print(f"  ✓ 生成: {output_path} + 时间戳")
         return timestamps
-    else:
-        await communicate.save(output_path)
-        print(f"  ✓ 生成: {output_path}")
-        return None
+    
+    print(f"  ✓ 生成: {output_path}")
+    return None
 
 
-async def generate_batch(config_path: str, output_dir: str):
-    """批量生成语音"""
+class TTSCache:
+    """内容寻址的语音缓存
+
+    以 (text, voice, rate, pitch) 的哈希为键，保存 mp3 和时间戳 JSON，
+    重新生成脚本时只有改动过的句子才需要重新合成。
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(text: str, voice: str, rate: str, pitch: str) -> str:
+        payload = json.dumps([text, voice, rate, pitch], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _paths(self, key: str):
+        audio_path = os.path.join(self.cache_dir, f"{key}.mp3")
+        return audio_path, timestamps_path_for(audio_path)
+    
+    def fetch(self, key: str, output_path: str) -> bool:
+        """命中则把缓存复制到 output_path（含时间戳），返回是否命中"""
+        audio_path, ts_path = self._paths(key)
+        if not (os.path.exists(audio_path) and os.path.exists(ts_path)):
+            return False
+        shutil.copyfile(audio_path, output_path)
+        shutil.copyfile(ts_path, timestamps_path_for(output_path))
+        return True
+    
+    def store(self, key: str, output_path: str):
+        """把刚生成的音频和时间戳写入缓存"""
+        audio_path, ts_path = self._paths(key)
+        shutil.copyfile(output_path, audio_path + ".part")
+        shutil.copyfile(timestamps_path_for(output_path), ts_path + ".part")
+        os.replace(ts_path + ".part", ts_path)
+        os.replace(audio_path + ".part", audio_path)
+
+
+async def generate_tts_with_retry(text: str, voice: str, output_path: str, rate: str, pitch: str,
+                                  semaphore: asyncio.Semaphore, retries: int = DEFAULT_RETRIES,
+                                  backoff: float = DEFAULT_BACKOFF, cache: TTSCache = None):
+    """在并发上限内生成单条语音（始终输出时间戳），失败按指数退避重试
+
+    Returns:
+        "cached" / "generated"
+    """
+    key = TTSCache.make_key(text, voice, rate, pitch) if cache else None
+    if cache and cache.fetch(key, output_path):
+        print(f"  ✓ 缓存: {output_path}")
+        return "cached"
+    
+    for attempt in range(retries + 1):
+        try:
+            async with semaphore:
+                await generate_tts(text, voice, output_path, rate, pitch, with_timestamps=True)
+            break
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"  ⚠ {output_path} 生成失败({e})，{delay:.1f}秒后重试 ({attempt + 1}/{retries})")
+            await asyncio.sleep(delay)
+    
+    if cache:
+        cache.store(key, output_path)
+    return "generated"
+
+
+async def generate_batch(config_path: str, output_dir: str, concurrency: int = DEFAULT_CONCURRENCY,
+                         retries: int = DEFAULT_RETRIES, cache_dir: str = None, use_cache: bool = True):
+    """批量生成语音
+
+    使用有界信号量限制并发，失败自动重试，每条语音都输出时间戳 JSON。
+    结果写入内容寻址缓存，未改动的句子直接复用。
+    """
     with open(config_path, 'r', encoding='utf-8') as f:
         config = yaml.safe_load(f)
     
@@ -66,6 +159,11 @@ async def generate_batch(config_path: str, output_dir: str):
     rate = voice_config.get('rate', '+0%')
     pitch = voice_config.get('pitch', '+0Hz')
     
+    cache = None
+    if use_cache:
+        cache = TTSCache(cache_dir or os.path.join(output_dir, '.tts_cache'))
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency))
     scenes = config.get('scenes', [])
     tasks = []
     
@@ -74,11 +172,13 @@ async def generate_batch(config_path: str, output_dir: str):
         if not text:
             continue
         output_path = os.path.join(output_dir, f"{i:03d}.mp3")
-        tasks.append(generate_tts(text, voice_name, output_path, rate, pitch))
+        tasks.append(generate_tts_with_retry(text, voice_name, output_path, rate, pitch,
+                                             semaphore, retries=retries, cache=cache))
     
-    print(f"开始生成 {len(tasks)} 条语音...")
-    await asyncio.gather(*tasks)
-    print(f"✓ 完成！语音文件保存在: {output_dir}")
+    print(f"开始生成 {len(tasks)} 条语音 (并发 {max(1, concurrency)})...")
+    results = await asyncio.gather(*tasks)
+    cached = results.count("cached")
+    print(f"✓ 完成！语音文件保存在: {output_dir} (新生成 {len(results) - cached} 条，缓存命中 {cached} 条)")
 
 
 async def list_voices():
@@ -105,6 +205,10 @@ def main():
     parser.add_argument('--timestamps', action='store_true', help='输出时间戳JSON文件')
     parser.add_argument('--config', type=str, help='配置文件路径(批量生成)')
     parser.add_argument('--output-dir', type=str, default='temp/audio', help='批量输出目录')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='批量生成并发数')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help='失败重试次数')
+    parser.add_argument('--cache-dir', type=str, default=None, help='语音缓存目录(默认 输出目录/.tts_cache)')
+    parser.add_argument('--no-cache', action='store_true', help='禁用语音缓存')
     parser.add_argument('--list-voices', action='store_true', help='列出可用音色')
     
     args = parser.parse_args()
@@ -112,7 +216,8 @@ def main():
     if args.list_voices:
         asyncio.run(list_voices())
     elif args.config:
-        asyncio.run(generate_batch(args.config, args.output_dir))
+        asyncio.run(generate_batch(args.config, args.output_dir, args.concurrency,
+                                   args.retries, args.cache_dir, not args.no_cache))
     elif args.text and args.output:
         asyncio.run(generate_tts(args.text, args.voice, args.output, args.rate, args.pitch, args.timestamps))
     else:
@@ -7,14 +7,22 @@
     python video_maker.py config.yaml
     python video_maker.py config.yaml --no-outro  # 不加片尾
     python video_maker.py config.yaml --no-bgm    # 不加BGM
+    python video_maker.py config.yaml --profile preview  # 快速预览（半分辨率）
 """
 import argparse
 import os
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 import yaml
+from functools import lru_cache
 from pathlib import Path
 
+from outro_library import get_outro
+from subtitle_layout import SubtitleLayout, load_word_timestamps, parse_srt
+
 SCRIPT_DIR = Path(__file__).parent
 SKILL_DIR = SCRIPT_DIR.parent
 ASSETS_DIR = SKILL_DIR / "assets"
@@ -25,6 +33,13 @@ VALID_ASPECT_RATIOS = [
     "1:1", "2:3", "3:2", "3:4", "4:3", "4:5", "5:4", "9:16", "16:9", "21:9"
 ]
 
+# 可以直接流拷贝进 mp4 的音频编码
+MP4_COPY_CODECS = {"aac", "mp3"}
+# 成片音频采样率（流拷贝拼接保留 TTS 原采样率，最后一步统一重采样）
+FINAL_SAMPLE_RATE = 44100
+# 非同构输入统一解码成的 PCM 格式
+PCM_ARGS = ['-f', 's16le', '-ar', str(FINAL_SAMPLE_RATE), '-ac', '2']
+
 RATIO_TO_SIZE = {
     "1:1": (1024, 1024),
     "2:3": (832, 1248),
@@ -38,8 +53,87 @@ RATIO_TO_SIZE = {
     "21:9": (1536, 672),
 }
 
+# 编码档位：preview 用于快速迭代，final 为默认成片，archive 为高码率存档
+# 配置文件可用 profiles.<name> 覆盖任意字段，profiles.<name>.ratios.<ratio> 按比例覆盖
+ENCODE_PROFILES = {
+    "preview": {
+        "scale": 0.5,
+        "fps": 15,
+        "codec": "libx264",
+        "preset": "ultrafast",
+        "crf": 28,
+        "audio_bitrate": "96k",
+        "subtitles": False,
+        "outro": False,
+    },
+    "final": {
+        "scale": 1.0,
+        "fps": 30,
+        "codec": "libx264",
+        "preset": "fast",
+        "crf": 20,
+        "audio_bitrate": "192k",
+        "subtitles": True,
+        "outro": True,
+    },
+    "archive": {
+        "scale": 1.0,
+        "fps": 30,
+        "codec": "libx264",
+        "preset": "slow",
+        "crf": 16,
+        "audio_bitrate": "320k",
+        "subtitles": True,
+        "outro": True,
+    },
+}
+DEFAULT_PROFILE = "final"
+# 支持 preset/crf 的软件编码器
+SOFTWARE_CODECS = ("libx264", "libx265")
+
+
+def resolve_profile(name=DEFAULT_PROFILE, ratio="16:9", overrides=None):
+    """合并内置档位、配置覆盖和按比例覆盖，返回含输出尺寸的编码参数"""
+    profile = dict(ENCODE_PROFILES[name])
+    overrides = dict((overrides or {}).get(name) or {})
+    ratio_overrides = overrides.pop("ratios", {}) or {}
+    profile.update(overrides)
+    profile.update(ratio_overrides.get(ratio) or {})
+    
+    width, height = RATIO_TO_SIZE.get(ratio, (1920, 1080))
+    # libx264 + yuv420p 要求宽高为偶数
+    profile["width"] = int(width * profile["scale"]) // 2 * 2
+    profile["height"] = int(height * profile["scale"]) // 2 * 2
+    profile["name"] = name
+    return profile
+
+
+def video_codec_args(profile):
+    """视频编码参数：软件编码器用 preset/crf，硬件编码器（如 h264_videotoolbox、h264_nvenc）可用 bitrate
+
+    preset/crf 只传给 libx264/libx265：硬件编码器不认 x264 的 preset 名称，或者含义不同
+    """
+    args = ['-c:v', profile["codec"]]
+    software = profile["codec"] in SOFTWARE_CODECS
+    if profile.get("preset") and software:
+        args += ['-preset', str(profile["preset"])]
+    if profile.get("crf") is not None and software:
+        args += ['-crf', str(profile["crf"])]
+    if profile.get("bitrate"):
+        args += ['-b:v', str(profile["bitrate"])]
+    return args + ['-pix_fmt', 'yuv420p']
+
+
 def get_outro_path(ratio):
-    """根据比例获取片尾路径，优先精确匹配，否则按方向匹配，最后兜底"""
+    """根据比例获取片尾路径
+
+    优先用片尾库 manifest 中校验通过的精确尺寸片尾，缺失时（装了 manim）按需渲染；
+    都不行再按文件名精确匹配、方向匹配，最后兜底
+    """
+    outro, _ = get_outro(ratio, RATIO_TO_SIZE.get(ratio, (1920, 1080)))
+    if outro:
+        return outro
+    
     ratio_file = ASSETS_DIR / f"outro_{ratio.replace(':', 'x')}.mp4"
     if ratio_file.exists():
         return ratio_file
@@ -80,11 +174,90 @@ def get_duration(file_path):
     return float(result.stdout.strip())
 
 
-def generate_video_with_transitions(images, durations, output_path, fade_duration=0.5, ratio="16:9"):
+@lru_cache(maxsize=None)
+def probe_audio(file_path):
+    """一次 ffprobe 获取音频编码、采样率、声道和时长"""
+    result = subprocess.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name,sample_rate,channels:format=duration',
+        '-of', 'default=noprint_wrappers=1', str(file_path)
+    ], capture_output=True, text=True)
+    info = dict(line.split('=', 1) for line in result.stdout.splitlines() if '=' in line)
+    return {
+        "codec": info.get("codec_name"),
+        "sample_rate": info.get("sample_rate"),
+        "channels": info.get("channels"),
+        "duration": float(info.get("duration", 0) or 0),
+    }
+
+
+def is_homogeneous_audio(audio_files):
+    """所有片段编码/采样率/声道一致且能直接放进 mp4，则可流拷贝拼接"""
+    formats = {
+        (info["codec"], info["sample_rate"], info["channels"])
+        for info in (probe_audio(str(a)) for a in audio_files)
+    }
+    return len(formats) == 1 and next(iter(formats))[0] in MP4_COPY_CODECS
+
+
+def write_concat_list(audio_files, concat_file):
+    """写 ffmpeg concat demuxer 列表"""
+    with open(concat_file, 'w') as f:
+        for audio in audio_files:
+            f.write(f"file '{Path(audio).absolute()}'\n")
+
+
+def _feed_pcm(audio_files, sink, errors):
+    """逐个解码音频片段为 PCM 写入 sink（编码进程的 stdin），出错时记录到 errors"""
+    try:
+        for audio in audio_files:
+            result = subprocess.run(
+                ['ffmpeg', '-v', 'error', '-i', str(audio)] + PCM_ARGS + ['pipe:1'],
+                stdout=sink
+            )
+            if result.returncode != 0:
+                errors.append(f"解码音频失败: {audio}")
+                return
+    except Exception as e:
+        # 编码进程提前退出时写管道会 BrokenPipeError，也算失败
+        errors.append(f"写入 PCM 失败: {e}")
+    finally:
+        sink.close()
+
+
+def run_cmd_with_pcm_input(cmd, audio_files, desc=""):
+    """执行从 stdin 读取 PCM 的命令，所有片段只解码一次、串成一条 PCM 流
+
+    解码线程失败时管道照常关闭，编码进程会把截断的输入当作正常结束，
+    所以必须检查解码结果，失败则终止编码进程并退出
+    """
+    if desc:
+        print(f"  {desc}...")
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=stderr)
+        errors = []
+        feeder = threading.Thread(target=_feed_pcm, args=(audio_files, proc.stdin, errors))
+        feeder.start()
+        feeder.join()
+        if errors:
+            proc.kill()
+            proc.wait()
+            print(f"错误: {errors[0]}")
+            sys.exit(1)
+        proc.wait()
+        if proc.returncode != 0:
+            stderr.seek(0)
+            print(f"错误: {stderr.read().decode(errors='replace')[-1000:]}")
+            sys.exit(1)
+
+
+def generate_video_with_transitions(images, durations, output_path, fade_duration=0.5, ratio="16:9", profile=None):
     """生成带转场的视频"""
     print(f"\n[1/4] 生成主视频 ({len(images)}张图片, {fade_duration}秒转场)")
     
-    width, height = RATIO_TO_SIZE.get(ratio, (1920, 1080))
+    profile = profile or resolve_profile(ratio=ratio)
+    width, height = profile["width"], profile["height"]
+    fps = profile["fps"]
     
     display_durations = []
     for i, dur in enumerate(durations):
@@ -101,7 +274,7 @@ def generate_video_with_transitions(images, durations, output_path, fade_duratio
     for i in range(len(images)):
         filter_parts.append(
             f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
-            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps=30[v{i}];"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps}[v{i}];"
         )
     
     offset = 0
@@ -123,7 +296,7 @@ def generate_video_with_transitions(images, durations, output_path, fade_duratio
     cmd = ['ffmpeg', '-y'] + inputs + [
         '-filter_complex', filter_complex,
         '-map', f'[{last_xf}]',
-        '-c:v', 'libx264', '-preset', 'fast', '-crf', '20', '-pix_fmt', 'yuv420p',
+    ] + video_codec_args(profile) + [
         str(output_path)
     ]
     
@@ -131,22 +304,35 @@ def generate_video_with_transitions(images, durations, output_path, fade_duratio
     print(f"  ✓ 主视频: {get_duration(output_path):.1f}秒")
 
 
-def merge_audio(audio_files, output_path):
-    """合并音频文件"""
+def merge_audio(audio_files, output_path, profile=None):
+    """合并音频文件
+
+    片段同构（编码/采样率/声道一致）时直接流拷贝拼接，不重新编码；
+    否则逐个解码进同一条 PCM 管道，只编码一次。
+
+    Returns:
+        实际输出路径（流拷贝时扩展名改为 .mka 以容纳原编码）
+    """
     print(f"\n[2/4] 合并音频 ({len(audio_files)}个文件)")
+    profile = profile or resolve_profile()
+    
+    if is_homogeneous_audio(audio_files):
+        output_path = output_path.with_suffix('.mka')
+        concat_file = output_path.parent / "audio_concat.txt"
+        write_concat_list(audio_files, concat_file)
+        cmd = [
+            'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', str(concat_file),
+            '-c:a', 'copy', str(output_path)
+        ]
+        run_cmd(cmd, "合并音频(流拷贝)")
+        concat_file.unlink()
+    else:
+        cmd = ['ffmpeg', '-y'] + PCM_ARGS + ['-i', 'pipe:0',
+               '-c:a', 'aac', '-b:a', profile["audio_bitrate"], str(output_path)]
+        run_cmd_with_pcm_input(cmd, audio_files, "合并音频(PCM管道)")
     
-    concat_file = output_path.parent / "audio_concat.txt"
-    with open(concat_file, 'w') as f:
-        for audio in audio_files:
-            f.write(f"file '{audio.absolute()}'\n")
-    
-    cmd = [
-        'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', str(concat_file),
-        '-af', 'aresample=44100', '-c:a', 'aac', '-b:a', '192k', str(output_path)
-    ]
-    run_cmd(cmd, "合并音频")
-    concat_file.unlink()
     print(f"  ✓ 音频: {get_duration(output_path):.1f}秒")
+    return output_path
 
 
 def combine_video_audio(video_path, audio_path, output_path):
@@ -158,7 +344,33 @@ def combine_video_audio(video_path, audio_path, output_path):
     run_cmd(cmd, "合并视频音频")
 
 
-def append_outro(video_path, output_path, fade_duration=0.5, ratio="16:9"):
+def mux_audio_direct(video_path, audio_files, output_path, profile=None):
+    """音频片段直接拼进最终封装，不落地中间的 audio_merged 文件"""
+    print(f"\n[2/4] 直接封装音频 ({len(audio_files)}个文件)")
+    profile = profile or resolve_profile()
+    
+    if is_homogeneous_audio(audio_files):
+        concat_file = output_path.parent / "audio_concat.txt"
+        write_concat_list(audio_files, concat_file)
+        cmd = [
+            'ffmpeg', '-y', '-i', str(video_path),
+            '-f', 'concat', '-safe', '0', '-i', str(concat_file),
+            '-map', '0:v', '-map', '1:a',
+            '-c:v', 'copy', '-c:a', 'copy', '-shortest', str(output_path)
+        ]
+        run_cmd(cmd, "合并视频音频(流拷贝)")
+        concat_file.unlink()
+    else:
+        cmd = ['ffmpeg', '-y', '-i', str(video_path)] + PCM_ARGS + ['-i', 'pipe:0',
+               '-map', '0:v', '-map', '1:a',
+               '-c:v', 'copy', '-c:a', 'aac', '-b:a', profile["audio_bitrate"],
+               '-shortest', str(output_path)]
+        run_cmd_with_pcm_input(cmd, audio_files, "合并视频音频(PCM管道)")
+    
+    print(f"  ✓ 音视频: {get_duration(output_path):.1f}秒")
+
+
+def append_outro(video_path, output_path, fade_duration=0.5, ratio="16:9", profile=None):
     """拼接片尾，自动缩放片尾到主视频分辨率"""
     print(f"\n[3/4] 拼接片尾")
     
@@ -167,38 +379,34 @@ def append_outro(video_path, output_path, fade_duration=0.5, ratio="16:9"):
         print(f"  ⚠ 片尾文件不存在: {outro_file}")
         return video_path
     
-    width, height = RATIO_TO_SIZE.get(ratio, (1920, 1080))
-    
-    outro_ready = output_path.parent / "outro_ready.mp4"
-    cmd = [
-        'ffmpeg', '-y', '-i', str(outro_file),
-        '-vf', f'scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1',
-        '-c:v', 'libx264', '-preset', 'fast', '-crf', '20',
-        '-c:a', 'aac', '-ar', '44100', str(outro_ready)
-    ]
-    run_cmd(cmd, "准备片尾")
+    profile = profile or resolve_profile(ratio=ratio)
+    width, height = profile["width"], profile["height"]
     
     video_duration = get_duration(video_path)
     fade_start = video_duration - fade_duration
     
+    # 片尾的缩放/帧率/重采样直接在同一个滤镜图里完成，不再单独转码一遍片尾；
+    # 片尾库中的精确尺寸片尾缩放为空操作
     cmd = [
-        'ffmpeg', '-y', '-i', str(video_path), '-i', str(outro_ready),
+        'ffmpeg', '-y', '-i', str(video_path), '-i', str(outro_file),
         '-filter_complex',
         f"[0:v]fade=t=out:st={fade_start}:d={fade_duration}[v0];"
-        f"[1:v]fade=t=in:st=0:d={fade_duration}[v1];"
+        f"[1:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={profile['fps']},"
+        f"fade=t=in:st=0:d={fade_duration}[v1];"
         f"[v0][v1]concat=n=2:v=1:a=0[vout];"
-        f"[0:a][1:a]concat=n=2:v=0:a=1[aout]",
+        f"[0:a]aresample=44100[a0];[1:a]aresample=44100[a1];"
+        f"[a0][a1]concat=n=2:v=0:a=1[aout]",
         '-map', '[vout]', '-map', '[aout]',
-        '-c:v', 'libx264', '-preset', 'fast', '-crf', '20',
-        '-c:a', 'aac', '-b:a', '192k', str(output_path)
+    ] + video_codec_args(profile) + [
+        '-c:a', 'aac', '-b:a', profile["audio_bitrate"], str(output_path)
     ]
     run_cmd(cmd, "拼接片尾")
-    outro_ready.unlink()
     print(f"  ✓ 含片尾: {get_duration(output_path):.1f}秒")
     return output_path
 
 
-def burn_subtitles(video_path, srt_path, output_path, ratio="16:9"):
+def burn_subtitles(video_path, srt_path, output_path, ratio="16:9", profile=None, timestamps_path=None):
     """烧录字幕到视频：底部居中固定位置"""
     print(f"\n[字幕] 烧录字幕")
     
@@ -206,20 +414,21 @@ def burn_subtitles(video_path, srt_path, output_path, ratio="16:9"):
         print(f"  ⚠ 字幕文件不存在: {srt_path}")
         return video_path
     
-    width, height = RATIO_TO_SIZE.get(ratio, (1920, 1080))
+    profile = profile or resolve_profile(ratio=ratio)
+    width, height = profile["width"], profile["height"]
     # 字体大小：高度/25，16:9时约43px，9:16时约77px
     font_size = max(36, int(height / 25))
     margin_bottom = int(height / 15)
     
     ass_path = Path(srt_path).with_suffix('.ass')
-    srt_to_ass(srt_path, ass_path, width, height, font_size, margin_bottom)
+    srt_to_ass(srt_path, ass_path, width, height, font_size, margin_bottom, timestamps_path)
     
     ass_escaped = str(ass_path).replace(":", r"\:").replace("'", r"\'")
     
     cmd = [
         'ffmpeg', '-y', '-i', str(video_path),
         '-vf', f"ass='{ass_escaped}'",
-        '-c:v', 'libx264', '-preset', 'fast', '-crf', '20',
+    ] + video_codec_args(profile) + [
         '-c:a', 'copy', str(output_path)
     ]
     run_cmd(cmd, "烧录字幕")
@@ -227,156 +436,20 @@ def burn_subtitles(video_path, srt_path, output_path, ratio="16:9"):
     return output_path
 
 
-def srt_to_ass(srt_path, ass_path, width, height, font_size, margin_bottom):
-    """将 SRT 转换为 ASS 格式，固定底部居中，自动换行"""
-    import re
-    
-    with open(srt_path, 'r', encoding='utf-8') as f:
-        srt_content = f.read()
-    
-    # 每行字数规则表（按分辨率宽度固定）
-    CHARS_PER_LINE_MAP = {
-        1024: 20,  # 1:1
-        832: 14,   # 2:3
-        1248: 32,  # 3:2
-        1080: 16,  # 3:4, 4:5, 5:4, 9:16 (竖版统一16字)
-        1440: 28,  # 4:3
-        864: 17,   # 4:5
-        1920: 38,  # 16:9
-        1536: 48,  # 21:9
-    }
-    # 查表，找不到则按公式计算
-    MAX_CHARS = CHARS_PER_LINE_MAP.get(width)
-    if MAX_CHARS is None:
-        # 兜底：按宽度和字体大小估算
-        MAX_CHARS = max(12, int(width / (font_size * 1.2)))
-    
-    # 标点符号（不能放行首）
-    PUNCTUATION = '，。、：；？！,.:;?!）】」》\'\"'
-    
-    def find_break_point(text, max_pos):
-        """找到合适的断点位置，优先在空格处断开"""
-        if max_pos >= len(text):
-            return len(text)
-        
-        # 从max_pos往前找空格断点
-        for i in range(max_pos, max(max_pos // 2, 1), -1):
-            if text[i] == ' ':
-                return i
-        # 没找到空格就直接断
-        return max_pos
-    
-    def wrap_text_2lines(text):
-        """换行：严格2行，返回单个2行字幕块"""
-        text = text.strip()
-        if len(text) <= MAX_CHARS:
-            return text + r'\N '
-        
-        # 找第一行断点
-        break1 = find_break_point(text, MAX_CHARS)
-        line1 = text[:break1].strip()
-        line2 = text[break1:].strip()
-        
-        # 第二行也限制长度
-        if len(line2) > MAX_CHARS:
-            break2 = find_break_point(line2, MAX_CHARS)
-            line2 = line2[:break2].strip()
-        
-        return line1 + r'\N' + line2
-    
-    def split_long_text(text, start_sec, end_sec):
-        """长文本拆成多条字幕，每条严格2行，时间均分"""
-        text = text.strip()
-        
-        # 先模拟换行，计算实际需要几条字幕
-        blocks = []
-        remaining = text
-        while remaining:
-            # 第一行
-            if len(remaining) <= MAX_CHARS:
-                blocks.append(remaining)
-                break
-            break1 = find_break_point(remaining, MAX_CHARS)
-            line1 = remaining[:break1].strip()
-            rest = remaining[break1:].strip()
-            
-            # 第二行
-            if len(rest) <= MAX_CHARS:
-                blocks.append(line1 + ' ' + rest)
-                break
-            break2 = find_break_point(rest, MAX_CHARS)
-            line2 = rest[:break2].strip()
-            blocks.append(line1 + ' ' + line2)
-            remaining = rest[break2:].strip()
-        
-        # 时间均分
-        duration = end_sec - start_sec
-        time_per_block = duration / len(blocks)
-        
-        result = []
-        for i, block in enumerate(blocks):
-            block_start = start_sec + i * time_per_block
-            block_end = start_sec + (i + 1) * time_per_block
-            result.append((block, block_start, block_end))
-        
-        return result
-    
-    ass_header = f"""[Script Info]
-Title: Subtitles
-ScriptType: v4.00+
-PlayResX: {width}
-PlayResY: {height}
-WrapStyle: 0
+def srt_to_ass(srt_path, ass_path, width, height, font_size, margin_bottom, timestamps_path=None):
+    """将 SRT 转换为 ASS 格式，固定底部居中，按字形像素宽度换行
 
-[V4+ Styles]
-Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-Style: Default,PingFang SC,{font_size},&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,2,1,2,10,10,{margin_bottom},1
+    有 TTS 时间戳时按词级时间分配每个字幕块的时长，否则按字宽比例分配。
+    """
+    layout = SubtitleLayout(width, height, font_size=font_size, margin_bottom=margin_bottom)
+    timestamps = None
+    if timestamps_path and Path(timestamps_path).exists():
+        timestamps = load_word_timestamps(timestamps_path)
+    blocks = layout.layout(parse_srt(srt_path), timestamps)
+    layout.write_ass(blocks, ass_path)
 
-[Events]
-Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
-"""
-    
-    def sec_to_ass_time(sec):
-        """秒数转ASS时间格式"""
-        h = int(sec // 3600)
-        m = int((sec % 3600) // 60)
-        s = int(sec % 60)
-        cs = int((sec % 1) * 100)
-        return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
-    
-    events = []
-    blocks = re.split(r'\n\n+', srt_content.strip())
-    
-    for block in blocks:
-        lines = block.strip().split('\n')
-        if len(lines) >= 3:
-            time_line = lines[1]
-            text = ' '.join(lines[2:]).replace('\n', ' ')
-            # 标点符号替换为空格，便于换行分割
-            text = re.sub(r'[，。、：；？！,.:;?!""''「」『』【】（）()《》]', ' ', text)
-            # 合并多个空格为一个
-            text = re.sub(r'\s+', ' ', text).strip()
-            
-            match = re.match(r'(\d{2}):(\d{2}):(\d{2}),(\d{3}) --> (\d{2}):(\d{2}):(\d{2}),(\d{3})', time_line)
-            if match:
-                sh, sm, ss, sms = match.groups()[:4]
-                eh, em, es, ems = match.groups()[4:]
-                start_sec = int(sh) * 3600 + int(sm) * 60 + int(ss) + int(sms) / 1000
-                end_sec = int(eh) * 3600 + int(em) * 60 + int(es) + int(ems) / 1000
-                
-                # 长文本拆成多条字幕
-                sub_blocks = split_long_text(text, start_sec, end_sec)
-                for sub_text, sub_start, sub_end in sub_blocks:
-                    formatted_text = wrap_text_2lines(sub_text)
-                    start = sec_to_ass_time(sub_start)
-                    end = sec_to_ass_time(sub_end)
-                    events.append(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{formatted_text}")
-    
-    with open(ass_path, 'w', encoding='utf-8') as f:
-        f.write(ass_header + '\n'.join(events))
-
-
-def add_bgm(video_path, output_path, volume=0.08, bgm_path=None):
+
+def add_bgm(video_path, output_path, volume=0.08, bgm_path=None, profile=None):
     """添加背景音乐"""
     print(f"\n[4/4] 添加BGM")
     
@@ -392,15 +465,31 @@ def add_bgm(video_path, output_path, volume=0.08, bgm_path=None):
         'ffmpeg', '-y', '-i', str(video_path),
         '-stream_loop', '-1', '-i', str(bgm_path),
         '-filter_complex',
-        f"[1:a]volume={volume}[bgm];[0:a][bgm]amix=inputs=2:duration=first[aout]",
+        f"[1:a]volume={volume}[bgm];[0:a][bgm]amix=inputs=2:duration=first,"
+        f"aresample={FINAL_SAMPLE_RATE}[aout]",
         '-map', '0:v', '-map', '[aout]',
-        '-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k', str(output_path)
+        '-c:v', 'copy', '-c:a', 'aac', '-b:a', (profile or resolve_profile())["audio_bitrate"], str(output_path)
     ]
     run_cmd(cmd, "添加BGM")
     print(f"  ✓ 最终视频: {get_duration(output_path):.1f}秒")
     return output_path
 
 
+def finalize_audio(video_path, output_path, profile=None):
+    """不加 BGM 时输出成片：流拷贝拼接的 TTS 音频（如 24kHz 单声道 mp3）重采样为 44.1kHz AAC"""
+    if probe_audio(str(video_path))["sample_rate"] == str(FINAL_SAMPLE_RATE):
+        subprocess.run(['cp', str(video_path), str(output_path)])
+        return output_path
+    
+    cmd = [
+        'ffmpeg', '-y', '-i', str(video_path),
+        '-af', f'aresample={FINAL_SAMPLE_RATE}',
+        '-c:v', 'copy', '-c:a', 'aac', '-b:a', (profile or resolve_profile())["audio_bitrate"], str(output_path)
+    ]
+    run_cmd(cmd, f"音频重采样为 {FINAL_SAMPLE_RATE}Hz")
+    return output_path
+
+
 def main():
     parser = argparse.ArgumentParser(description='视频生成器')
     parser.add_argument('config', help='配置文件路径 (YAML)')
@@ -412,6 +501,13 @@ def main():
     parser.add_argument('--ratio', type=str, default='16:9', 
                         help=f'视频比例，支持: {", ".join(VALID_ASPECT_RATIOS)}')
     parser.add_argument('--srt', type=str, default=None, help='字幕文件路径(SRT格式)')
+    parser.add_argument('--timestamps', type=str, default=None,
+                        help='TTS时间戳JSON，用于分配字幕块时长(默认单音频时自动使用 narration.json)')
+    parser.add_argument('--profile', type=str, default=DEFAULT_PROFILE, choices=list(ENCODE_PROFILES),
+                        help='编码档位: preview(半分辨率快速预览) / final(成片) / archive(高码率存档)')
+    parser.add_argument('--with-subs', action='store_true', help='preview 档位下仍烧录字幕')
+    parser.add_argument('--with-outro', action='store_true', help='preview 档位下仍拼接片尾')
+    parser.add_argument('--direct-mux', action='store_true', help='音频直接封装进视频，不生成 audio_merged 中间文件')
     args = parser.parse_args()
     
     config_path = Path(args.config)
@@ -436,6 +532,10 @@ def main():
         print(f"支持的比例: {', '.join(VALID_ASPECT_RATIOS)}")
         sys.exit(1)
     
+    profile = resolve_profile(args.profile, args.ratio, config.get('profiles'))
+    use_subs = bool(args.srt) and (profile["subtitles"] or args.with_subs)
+    use_outro = not args.no_outro and (profile["outro"] or args.with_outro)
+    
     scenes = config.get('scenes', [])
     if not scenes:
         print("配置文件中没有 scenes")
@@ -478,9 +578,9 @@ def main():
                 print(f"图片不存在: {img}")
                 sys.exit(1)
             images.append(img)
-            durations.append(get_duration(audio))
+            durations.append(probe_audio(str(audio))["duration"])
     
-    total_audio_duration = sum(get_duration(af) for af in audio_files)
+    total_audio_duration = sum(probe_audio(str(af))["duration"] for af in audio_files)
     total_image_duration = sum(durations)
     diff = abs(total_image_duration - total_audio_duration)
     
@@ -506,32 +606,41 @@ def main():
     print(f"场景数: {len(scenes)}")
     print(f"音频时长: {total_audio_duration:.1f}秒")
     print(f"视频时长: {sum(durations):.1f}秒")
+    print(f"档位: {profile['name']} ({profile['width']}x{profile['height']} {profile['fps']}fps {profile['preset']})")
     print(f"转场: {args.fade}秒 淡入淡出")
-    print(f"片尾: {'是' if not args.no_outro else '否'}")
+    print(f"片尾: {'是' if use_outro else '否'}")
     print(f"BGM: {'是' if not args.no_bgm else '否'}")
     
     temp_dir = work_dir / "temp"
     temp_dir.mkdir(exist_ok=True)
     
-    video_only = temp_dir / "video_only.mp4"
-    generate_video_with_transitions(images, durations, video_only, args.fade, args.ratio)
+    started = time.perf_counter()
     
-    audio_merged = temp_dir / "audio_merged.m4a"
-    merge_audio(audio_files, audio_merged)
+    video_only = temp_dir / "video_only.mp4"
+    generate_video_with_transitions(images, durations, video_only, args.fade, args.ratio, profile)
     
     video_with_audio = temp_dir / "video_with_audio.mp4"
-    combine_video_audio(video_only, audio_merged, video_with_audio)
+    if args.direct_mux:
+        mux_audio_direct(video_only, audio_files, video_with_audio, profile)
+    else:
+        audio_merged = merge_audio(audio_files, temp_dir / "audio_merged.m4a", profile)
+        combine_video_audio(video_only, audio_merged, video_with_audio)
     
     current_video = video_with_audio
     
-    if args.srt:
+    if use_subs:
         srt_path = work_dir / args.srt if not Path(args.srt).is_absolute() else Path(args.srt)
+        timestamps_path = None
+        if args.timestamps:
+            timestamps_path = work_dir / args.timestamps if not Path(args.timestamps).is_absolute() else Path(args.timestamps)
+        elif len(audio_files) == 1 and (work_dir / 'narration.json').exists():
+            timestamps_path = work_dir / 'narration.json'
         video_with_subs = temp_dir / "video_with_subs.mp4"
-        current_video = burn_subtitles(current_video, srt_path, video_with_subs, args.ratio)
+        current_video = burn_subtitles(current_video, srt_path, video_with_subs, args.ratio, profile, timestamps_path)
     
-    if not args.no_outro:
+    if use_outro:
         video_with_outro = temp_dir / "video_with_outro.mp4"
-        current_video = append_outro(current_video, video_with_outro, args.fade, args.ratio)
+        current_video = append_outro(current_video, video_with_outro, args.fade, args.ratio, profile)
     
     if not args.no_bgm:
         bgm_path = None
@@ -540,12 +649,14 @@ def main():
                 bgm_path = BGM_EPIC
             else:
                 bgm_path = Path(args.bgm)
-        add_bgm(current_video, output_path, args.bgm_volume, bgm_path)
+        add_bgm(current_video, output_path, args.bgm_volume, bgm_path, profile)
     else:
-        subprocess.run(['cp', str(current_video), str(output_path)])
+        finalize_audio(current_video, output_path, profile)
     
+    elapsed = time.perf_counter() - started
     print(f"\n{'='*50}")
     print(f"✅ 完成: {output_path}")
+    print(f"⏱ 耗时: {elapsed:.1f}秒 (档位 {profile['name']})")
     print(f"{'='*50}\n")
 
 